@@ -0,0 +1,65 @@
+import json
+import os
+from collections import namedtuple
+
+# Характеристики юнитов и зданий: stats.json читается один раз при импорте и превращается
+# в неизменяемые архетипы, общие для всех экземпляров одного типа
+STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stats.json')
+
+UnitArchetype = namedtuple('UnitArchetype', [
+    'name', 'id', 'max_health', 'attack_damage', 'speed', 'attack_range', 'attack_cooldown', 'radius', 'size',
+    'texture', 'texture_path', 'enemy_texture', 'enemy_texture_path'])
+
+BuildingArchetype = namedtuple('BuildingArchetype', [
+    'name', 'id', 'max_health', 'width', 'height', 'cost', 'texture', 'texture_path', 'broken_texture',
+    'broken_texture_path', 'spawn_interval', 'hire_cost', 'gold_interval', 'gold_amount', 'depletion_rate',
+    'repair_cost'],
+    # Поведение, которого у здания нет (найм, добыча, ремонт), остается нулевым
+    defaults=(None, None, 0, 0, 0, 0, 0, 0))
+
+
+class ArchetypeField:
+    """Дескриптор: поле читается из архетипа экземпляра, а не хранится в каждом объекте"""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return getattr(instance.archetype, self.name)
+
+
+def compile_units(table):
+    archetypes = {}
+    for name, spec in table.items():
+        spec = dict(spec)
+        texture_path = spec.pop('texture')
+        enemy_texture_path = spec.pop('enemy_texture', texture_path)
+        # Ключи текстур в assets.textures: warrior / warrior_enemy
+        archetypes[name] = UnitArchetype(name=name, texture=name.lower(), texture_path=texture_path,
+                                         enemy_texture=f"{name.lower()}_enemy", enemy_texture_path=enemy_texture_path,
+                                         **spec)
+    return archetypes
+
+
+def compile_buildings(table):
+    archetypes = {}
+    for name, spec in table.items():
+        spec = dict(spec)
+        texture_path = spec.pop('texture')
+        broken_texture_path = spec.pop('broken_texture', None)
+        archetypes[name] = BuildingArchetype(name=name, texture=name.lower(), texture_path=texture_path,
+                                             broken_texture=f"{name.lower()}_broken" if broken_texture_path else None,
+                                             broken_texture_path=broken_texture_path, **spec)
+    return archetypes
+
+
+def load(path=STATS_PATH):
+    """(юниты, здания): {имя типа: архетип}"""
+    with open(path) as file:
+        table = json.load(file)
+    return compile_units(table['units']), compile_buildings(table['buildings'])
+
+
+UNIT_ARCHETYPES, BUILDING_ARCHETYPES = load()
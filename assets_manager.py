@@ -1,38 +1,159 @@
+import queue
+import threading
+
 import pygame
+
+import texture_cache
+from archetypes import UNIT_ARCHETYPES, BUILDING_ARCHETYPES
 from constants import SCREEN_WIDTH, SCREEN_HEIGHT, GRID_SIZE
 
+# Имя текстуры -> (файл, базовый размер); порядок - порядок фоновой загрузки:
+# сначала то, что нужно меню, потом спрайты боя
+TEXTURES = {
+    'menu_background': ('texture/menu_bg.jpg', (SCREEN_WIDTH, SCREEN_HEIGHT)),
+    'background': ('texture/grass.png', (SCREEN_WIDTH, SCREEN_HEIGHT)),
+}
+# Текстуры зданий и юнитов перечислены в stats.json вместе с их характеристиками
+for archetype in BUILDING_ARCHETYPES.values():
+    size = (archetype.width * GRID_SIZE, archetype.height * GRID_SIZE)
+    TEXTURES[archetype.texture] = (archetype.texture_path, size)
+    if archetype.broken_texture:
+        TEXTURES[archetype.broken_texture] = (archetype.broken_texture_path, size)
+for archetype in UNIT_ARCHETYPES.values():
+    size = (archetype.size, archetype.size)
+    TEXTURES[archetype.texture] = (archetype.texture_path, size)
+    TEXTURES[archetype.enemy_texture] = (archetype.enemy_texture_path, size)
+# Без этих текстур нельзя показать меню; остальным экранам нужны все
+MENU_TEXTURES = ('menu_background',)
+MUSIC_PATH = 'music/Linkin_Park_-_Somewhere_I_Belong.mp3'
+
 
 class AssetsManager:
+    """Текстуры, готовые к blit: масштабируются и переводятся в формат экрана один раз на (имя, размер)"""
+
     def __init__(self):
-        self.textures = {}
+        self.textures = {}  # имя -> поверхность базового размера
+        self.sources = {}  # имя -> (поверхность базового размера, базовый размер)
+        self.variants = {}  # (имя, размер) -> готовая поверхность
+        self.display = None  # экран, под формат которого сконвертированы варианты
         self.music_loaded = False
+        # Фоновая загрузка: поток кладет в очередь декодированные текстуры, poll() их забирает
+        self.loader = None
+        self.loaded = queue.Queue()
+        self.finished = False
 
     def load_assets(self):
         # Load textures
-        self.textures['background'] = self.load_texture('texture/grass.png', (SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.textures['menu_background'] = self.load_texture('texture/menu_bg.jpg', (SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.textures['town_hall'] = self.load_texture('texture/house1.png', (GRID_SIZE * 2, GRID_SIZE * 2))
-        self.textures['barracks'] = self.load_texture('texture/barracks.png', (GRID_SIZE * 2, GRID_SIZE * 2))
-        self.textures['gold_mine'] = self.load_texture('texture/Gold_Mine.png', (GRID_SIZE, GRID_SIZE))
-        self.textures['wall'] = self.load_texture('texture/Wall.png', (GRID_SIZE, GRID_SIZE))
-        self.textures['wall_broken'] = self.load_texture('texture/wall_broken.png', (GRID_SIZE, GRID_SIZE))
-        self.textures['warrior'] = self.load_texture('texture/warrior.png', (30, 30))
-        self.textures['archer'] = self.load_texture('texture/archer.png', (30, 30))
-        self.textures['giant'] = self.load_texture('texture/giant.png', (50, 50))
-        self.textures['warrior_enemy'] = self.load_texture('texture/warrior_enemy.png', (30, 30))
-        self.textures['archer_enemy'] = self.load_texture('texture/archer_enemy.png', (30, 30))
-        self.textures['giant_enemy'] = self.load_texture('texture/giant.png', (50, 50))
+        for name, (path, size) in TEXTURES.items():
+            self.add(name, path, size)
 
         # Load music
+        self.music_loaded = self.load_music()
+        self.finished = True
+
+    def load_music(self):
         try:
-            pygame.mixer.music.load('music/Linkin_Park_-_Somewhere_I_Belong.mp3')
-            self.music_loaded = True
+            pygame.mixer.music.load(MUSIC_PATH)
+            return True
         except:
-            print("Failed to load music")
-            self.music_loaded = False
-
-    def load_texture(self, path, size=None):
-        texture = pygame.image.load(path)
-        if size:
-            texture = pygame.transform.scale(texture, size)
-        return texture
\ No newline at end of file
+            print("Не удалось загрузить музыку")
+            return False
+
+    def start_loading(self):
+        """Запускает загрузку текстур и музыки в фоновом потоке; готовое забирает poll()"""
+        if self.loader is not None or self.finished:
+            return
+        self.loader = threading.Thread(target=self._load_in_background, name='assets', daemon=True)
+        self.loader.start()
+
+    def _load_in_background(self):
+        try:
+            for name, (path, size) in TEXTURES.items():
+                self.loaded.put((name, self.decode(path, size), size))
+            self.music_loaded = self.load_music()
+        except Exception as error:
+            # Ошибку поднимет poll() в главном потоке
+            self.loaded.put(error)
+        self.loaded.put(None)
+
+    def poll(self, block=False):
+        """Забирает текстуры, декодированные потоком; вызывается из главного потока, где есть окно"""
+        while not self.finished:
+            try:
+                item = self.loaded.get(block)
+            except queue.Empty:
+                return
+            if item is None:
+                self.finished = True
+                self.loader = None
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                name, source, size = item
+                self._store(name, source, size)
+                if block:
+                    return
+
+    def ready(self, names=None):
+        """Загружены ли текстуры names (без names - вся фоновая загрузка, включая музыку)"""
+        if names is None:
+            return self.finished
+        return all(name in self.textures for name in names)
+
+    def wait(self, names=None):
+        """Ждет, пока загрузятся текстуры names (или все)"""
+        while not self.ready(names):
+            if self.loader is None:
+                self.load_assets()
+            else:
+                self.poll(block=True)
+
+    @property
+    def progress(self):
+        return (len(self.textures) + self.finished) / (len(TEXTURES) + 1)
+
+    def decode(self, path, size=None):
+        # Запеченная текстура уже нужного размера; если ее нет - декодируем файл
+        source = texture_cache.load(path, size)
+        if source is None:
+            source = texture_cache.decode(path, size)
+        return source
+
+    def add(self, name, path, size=None):
+        self._store(name, self.decode(path, size), size)
+
+    def _store(self, name, source, size):
+        self.sources[name] = (source, size)
+        self.textures[name] = self.get(name, size)
+
+    def get(self, name, size=None):
+        """Текстура нужного размера; при первом запросе масштабируется и конвертируется, дальше берется из кэша"""
+        key = (name, size)
+        surface = self.variants.get(key)
+        if surface is None:
+            source = self.sources[name][0]
+            surface = pygame.transform.scale(source, size) if size and size != source.get_size() else source
+            surface = self.variants[key] = self._prepare(surface)
+        return surface
+
+    def _prepare(self, surface):
+        if pygame.display.get_surface() is None:
+            # Окна еще нет (или игра без окна) - формат экрана неизвестен
+            return surface
+        if surface.get_flags() & pygame.SRCALPHA or surface.get_colorkey() is not None:
+            return surface.convert_alpha()
+        return surface.convert()
+
+    def convert_for_display(self):
+        """Вызывается после set_mode: пересобирает текстуры в формате нового экрана"""
+        display = pygame.display.get_surface()
+        if display is None or display is self.display:
+            return
+        self.display = display
+        self.variants.clear()
+        for name, (source, size) in self.sources.items():
+            self.textures[name] = self.get(name, size)
+
+
+# Общий менеджер: модули берут из него assets.textures
+assets = AssetsManager()
@@ -0,0 +1,33 @@
+from constants import Difficulty
+
+
+class Balance:
+    """Параметры волн и стартового золота; значения по умолчанию - баланс обычной игры"""
+
+    def __init__(self, **overrides):
+        # Множители числа врагов: 1 + номер волны * wave_step и 1 + сложность * difficulty_step
+        self.wave_step = 0.5
+        self.difficulty_step = 0.3
+        # Базовое число врагов в волнах 1-3
+        self.wave1_count = 6
+        self.wave2_count = 9
+        self.wave3_count = 7
+        # Гигант-босс третьей волны (до множителя сложности)
+        self.giant_health = 800
+        self.giant_damage = 40
+        self.start_gold = {
+            Difficulty.EASY: 500,
+            Difficulty.MEDIUM: 400,
+            Difficulty.HARD: 300
+        }
+
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise ValueError(f"Неизвестный параметр баланса: {name}")
+            if name == 'start_gold' and not isinstance(value, dict):
+                # Одно число - одинаковое золото на всех уровнях сложности
+                value = {difficulty: value for difficulty in Difficulty}
+            setattr(self, name, value)
+
+    def wave_count(self, wave):
+        return (self.wave1_count, self.wave2_count, self.wave3_count)[wave]
@@ -0,0 +1,136 @@
+import argparse
+import itertools
+import json
+import os
+import time
+
+from balance import Balance
+from batch_battles import Job, load_layouts, run_batch, MAX_TICKS
+from constants import Difficulty
+
+
+def parse_param(text):
+    """'giant_health=600,800,1000' -> ('giant_health', [600, 800, 1000])"""
+    name, _, values = text.partition('=')
+    if not hasattr(Balance(), name) or not values:
+        raise argparse.ArgumentTypeError(f"ожидается параметр Balance=значение,...; получено {text!r}")
+    parsed = []
+    for value in values.split(','):
+        try:
+            parsed.append(int(value))
+        except ValueError:
+            parsed.append(float(value))
+    return name, parsed
+
+
+def parse_target(text):
+    """'HARD=0.3' -> (Difficulty.HARD, 0.3)"""
+    name, _, rate = text.partition('=')
+    try:
+        return Difficulty[name], float(rate)
+    except (KeyError, ValueError):
+        raise argparse.ArgumentTypeError(f"ожидается СЛОЖНОСТЬ=доля побед; получено {text!r}")
+
+
+def sweep_points(params):
+    """Все сочетания значений: [{параметр: значение}, ...]"""
+    names = [name for name, _ in params]
+    return [dict(zip(names, values)) for values in itertools.product(*(values for _, values in params))]
+
+
+def point_key(point):
+    return tuple(sorted(point.items()))
+
+
+def run_sweep(points, difficulties, seeds, layouts, workers=None, max_ticks=MAX_TICKS, on_result=None):
+    """Бои для каждой точки, сложности, расстановки и seed; возвращает {(точка, сложность): статистика}"""
+    jobs = [Job(layout_name, layout, difficulty, seed, point)
+            for point in points for difficulty in difficulties
+            for layout_name, layout in layouts.items() for seed in seeds]
+    stats = {}
+    for result in run_batch(jobs, workers, max_ticks):
+        key = (point_key(result['balance']), result['difficulty'])
+        entry = stats.setdefault(key, {'battles': 0, 'wins': 0, 'waves': 0})
+        entry['battles'] += 1
+        entry['wins'] += result['result'] == 'WIN'
+        entry['waves'] += result['wave']
+        if on_result is not None:
+            on_result(result, len(jobs))
+    for entry in stats.values():
+        entry['win_rate'] = entry['wins'] / entry['battles']
+        entry['mean_wave'] = entry['waves'] / entry['battles']
+    return stats
+
+
+def print_surface(params, points, difficulty, stats):
+    """Доля побед по точкам; для двух параметров - таблицей, строки по первому, столбцы по второму"""
+    print(f"\n{difficulty.name}: доля побед (средняя волна)")
+    cell = lambda point: stats[(point_key(point), difficulty.name)]
+    if len(params) == 2:
+        (row_name, rows), (column_name, columns) = params
+        print(f"{row_name + ' / ' + column_name:>28}" + "".join(f"{value:>14}" for value in columns))
+        for row in rows:
+            line = f"{row:>28}"
+            for column in columns:
+                entry = cell({row_name: row, column_name: column})
+                line += f"{entry['win_rate']:>8.0%} ({entry['mean_wave']:.1f})"
+            print(line)
+        return
+    for point in points:
+        entry = cell(point)
+        label = ", ".join(f"{name}={value}" for name, value in point.items()) or "обычный баланс"
+        print(f"  {label:<60}{entry['win_rate']:>6.0%}  ({entry['mean_wave']:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перебор параметров баланса: доля побед по сложностям")
+    parser.add_argument('--param', type=parse_param, action='append', default=[], metavar='NAME=V1,V2,...',
+                        help="параметр Balance и его значения (можно несколько раз)")
+    parser.add_argument('--difficulty', choices=[d.name for d in Difficulty], nargs='+',
+                        default=[d.name for d in Difficulty])
+    parser.add_argument('--seeds', type=int, default=20, help="боев на точку, сложность и расстановку")
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--layouts', help="JSON с расстановками, как у batch_battles.py; без него - стартовая деревня")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument('--max-ticks', type=int, default=MAX_TICKS, help="ограничение на число шагов одного боя")
+    parser.add_argument('--target', type=parse_target, action='append', default=[], metavar='СЛОЖНОСТЬ=ДОЛЯ',
+                        help="желаемая доля побед, например HARD=0.3; печатается ближайшая точка")
+    parser.add_argument('--output', metavar='PATH', help="сохранить поверхность в JSON")
+    args = parser.parse_args()
+
+    points = sweep_points(args.param)
+    difficulties = [Difficulty[name] for name in args.difficulty]
+    layouts = load_layouts(args.layouts) if args.layouts else {'default': None}
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+
+    start = time.perf_counter()
+    done = []
+
+    def progress(result, total):
+        done.append(result)
+        if len(done) % 50 == 0 or len(done) == total:
+            print(f"\rбоев: {len(done)}/{total}", end='', flush=True)
+
+    stats = run_sweep(points, difficulties, seeds, layouts, args.workers, args.max_ticks, progress)
+    print(f"\nЗа {time.perf_counter() - start:.1f} с на {args.workers} процессах")
+
+    for difficulty in difficulties:
+        print_surface(args.param, points, difficulty, stats)
+
+    for difficulty, rate in args.target:
+        if difficulty not in difficulties:
+            continue
+        best = min(points, key=lambda point: abs(stats[(point_key(point), difficulty.name)]['win_rate'] - rate))
+        found = stats[(point_key(best), difficulty.name)]['win_rate']
+        print(f"{difficulty.name}: ближе всего к {rate:.0%} - {best or 'обычный баланс'} ({found:.0%})")
+
+    if args.output:
+        surface = [dict(point=point, difficulty=difficulty.name, **stats[(point_key(point), difficulty.name)])
+                   for point in points for difficulty in difficulties]
+        with open(args.output, 'w') as file:
+            json.dump(surface, file, indent=2)
+        print(f"Поверхность сохранена в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
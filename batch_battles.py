@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from balance import Balance
+from constants import Difficulty, BuildingType, FPS
+from headless import simulate_battle, town_hall_health
+
+# Одна задача: расстановка зданий (None - стартовая деревня), сложность, seed боя
+# и изменения баланса {параметр Balance: значение} (None - обычный баланс)
+Job = namedtuple('Job', 'layout_name layout difficulty seed balance', defaults=(None,))
+# Золото записывается раз в секунду игрового времени
+GOLD_SAMPLE_TICKS = FPS
+MAX_TICKS = FPS * 60 * 30
+
+
+def load_layouts(path):
+    """Файл JSON {имя: [[тип здания, x, y], ...]} -> {имя: [(BuildingType, x, y), ...]}"""
+    with open(path) as file:
+        data = json.load(file)
+    layouts = {name: [(BuildingType[building_type], x, y) for building_type, x, y in buildings]
+               for name, buildings in data.items()}
+    # Проверяем сразу, а не в рабочих процессах посреди пакета
+    for name, buildings in layouts.items():
+        if not any(building_type == BuildingType.TOWN_HALL for building_type, _, _ in buildings):
+            raise ValueError(f"{path}: в расстановке {name} нет Town Hall")
+    return layouts
+
+
+def run_job(job, max_ticks=MAX_TICKS):
+    """Бой одной задачи в рабочем процессе; возвращает только простые значения, чтобы их можно было передать назад"""
+    gold = []
+
+    def sample_gold(game, ticks):
+        if ticks % GOLD_SAMPLE_TICKS == 0:
+            gold.append(game.gold)
+
+    start = time.perf_counter()
+    balance = Balance(**job.balance) if job.balance else None
+    game, ticks = simulate_battle(job.difficulty, max_ticks=max_ticks, seed=job.seed, layout=job.layout,
+                                  on_tick=sample_gold, balance=balance)
+    return {
+        'layout': job.layout_name,
+        'difficulty': job.difficulty.name,
+        'seed': job.seed,
+        'balance': job.balance,
+        'result': game.state.name,
+        # После победы game.wave указывает за последнюю волну
+        'wave': min(game.wave, 2) + 1,
+        'town_hall_hp': town_hall_health(game),
+        'gold': gold,
+        'ticks': ticks,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def run_batch(jobs, workers=None, max_ticks=MAX_TICKS):
+    """Раздает задачи пулу процессов и отдает результаты по мере готовности (не в порядке jobs)"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job, max_ticks) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def make_jobs(layouts, difficulties, seeds, balance=None):
+    return [Job(name, layout, difficulty, seed, balance)
+            for name, layout in layouts.items() for difficulty in difficulties for seed in seeds]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный прогон боев Clash of Berserk на нескольких процессах")
+    parser.add_argument('layouts', nargs='?', help="JSON {имя: [[тип здания, x, y], ...]}; без него - стартовая деревня")
+    parser.add_argument('--difficulty', choices=[d.name for d in Difficulty], nargs='+',
+                        default=[d.name for d in Difficulty])
+    parser.add_argument('--seeds', type=int, default=10, help="число боев на расстановку и сложность")
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument('--max-ticks', type=int, default=MAX_TICKS, help="ограничение на число шагов одного боя")
+    parser.add_argument('--start-gold', type=int, metavar='GOLD',
+                        help="стартовое золото на всех сложностях; уходит в запас казарм расстановки "
+                             "(без казарм - на воинов у Town Hall)")
+    parser.add_argument('--output', metavar='PATH', help="дописывать результаты в файл, по строке JSON на бой")
+    args = parser.parse_args()
+
+    layouts = load_layouts(args.layouts) if args.layouts else {'default': None}
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    balance = {'start_gold': args.start_gold} if args.start_gold is not None else None
+    jobs = make_jobs(layouts, [Difficulty[name] for name in args.difficulty], seeds, balance)
+
+    output = open(args.output, 'a') if args.output else None
+    wins = {}
+    start = time.perf_counter()
+    try:
+        for done, result in enumerate(run_batch(jobs, args.workers, args.max_ticks), 1):
+            print(f"[{done}/{len(jobs)}] {result['layout']} {result['difficulty']} seed={result['seed']}: "
+                  f"{result['result']}, волна {result['wave']}, Town Hall HP {result['town_hall_hp']}, "
+                  f"шагов {result['ticks']}")
+            key = (result['layout'], result['difficulty'])
+            total, won = wins.get(key, (0, 0))
+            wins[key] = (total + 1, won + (result['result'] == 'WIN'))
+            if output:
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+    finally:
+        if output:
+            output.close()
+
+    print(f"Боев: {len(jobs)} за {time.perf_counter() - start:.1f} с на {args.workers} процессах")
+    for (layout, difficulty), (total, won) in sorted(wins.items()):
+        print(f"{layout:<20}{difficulty:<8}побед {won}/{total} ({won / total:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+from beta import (Game, Building, GameState, Difficulty, BuildingType, UnitType, SCREEN_WIDTH, SCREEN_HEIGHT,
+                  GRID_SIZE, BORDER_OFFSET, FIXED_DT)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+SEED = 2024
+
+
+def maze_walls(town_hall):
+    """Кольца стен вокруг Town Hall (внутри периметра) с проходами на противоположных сторонах"""
+    cx, cy = town_hall.x // GRID_SIZE, town_hall.y // GRID_SIZE
+    first = BORDER_OFFSET // GRID_SIZE + 1
+    last_x = (SCREEN_WIDTH - BORDER_OFFSET) // GRID_SIZE - 2
+    last_y = (SCREEN_HEIGHT - BORDER_OFFSET) // GRID_SIZE - 2
+    cells = []
+    for distance, gap_x in ((1, cx - 1), (3, cx + 4)):
+        x0, x1 = cx - distance, cx + 1 + distance
+        y0, y1 = cy - distance, cy + 1 + distance
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                on_ring = x in (x0, x1) or y in (y0, y1)
+                in_gap = x == gap_x and y in (cy, cy + 1)
+                if on_ring and not in_gap and first <= x <= last_x and first <= y <= last_y:
+                    cells.append((x * GRID_SIZE, y * GRID_SIZE))
+    return cells
+
+
+SCENARIOS = {}
+
+
+def scenario(name, enemies, ticks, maze=False, defenders=False):
+    SCENARIOS[name] = dict(enemies=enemies, ticks=ticks, maze=maze, defenders=defenders)
+
+
+scenario('perimeter-100', 100, 600)
+scenario('perimeter-100-defended', 100, 600, defenders=True)
+scenario('maze-100', 100, 600, maze=True)
+scenario('maze-100-defended', 100, 600, maze=True, defenders=True)
+scenario('perimeter-1000', 1000, 120)
+scenario('perimeter-1000-defended', 1000, 120, defenders=True)
+scenario('maze-1000', 1000, 120, maze=True)
+scenario('maze-1000-defended', 1000, 120, maze=True, defenders=True)
+scenario('perimeter-10000', 10000, 20)
+scenario('perimeter-10000-defended', 10000, 20, defenders=True)
+scenario('maze-10000', 10000, 20, maze=True)
+scenario('maze-10000-defended', 10000, 20, maze=True, defenders=True)
+
+
+def build_game(params, unit_store=False):
+    """Игра HARD в начале боя: стены сценария, защитники и волна из spawn_enemy"""
+    game = Game(headless=True, unit_store=unit_store, seed=SEED)
+    game.select_difficulty(Difficulty.HARD)
+    town_hall = game.buildings.town_hall
+
+    if params['defenders']:
+        for x in (BORDER_OFFSET + GRID_SIZE, SCREEN_WIDTH - BORDER_OFFSET - 3 * GRID_SIZE):
+            barracks = Building(x, BORDER_OFFSET + GRID_SIZE, BuildingType.BARRACKS, game.difficulty)
+            barracks.gold_reserve = 10 ** 6
+            game.buildings.add(barracks)
+        # Стартовый отряд у Town Hall, чтобы защитники участвовали с первого шага
+        for index in range(max(10, params['enemies'] // 5)):
+            offset = (index % 20 - 10) * 4
+            game.spawn_unit(town_hall.center[0] + offset, town_hall.center[1] + GRID_SIZE + index // 20,
+                            UnitType.WARRIOR, True)
+
+    if params['maze']:
+        for x, y in maze_walls(town_hall):
+            if not any(building.rect.colliderect((x, y, GRID_SIZE, GRID_SIZE)) for building in game.buildings):
+                game.buildings.add(Building(x, y, BuildingType.WALL, game.difficulty))
+
+    game.state = GameState.BATTLE
+    for _ in range(params['enemies']):
+        game.spawn_enemy(UnitType.WARRIOR)
+    # Бой начат в обход spawn_wave(), поэтому отсчет найма в казармах запускаем сами
+    game.wake_barracks()
+    return game
+
+
+def percentile(values, point):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * point // 100)]
+
+
+def run_scenario(name, unit_store=False, memory=True):
+    params = SCENARIOS[name]
+    game = build_game(params, unit_store)
+    times = []
+    for _ in range(params['ticks']):
+        start = time.perf_counter_ns()
+        game.update(FIXED_DT)
+        times.append(time.perf_counter_ns() - start)
+        if game.state in [GameState.WIN, GameState.LOSE]:
+            break
+
+    result = {
+        'ticks': len(times),
+        'ticks_per_sec': len(times) / (sum(times) / 1e9),
+        'p50_ms': percentile(times, 50) / 1e6,
+        'p99_ms': percentile(times, 99) / 1e6,
+    }
+
+    if memory:
+        # Отдельный прогон тех же шагов: tracemalloc сильно замедляет каждый шаг, но пик (волна, кэши
+        # маршрутов, подкрепления казарм) должен быть за весь бой, а не за его начало
+        tracemalloc.start()
+        game = build_game(params, unit_store)
+        for _ in range(len(times)):
+            game.update(FIXED_DT)
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result
+
+
+def compare(name, result, baseline):
+    """Строка отчета; изменение считается так, что плюс - всегда хуже"""
+    line = (f"{name:<28}{result['ticks']:>6}{result['ticks_per_sec']:>10.1f}"
+            f"{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}{result.get('peak_mb', 0):>9.1f}")
+    old = baseline.get(name)
+    if not old:
+        return line, 0.0
+    change = (old['ticks_per_sec'] / result['ticks_per_sec'] - 1) * 100
+    return line + f"   {change:+6.1f}% к базовой", change
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Макро-бенчмарки боев Clash of Berserk")
+    parser.add_argument('scenarios', nargs='*', help="имена сценариев (по умолчанию все)")
+    parser.add_argument('--unit-store', action='store_true', help="хранить юнитов в массивах NumPy")
+    parser.add_argument('--no-memory', action='store_true', help="не измерять пик памяти")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="файл базовых результатов")
+    parser.add_argument('--save-baseline', action='store_true', help="записать результаты как новую базу")
+    parser.add_argument('--max-slowdown', type=float, help="код выхода 1, если сценарий медленнее базы больше чем на N %%")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"неизвестный сценарий {name}; есть: {', '.join(SCENARIOS)}")
+
+    key = 'unit_store' if args.unit_store else 'default'
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    print(f"{'сценарий':<28}{'шагов':>6}{'шаг/с':>10}{'p50 мс':>9}{'p99 мс':>9}{'пик МБ':>9}")
+    results = {}
+    regressions = []
+    for name in names:
+        results[name] = run_scenario(name, args.unit_store, not args.no_memory)
+        line, change = compare(name, results[name], baseline.get(key, {}))
+        print(line)
+        if args.max_slowdown is not None and change > args.max_slowdown:
+            regressions.append(name)
+
+    if args.save_baseline:
+        baseline.setdefault(key, {}).update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"База сохранена в {args.baseline}")
+
+    if regressions:
+        print(f"Медленнее базы: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
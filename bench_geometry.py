@@ -0,0 +1,265 @@
+import argparse
+import math
+import random
+import time
+from types import SimpleNamespace
+
+import pygame
+
+import beta2
+from beta import Building, Unit, BuildingType, UnitType, GRID_SIZE
+from building_registry import BuildingRegistry
+from wall_grid import WallGrid
+from segment_kernel import WallRects, np
+
+SEED = 7
+# Число стен; карта растет вместе с ним, чтобы плотность стен оставалась одной и той же
+SIZES = (64, 256, 1024, 4096)
+WALL_DENSITY = 0.25
+QUERIES = 64
+
+
+# Прежние геометрические хелперы Unit. Игра ими больше не пользуется (маршрут задает FlowField, прямую
+# видимость - WallGrid), а здесь они остаются эталоном, с которым сравниваются новые реализации
+
+def distance_to_line(x1, y1, x2, y2, px, py):
+    """Вычисляет расстояние от точки (px, py) до линии (x1,y1)-(x2,y2)"""
+    line_length = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+    if line_length == 0:
+        return math.sqrt((px - x1) ** 2 + (py - y1) ** 2)
+    return abs((py - y1) * (x2 - x1) - (px - x1) * (y2 - y1)) / line_length
+
+
+def line_intersects_rect(p1, p2, rect):
+    """Проверяет, пересекает ли линия p1-p2 прямоугольник rect"""
+
+    # Алгоритм Liang-Barsky для проверки пересечения линии и прямоугольника
+    def clip(denom, numer, t0, t1):
+        if denom == 0:
+            return numer <= 0
+        t = numer / denom
+        if denom > 0:
+            if t > t1:
+                return False
+            if t > t0:
+                t0 = t
+        else:
+            if t < t0:
+                return False
+            if t < t1:
+                t1 = t
+        return True, t0, t1
+
+    x1, y1 = p1
+    x2, y2 = p2
+    t0, t1 = 0, 1
+    dx = x2 - x1
+    dy = y2 - y1
+
+    # Проверяем каждую границу прямоугольника
+    if not clip(-dx, x1 - rect.left, t0, t1):
+        return False
+    if not clip(dx, rect.right - x1, t0, t1):
+        return False
+    if not clip(-dy, y1 - rect.top, t0, t1):
+        return False
+    if not clip(dy, rect.bottom - y1, t0, t1):
+        return False
+
+    return True
+
+
+def find_closest_wall(unit, game, town_hall):
+    """Ближайшая к юниту целая стена, лежащая на линии от него до Town Hall"""
+    closest_wall = None
+    min_dist = float('inf')
+
+    town_hall_center_x, town_hall_center_y = town_hall.center
+
+    for building in game.buildings.walls:
+        if building.health > 0:
+            wall_center_x, wall_center_y = building.center
+
+            # Проверяем, лежит ли стена на линии между юнитом и Town Hall
+            line_distance = distance_to_line(unit.x, unit.y, town_hall_center_x, town_hall_center_y,
+                                             wall_center_x, wall_center_y)
+
+            # Если стена близко к линии, считаем её целью
+            if line_distance < GRID_SIZE // 2:
+                dist_to_wall = math.sqrt((unit.x - wall_center_x) ** 2 + (unit.y - wall_center_y) ** 2)
+                if dist_to_wall < min_dist:
+                    min_dist = dist_to_wall
+                    closest_wall = building
+
+    return closest_wall
+
+
+def is_wall_on_path(unit, wall, town_hall):
+    """Проверяет, находится ли стена на прямой линии к Town Hall"""
+    town_hall_center = (town_hall.x + town_hall.width * GRID_SIZE // 2,
+                        town_hall.y + town_hall.height * GRID_SIZE // 2)
+    self_center = (unit.x, unit.y)
+    wall_rect = pygame.Rect(wall.x, wall.y, wall.width * GRID_SIZE, wall.height * GRID_SIZE)
+    return line_intersects_rect(self_center, town_hall_center, wall_rect)
+
+
+def is_good_passage(unit, broken_wall, town_hall, game):
+    """Проверяет, ведет ли сломанная стена к Town Hall без других препятствий"""
+    # Проверяем путь от себя к сломанной стене
+    if is_path_blocked_to_wall(unit, game, broken_wall):
+        return False
+
+    # Проверяем путь от сломанной стены к Town Hall
+    town_hall_center = (town_hall.x + town_hall.width * GRID_SIZE // 2,
+                        town_hall.y + town_hall.height * GRID_SIZE // 2)
+    wall_center = (broken_wall.x + broken_wall.width * GRID_SIZE // 2,
+                   broken_wall.y + broken_wall.height * GRID_SIZE // 2)
+
+    for building in game.buildings:
+        if building.type == BuildingType.WALL and building.health > 0 and building != broken_wall:
+            wall_rect = pygame.Rect(building.x, building.y,
+                                    building.width * GRID_SIZE, building.height * GRID_SIZE)
+            if line_intersects_rect(wall_center, town_hall_center, wall_rect):
+                return False
+    return True
+
+
+def is_path_blocked_to_wall(unit, game, target_wall):
+    """Проверяет, есть ли стены на пути к целевой стене"""
+    wall_center = (target_wall.x + target_wall.width * GRID_SIZE // 2,
+                   target_wall.y + target_wall.height * GRID_SIZE // 2)
+    self_center = (unit.x, unit.y)
+
+    for building in game.buildings:
+        if building.type == BuildingType.WALL and building.health > 0 and building != target_wall:
+            wall_rect = pygame.Rect(building.x, building.y,
+                                    building.width * GRID_SIZE, building.height * GRID_SIZE)
+            if line_intersects_rect(self_center, wall_center, wall_rect):
+                return True
+    return False
+
+
+# Те же проверки через WallGrid: обход только ячеек, через которые идет отрезок
+
+def is_wall_on_path_grid(unit, wall, town_hall, game):
+    return wall in game.wall_grid.walls_on_segment((unit.x, unit.y), town_hall.center)
+
+
+def is_good_passage_grid(unit, broken_wall, town_hall, game):
+    if game.wall_grid.is_blocked((unit.x, unit.y), broken_wall.center, broken_wall):
+        return False
+    return not game.wall_grid.is_blocked(broken_wall.center, town_hall.center, broken_wall)
+
+
+def make_layout(walls, rng):
+    """Случайная расстановка стен и Town Hall в центре; возвращает объект с интерфейсом Game для хелперов"""
+    cols = rows = max(8, math.ceil(math.sqrt(walls / WALL_DENSITY)))
+    width, height = cols * GRID_SIZE, rows * GRID_SIZE
+    game = SimpleNamespace(buildings=BuildingRegistry(), wall_grid=WallGrid(width, height))
+
+    def on_building_event(event, building):
+        if building.type == BuildingType.WALL:
+            game.wall_grid.set_wall(building)
+
+    game.buildings.subscribe(on_building_event)
+
+    town_hall = Building((cols // 2 - 1) * GRID_SIZE, (rows // 2 - 1) * GRID_SIZE, BuildingType.TOWN_HALL)
+    game.buildings.add(town_hall)
+    cells = [(x, y) for x in range(cols) for y in range(rows)
+             if not town_hall.rect.colliderect((x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE))]
+    for x, y in rng.sample(cells, walls):
+        game.buildings.add(Building(x * GRID_SIZE, y * GRID_SIZE, BuildingType.WALL))
+
+    units = [Unit(rng.uniform(0, width), rng.uniform(0, height), UnitType.WARRIOR) for _ in range(QUERIES)]
+    return game, town_hall, units, (width, height)
+
+
+def add_beta2_targets(count, size, rng):
+    """Казармы и шахты для find_important_building_near_path из beta2"""
+    registry = BuildingRegistry()
+    for index in range(count):
+        building_type = BuildingType.BARRACKS if index % 2 else BuildingType.GOLD_MINE
+        registry.add(beta2.Building(rng.randrange(0, size[0] - 2 * GRID_SIZE, GRID_SIZE),
+                                    rng.randrange(0, size[1] - 2 * GRID_SIZE, GRID_SIZE), building_type))
+    return SimpleNamespace(buildings=registry)
+
+
+def cases(game, town_hall, units, size, rng):
+    """name -> функция, делающая QUERIES вызовов; у альтернатив то же имя до ':'"""
+    walls = list(game.buildings.walls)
+    target = town_hall.center
+    wall_rect = walls[0].rect
+    probe = units[0]
+    broken = rng.sample(walls, min(len(walls), QUERIES))
+    beta2_game = add_beta2_targets(len(walls) // 8, size, rng)
+    beta2_unit = beta2.Unit(probe.x, probe.y, UnitType.WARRIOR)
+    segments = [((unit.x, unit.y), target) for unit in units]
+
+    result = {
+        'distance_to_line': lambda: [distance_to_line(unit.x, unit.y, target[0], target[1], 10, 20)
+                                     for unit in units],
+        'line_intersects_rect': lambda: [line_intersects_rect(p1, p2, wall_rect) for p1, p2 in segments],
+        'path_blocked:line_intersects_rect scan': lambda: [
+            any(line_intersects_rect(p1, p2, wall.rect) for wall in walls) for p1, p2 in segments],
+        'path_blocked:WallGrid DDA': lambda: [game.wall_grid.is_blocked(p1, p2) for p1, p2 in segments],
+        'find_closest_wall': lambda: [find_closest_wall(unit, game, town_hall) for unit in units],
+        'is_wall_on_path:line_intersects_rect': lambda: [
+            is_wall_on_path(unit, wall, town_hall) for unit, wall in zip(units, broken)],
+        'is_wall_on_path:WallGrid': lambda: [
+            is_wall_on_path_grid(unit, wall, town_hall, game) for unit, wall in zip(units, broken)],
+        'is_good_passage:line_intersects_rect scan': lambda: [
+            is_good_passage(unit, wall, town_hall, game) for unit, wall in zip(units, broken)],
+        'is_good_passage:WallGrid': lambda: [
+            is_good_passage_grid(unit, wall, town_hall, game) for unit, wall in zip(units, broken)],
+        'beta2.find_important_building_near_path': lambda: [
+            beta2_unit.find_important_building_near_path(beta2_game, town_hall, GRID_SIZE) for _ in units],
+    }
+    if np is not None:
+        wall_rects = WallRects(game.buildings)
+        xs, ys = [unit.x for unit in units], [unit.y for unit in units]
+        result['path_blocked:WallRects batch'] = lambda: wall_rects.blocked(xs, ys, target)
+    return result
+
+
+def time_per_call(func, min_time=0.2):
+    """Среднее время одного запроса в нс; повторяет func, пока не наберется min_time секунд"""
+    func()
+    repeats = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        repeats += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / (repeats * QUERIES) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микро-бенчмарки геометрических хелперов ИИ")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="числа стен")
+    parser.add_argument('--filter', default='', help="запускать только функции, в имени которых есть строка")
+    parser.add_argument('--min-time', type=float, default=0.2, help="секунд на один замер")
+    args = parser.parse_args()
+
+    table = {}
+    for size in args.sizes:
+        rng = random.Random(SEED)
+        layout = make_layout(size, rng)
+        for name, func in cases(*layout, rng).items():
+            if args.filter in name:
+                table.setdefault(name, {})[size] = time_per_call(func, args.min_time)
+
+    sizes = list(args.sizes)
+    print(f"{'функция':<44}" + "".join(f"{size:>11}" for size in sizes) + "   наклон")
+    for name, row in table.items():
+        line = f"{name:<44}" + "".join(f"{row[size]:>11.0f}" for size in sizes)
+        # Наклон log-log: 0 - не зависит от числа стен, 1 - линейно
+        if len(sizes) > 1:
+            slope = math.log(row[sizes[-1]] / row[sizes[0]]) / math.log(sizes[-1] / sizes[0])
+            line += f"   {slope:6.2f}"
+        print(line)
+    print("нс на вызов; размер - число стен")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Модули симуляции, которые должны импортироваться без инициализации pygame
+MODULES = ('constants', 'unit', 'building', 'game', 'beta', 'beta2', 'headless', 'replay')
+BUDGET_MS = 100
+
+# Дочерний процесс: сначала сам pygame (его импорт тянет numpy и не зависит от нас), затем модуль
+CHILD = """
+import importlib, json, sys, time
+start = time.perf_counter()
+import pygame
+pygame_ms = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+module_ms = (time.perf_counter() - start) * 1000
+import engine
+from assets_manager import assets
+print(json.dumps({
+    'pygame_ms': pygame_ms,
+    'module_ms': module_ms,
+    'side_effects': [name for name, active in (
+        ('pygame.init', pygame.get_init()),
+        ('display', pygame.display.get_init()),
+        ('mixer', pygame.mixer.get_init() is not None),
+        ('font', pygame.font.get_init()),
+        ('textures', bool(assets.textures)),
+        ('engine.init', engine.initialized),
+    ) if active],
+}))
+"""
+
+
+def measure(module):
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    result = subprocess.run([sys.executable, '-c', CHILD, module], env=env, check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка импорта модулей: без инициализации pygame и в пределах бюджета")
+    parser.add_argument('modules', nargs='*', default=MODULES, help="имена модулей")
+    parser.add_argument('--budget', type=float, default=BUDGET_MS,
+                        help="мс на импорт модуля сверх импорта самого pygame (по умолчанию %(default)s)")
+    args = parser.parse_args()
+
+    failed = []
+    print(f"{'модуль':<12}{'pygame мс':>11}{'модуль мс':>11}   побочные эффекты")
+    for module in args.modules:
+        result = measure(module)
+        print(f"{module:<12}{result['pygame_ms']:>11.1f}{result['module_ms']:>11.1f}   "
+              f"{', '.join(result['side_effects']) or '-'}")
+        if result['side_effects'] or result['module_ms'] > args.budget:
+            failed.append(module)
+
+    if failed:
+        print(f"Импорт с побочными эффектами или дольше {args.budget:g} мс: {', '.join(failed)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,92 +2,31 @@ import pygame
 import random
 import math
 import sys
-from enum import Enum
-
-pygame.init()
-
-pygame.mixer.init()
-
-# Константы
-SCREEN_WIDTH = 1024
-SCREEN_HEIGHT = 768
-FPS = 60
-GRID_SIZE = 64
-BORDER_OFFSET = GRID_SIZE * 2
-
-# Цвета
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BLUE = (0, 0, 255)
-YELLOW = (255, 255, 0)
-BROWN = (139, 69, 19)
-GRAY = (128, 128, 128)
-DARK_GREEN = (0, 100, 0)
-LIGHT_BLUE = (173, 216, 230)
-DARK_BLUE = (0, 0, 139)
-
-
-def load_texture(path, size=None):
-    texture = pygame.image.load(path)
-    if size:
-        texture = pygame.transform.scale(texture, size)
-    return texture
-
-
-textures = {
-    'background': load_texture('texture/grass.png', (SCREEN_WIDTH, SCREEN_HEIGHT)),
-    'menu_background': load_texture('texture/menu_bg.jpg', (SCREEN_WIDTH, SCREEN_HEIGHT)),
-    'town_hall': load_texture('texture/house1.png', (GRID_SIZE * 2, GRID_SIZE * 2)),
-    'barracks': load_texture('texture/barracks.png', (GRID_SIZE * 2, GRID_SIZE * 2)),
-    'gold_mine': load_texture('texture/Gold_Mine.png', (GRID_SIZE, GRID_SIZE)),
-    'wall': load_texture('texture/Wall.png', (GRID_SIZE, GRID_SIZE)),
-    'wall_broken': load_texture('texture/wall_broken.png', (GRID_SIZE, GRID_SIZE)),
-    'warrior': load_texture('texture/warrior.png', (30, 30)),
-    'archer': load_texture('texture/archer.png', (30, 30)),
-    'giant': load_texture('texture/giant.png', (50, 50)),
-    'warrior_enemy': load_texture('texture/warrior_enemy.png', (30, 30)),
-    'archer_enemy': load_texture('texture/archer_enemy.png', (30, 30)),
-    'giant_enemy': load_texture('texture/giant.png', (50, 50))
-}
-
-# Загрузка музыки
-try:
-    pygame.mixer.music.load('music/Linkin_Park_-_Somewhere_I_Belong.mp3')
-    music_loaded = True
-except:
-    print("Не удалось загрузить музыку")
-    music_loaded = False
-
-
-# Game states
-class GameState(Enum):
-    MENU = 0
-    BUILD = 1
-    BATTLE = 2
-    WIN = 3
-    LOSE = 4
-    HELP = 5
-
-
-class Difficulty(Enum):
-    EASY = 0
-    MEDIUM = 1
-    HARD = 2
-
-
-class BuildingType(Enum):
-    TOWN_HALL = 0
-    BARRACKS = 1
-    GOLD_MINE = 2
-    WALL = 3
-
-
-class UnitType(Enum):
-    WARRIOR = 0
-    ARCHER = 1
-    GIANT = 2
+import time
+
+from constants import (SCREEN_WIDTH, SCREEN_HEIGHT, FPS, FIXED_DT, MAX_FRAME_TIME, GRID_SIZE, BORDER_OFFSET, WHITE,
+                       BLACK, RED, GREEN, BLUE, YELLOW, BROWN, GRAY, DARK_GREEN, LIGHT_BLUE, DARK_BLUE, GameState,
+                       Difficulty, BuildingType, UnitType, Command)
+from spatial_grid import SpatialGrid
+from building_registry import BuildingRegistry
+from wall_grid import WallGrid
+from flow_field import FlowField
+from segment_kernel import WallRects
+from replay import ReplayWriter
+from profiler import FrameProfiler
+from text_cache import fonts, labels
+from assets_manager import assets, MENU_TEXTURES
+from balance import Balance
+import engine
+from unit_store import UnitStore, StoredUnitMixin
+from unit_pool import UnitPool
+from unit_collection import UnitCollection, unit_slot
+from command_buffer import CommandBuffer
+from scheduler import Scheduler
+from archetypes import ArchetypeField, BUILDING_ARCHETYPES, UNIT_ARCHETYPES
+
+# Заполняется в engine.init() при создании окна игры; импорт модуля ничего не загружает
+textures = assets.textures
 
 
 class Button:
@@ -117,103 +56,117 @@ class Button:
 
 
 class Building:
+    # Характеристики типа общие для всех зданий этого типа (таблица stats.json)
+    max_health = ArchetypeField()
+    width = ArchetypeField()
+    height = ArchetypeField()
+    spawn_interval = ArchetypeField()
+    hire_cost = ArchetypeField()
+    gold_interval = ArchetypeField()
+    gold_amount = ArchetypeField()
+    depletion_rate = ArchetypeField()
+    repair_cost = ArchetypeField()
+
     def __init__(self, x, y, building_type, difficulty=Difficulty.EASY):
         self.x = x
         self.y = y
         self.type = building_type
+        self.archetype = archetype = BUILDING_ARCHETYPES[building_type.name]
         self.level = 1
         self.is_broken = False
         self.difficulty = difficulty
+        self.health = archetype.max_health
+
+        # Изменяемое состояние заводим только зданиям с соответствующим поведением
+        # Найм и добыча идут по событиям Game.scheduler; event - ближайшее из них
+        if archetype.spawn_interval:
+            self.event = None
+            self.remaining = archetype.spawn_interval  # сколько оставалось до найма, когда отсчет встал
+            self.gold_reserve = 0  # Золотой запас для найма войск
+        if archetype.gold_interval:
+            self.event = None
+
+        # Геометрия здания не меняется, считаем ее один раз
+        width, height = archetype.width * GRID_SIZE, archetype.height * GRID_SIZE
+        self.center = (x + width // 2, y + height // 2)
+        self.rect = pygame.Rect(x, y, width, height)
 
-        if building_type == BuildingType.TOWN_HALL:
-            self.health = 500
-            self.max_health = 500
-            self.width = 2
-            self.height = 2
-        elif building_type == BuildingType.BARRACKS:
-            self.health = 200
-            self.max_health = 200
-            self.width = 2
-            self.height = 2
-            self.spawn_timer = 0
-            self.spawn_interval = 8000
-            self.gold_reserve = 0
-            self.hire_cost = 20
-        elif building_type == BuildingType.GOLD_MINE:
-            self.health = 150
-            self.max_health = 150
-            self.width = 1
-            self.height = 1
-            self.gold_timer = 0
-            self.gold_interval = 5000
-            self.gold_amount = 25
-            self.depletion_rate = 5
-        elif building_type == BuildingType.WALL:
-            self.health = 300
-            self.max_health = 300
-            self.width = 1
-            self.height = 1
-            self.repair_cost = 50
-
-    def update(self, dt, game):
-        if self.type == BuildingType.WALL and self.health <= 0:
-            self.is_broken = True
+    def start_timer(self, game):
+        """Заводит отсчет заново: следующий найм для казарм, следующий доход для шахты"""
+        self.stop_timer(game)
+        if self.spawn_interval:
+            self.remaining = self.spawn_interval
+            self.wake(game)
+        elif self.gold_interval and self.health > 0:
+            self.event = game.scheduler.schedule(self.gold_interval, self.produce_gold, game)
+
+    def stop_timer(self, game):
+        if self.event is not None:
+            game.scheduler.cancel(self.event)
+            self.event = None
+
+    def can_hire(self, game):
+        """Отсчет найма идет только во время волны, пока есть враги и хватает золота"""
+        return game.state == GameState.BATTLE and game.units.count(False) and self.gold_reserve >= self.hire_cost
+
+    def wake(self, game):
+        """Казармы продолжают остановленный отсчет с того места, где он встал (началась волна, пополнили золото)"""
+        if self.event is None and self.can_hire(game):
+            self.event = game.scheduler.schedule(self.remaining, self.hire, game)
+
+    def pause(self, game):
+        """Останавливает отсчет найма, запоминая, сколько до него оставалось"""
+        if self.event is not None:
+            self.remaining = max(0.0, self.event[0] - game.scheduler.now)
+            self.stop_timer(game)
+
+    def hire(self, game):
+        self.event = None
+        # Условия найма снимает Game.pause_barracks(); если они все же не выполнены, найм - сразу после wake()
+        self.remaining = 0
+        if not self.can_hire(game):
+            return
+        self.gold_reserve -= self.hire_cost
+        game.commands.spawn(self.center[0], self.center[1], UnitType.WARRIOR, True)
+        self.start_timer(game)
+
+    def produce_gold(self, game):
+        self.event = None
+        game.gold += self.gold_amount
+        self.health -= self.depletion_rate  # Уменьшаем здоровье шахты
+
+        if self.health <= 0:
+            self.health = 0  # Шахта истощена, следующего дохода не будет
         else:
-            self.is_broken = False
-
-        if self.type == BuildingType.BARRACKS and game.state == GameState.BATTLE:
-            # Проверяем, есть ли враги на поле боя и достаточно ли золота
-            enemies_exist = any(not unit.is_defender for unit in game.units)
-
-            if enemies_exist and self.gold_reserve >= self.hire_cost:
-                self.spawn_timer += dt
-                if self.spawn_timer >= self.spawn_interval:
-                    self.spawn_timer = 0
-                    self.gold_reserve -= self.hire_cost
-                    game.units.append(Unit(self.x + self.width * GRID_SIZE // 2,
-                                           self.y + self.height * GRID_SIZE // 2,
-                                           UnitType.WARRIOR, True, game.difficulty))
-
-        # Добавляем генерацию золота для шахты
-        elif self.type == BuildingType.GOLD_MINE and self.health > 0:
-            self.gold_timer += dt
-            if self.gold_timer >= self.gold_interval:
-                self.gold_timer = 0
-                game.gold += self.gold_amount
-                self.health -= self.depletion_rate  # Уменьшаем здоровье шахты
-
-                if self.health <= 0:
-                    self.health = 0  # Шахта истощена
+            self.start_timer(game)
 
     def repair(self, game):
         if self.type == BuildingType.WALL and self.health <= 0 and game.gold >= self.repair_cost:
-            # Для разрушенной стены - создаем новую на том же месте
-            game.buildings.remove(self)
-            new_wall = Building(self.x, self.y, BuildingType.WALL, self.difficulty)
-            game.buildings.append(new_wall)
+            self.restore(game)
             game.gold -= self.repair_cost
             return True
         return False
 
+    def restore(self, game):
+        """Возвращает зданию полное здоровье на том же месте"""
+        self.health = self.max_health
+        self.is_broken = False
+        # Отсчет шахты начнется заново - по уведомлению реестра
+        game.buildings.changed(self)
+
     def refill_gold(self, game, amount):
         if game.gold >= amount:
             game.gold -= amount
             self.gold_reserve += amount
+            self.wake(game)
             return True
         return False
 
     def draw(self, screen):
-        if self.type == BuildingType.TOWN_HALL:
-            screen.blit(textures['town_hall'], (self.x, self.y))
-        elif self.type == BuildingType.BARRACKS:
-            screen.blit(textures['barracks'], (self.x, self.y))
-        elif self.type == BuildingType.GOLD_MINE:
-            screen.blit(textures['gold_mine'], (self.x, self.y))
-        elif self.type == BuildingType.WALL:
-            if self.health <= 0:
-                screen.blit(textures['wall_broken'], (self.x, self.y))
-            else:
-                screen.blit(textures['wall'], (self.x, self.y))
+        texture = self.archetype.texture
+        if self.health <= 0 and self.archetype.broken_texture:
+            texture = self.archetype.broken_texture
+        screen.blit(textures[texture], (self.x, self.y))
 
         # Health bar для всех зданий
         if self.health != float('inf'):
@@ -225,153 +178,97 @@ class Building:
 
         # Отображение золотого запаса для бараков
         if self.type == BuildingType.BARRACKS:
-            font = pygame.font.SysFont(None, 20)
-            text = font.render(f"Gold: {self.gold_reserve}", True, YELLOW)
-            screen.blit(text, (self.x + 5, self.y + 5))
+            screen.blit(labels.render(f"Gold: {self.gold_reserve}", 20, YELLOW), (self.x + 5, self.y + 5))
 
         # Отображение состояния шахты
         if self.type == BuildingType.GOLD_MINE:
-            font = pygame.font.SysFont(None, 20)
             status = "Depleted" if self.health <= 0 else "Active"
-            text = font.render(status, True, YELLOW if self.health > 0 else RED)
-            screen.blit(text, (self.x + 5, self.y + 5))
+            screen.blit(labels.render(status, 20, YELLOW if self.health > 0 else RED), (self.x + 5, self.y + 5))
 
 
 class Unit:
+    # Все поля объявлены заранее: у юнита нет __dict__, а UnitPool может переиспользовать объект
+    __slots__ = ('x', 'y', 'type', 'archetype', 'is_defender', 'difficulty', 'health', 'max_health',
+                 'attack_damage', 'last_attack', 'target', 'target_wall', 'handle')
+
+    # Характеристики типа общие для всех юнитов этого типа (таблица stats.json)
+    speed = ArchetypeField()
+    attack_range = ArchetypeField()
+    attack_cooldown = ArchetypeField()
+    radius = ArchetypeField()
+
     def __init__(self, x, y, unit_type, is_defender=False, difficulty=Difficulty.EASY):
+        self.reset(x, y, unit_type, is_defender, difficulty)
+
+    def reset(self, x, y, unit_type, is_defender=False, difficulty=Difficulty.EASY):
+        """Заполняет все поля заново - и для нового юнита, и для взятого из UnitPool"""
         self.x = x
         self.y = y
         self.type = unit_type
+        self.archetype = archetype = UNIT_ARCHETYPES[unit_type.name]
         self.is_defender = is_defender
         self.difficulty = difficulty
-
-        # Замедленная скорость для всех юнитов
-        base_speed = {
-            UnitType.WARRIOR: 0.8,
-            UnitType.ARCHER: 0.6,
-            UnitType.GIANT: 0.4
-        }
-
-        self.speed = base_speed[unit_type]
-
-        # Характеристики юнитов
-        self.health = {
-            UnitType.WARRIOR: 100,
-            UnitType.ARCHER: 60,
-            UnitType.GIANT: 500
-        }[unit_type]
-
-        self.max_health = self.health
-        self.attack_damage = {
-            UnitType.WARRIOR: 10,
-            UnitType.ARCHER: 8,
-            UnitType.GIANT: 25
-        }[unit_type]
-
-        self.attack_range = 50 if unit_type != UnitType.ARCHER else 120
-        self.attack_cooldown = 1500
+        self.health = archetype.max_health
+        # Свои у каждого юнита: босс волны получает усиленные значения
+        self.max_health = archetype.max_health
+        self.attack_damage = archetype.attack_damage
         self.last_attack = 0
+        # Цель атаки хранится ссылкой UnitCollection: погибшая цель по ней уже не найдется
         self.target = None
         self.target_wall = None
-        self.radius = {
-            UnitType.WARRIOR: 15,
-            UnitType.ARCHER: 12,
-            UnitType.GIANT: 25
-        }[unit_type]
+        self.handle = None  # выдает UnitCollection.add
 
     def find_town_hall(self, game):
-        for building in game.buildings:
-            if building.type == BuildingType.TOWN_HALL:
-                return building
-        return None
-
-    def find_closest_wall(self, game, town_hall):
-        closest_wall = None
-        min_dist = float('inf')
-
-        town_hall_center_x = town_hall.x + town_hall.width * GRID_SIZE // 2
-        town_hall_center_y = town_hall.y + town_hall.height * GRID_SIZE // 2
-
-        for building in game.buildings:
-            if building.type == BuildingType.WALL and building.health > 0:
-                wall_center_x = building.x + building.width * GRID_SIZE // 2
-                wall_center_y = building.y + building.height * GRID_SIZE // 2
-
-                # Проверяем, лежит ли стена на линии между юнитом и Town Hall
-                line_distance = self._distance_to_line(
-                    self.x, self.y,
-                    town_hall_center_x, town_hall_center_y,
-                    wall_center_x, wall_center_y
-                )
-
-                # Если стена близко к линии, считаем её целью
-                if line_distance < GRID_SIZE // 2:
-                    dist_to_wall = math.sqrt((self.x - wall_center_x) ** 2 + (self.y - wall_center_y) ** 2)
-                    if dist_to_wall < min_dist:
-                        min_dist = dist_to_wall
-                        closest_wall = building
-
-        return closest_wall
-
-    def _distance_to_line(self, x1, y1, x2, y2, px, py):
-        """Вычисляет расстояние от точки (px, py) до линии (x1,y1)-(x2,y2)"""
-        line_length = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-        if line_length == 0:
-            return math.sqrt((px - x1) ** 2 + (py - y1) ** 2)
-        return abs((py - y1) * (x2 - x1) - (px - x1) * (y2 - y1)) / line_length
+        return game.buildings.town_hall
+
+    def move_towards(self, target_x, target_y, dt):
+        """Делает шаг в сторону точки; speed задана в пикселях за шаг FIXED_DT"""
+        dx = target_x - self.x
+        dy = target_y - self.y
+        dist = math.sqrt(dx * dx + dy * dy)
+        if dist > 0:
+            # Без atan2/cos/sin: корень и деление дают одинаковый результат и здесь, и в UnitStore.step
+            step = self.speed * (dt / FIXED_DT)
+            self.x += step * dx / dist
+            self.y += step * dy / dist
+
+    def attack_ready(self, dt):
+        """Копит время перезарядки, пока юнит в радиусе атаки; True - можно бить"""
+        self.last_attack += dt
+        return self.last_attack >= self.attack_cooldown
+
+    def nearest_opponent(self, game, max_dist=None):
+        """(ближайший юнит другой стороны, расстояние) или (None, inf); ищем только по сетке противника"""
+        grid = game.enemy_grid if self.is_defender else game.defender_grid
+        return grid.nearest(self.x, self.y, max_dist)
 
     def update(self, dt, game):
         if self.is_defender:
             # Логика защитников
-            closest_enemy = None
-            min_dist = float('inf')
-            for enemy in game.units:
-                if not enemy.is_defender:
-                    dist = math.sqrt((self.x - enemy.x) ** 2 + (self.y - enemy.y) ** 2)
-                    if dist < min_dist:
-                        min_dist = dist
-                        closest_enemy = enemy
+            closest_enemy, min_dist = self.nearest_opponent(game)
             if closest_enemy:
                 if min_dist <= self.attack_range:
-                    self.last_attack += dt
-                    if self.last_attack >= self.attack_cooldown:
+                    if self.attack_ready(dt):
                         self.last_attack = 0
-                        closest_enemy.health -= self.attack_damage
-                        if closest_enemy.health <= 0:
-                            game.units.remove(closest_enemy)
+                        game.commands.damage_unit(closest_enemy, self.attack_damage)
                 else:
-                    angle = math.atan2(closest_enemy.y - self.y, closest_enemy.x - self.x)
-                    self.x += self.speed * math.cos(angle)
-                    self.y += self.speed * math.sin(angle)
+                    self.move_towards(closest_enemy.x, closest_enemy.y, dt)
         else:
             # ЛОГИКА ДЛЯ ВРАГОВ
-            closest_defender = None
-            min_defender_dist = float('inf')
-
-            # Ищем ближайшего защитника в радиусе обнаружения
-            for defender in game.units:
-                if defender.is_defender:
-                    dist = math.sqrt((self.x - defender.x) ** 2 + (self.y - defender.y) ** 2)
-                    if dist < min_defender_dist:
-                        min_defender_dist = dist
-                        closest_defender = defender
+            # Ищем ближайшего защитника в радиусе обнаружения (дальше attack_range * 2 он нам не интересен)
+            closest_defender, min_defender_dist = self.nearest_opponent(game, self.attack_range * 2)
 
             # Если нашли защитника в радиусе атаки
             if closest_defender and min_defender_dist <= self.attack_range:
-                self.target = closest_defender
-                self.last_attack += dt
-                if self.last_attack >= self.attack_cooldown:
+                self.target = closest_defender.handle
+                if self.attack_ready(dt):
                     self.last_attack = 0
-                    closest_defender.health -= self.attack_damage
-                    if closest_defender.health <= 0:
-                        game.units.remove(closest_defender)
+                    game.commands.damage_unit(closest_defender, self.attack_damage)
                 return
 
             # Если защитник в увеличенном радиусе, двигаемся к нему
             if closest_defender and min_defender_dist <= self.attack_range * 2:
-                angle = math.atan2(closest_defender.y - self.y, closest_defender.x - self.x)
-                self.x += self.speed * math.cos(angle)
-                self.y += self.speed * math.sin(angle)
+                self.move_towards(closest_defender.x, closest_defender.y, dt)
                 return
 
             # Если нет защитников поблизости, продолжаем стандартное поведение
@@ -379,47 +276,25 @@ class Unit:
             if not town_hall:
                 return
 
-            town_hall_center_x = town_hall.x + town_hall.width * GRID_SIZE // 2
-            town_hall_center_y = town_hall.y + town_hall.height * GRID_SIZE // 2
+            town_hall_center_x, town_hall_center_y = town_hall.center
 
-            # Если мы уже сломали стену и идем через проход
-            if hasattr(self, 'broken_wall') and self.broken_wall:
-                # Проверяем дошли ли до центра сломанной стены
-                wall_center_x = self.broken_wall.x + self.broken_wall.width * GRID_SIZE // 2
-                wall_center_y = self.broken_wall.y + self.broken_wall.height * GRID_SIZE // 2
-                dist_to_wall = math.sqrt((self.x - wall_center_x) ** 2 + (self.y - wall_center_y) ** 2)
-
-                if dist_to_wall < 10:  # Достаточно близко к центру прохода
-                    self.broken_wall = None  # Проход пройден
-                else:
-                    # Продолжаем идти к центру сломанной стены
-                    angle = math.atan2(wall_center_y - self.y, wall_center_x - self.x)
-                    self.x += self.speed * math.cos(angle)
-                    self.y += self.speed * math.sin(angle)
-                    return
+            # Стену сломали (урон применяется в конце шага, поэтому узнаем об этом здесь)
+            if self.target_wall and self.target_wall.health <= 0:
+                self.target_wall = None
 
             # Если атакуем стену
-            if hasattr(self, 'target_wall') and self.target_wall:
+            if self.target_wall:
                 if self.target_wall.health > 0:
-                    wall_center_x = self.target_wall.x + self.target_wall.width * GRID_SIZE // 2
-                    wall_center_y = self.target_wall.y + self.target_wall.height * GRID_SIZE // 2
+                    wall_center_x, wall_center_y = self.target_wall.center
                     dist_to_wall = math.sqrt((self.x - wall_center_x) ** 2 + (self.y - wall_center_y) ** 2)
 
                     if dist_to_wall <= self.attack_range:
-                        self.last_attack += dt
-                        if self.last_attack >= self.attack_cooldown:
+                        if self.attack_ready(dt):
                             self.last_attack = 0
-                            self.target_wall.health -= self.attack_damage
-
-                            # Если стену сломали
-                            if self.target_wall.health <= 0:
-                                self.broken_wall = self.target_wall
-                                self.target_wall = None
+                            game.commands.damage_building(self.target_wall, self.attack_damage)
                     else:
                         # Двигаемся к стене
-                        angle = math.atan2(wall_center_y - self.y, wall_center_x - self.x)
-                        self.x += self.speed * math.cos(angle)
-                        self.y += self.speed * math.sin(angle)
+                        self.move_towards(wall_center_x, wall_center_y, dt)
                     return
 
             # Проверяем прямой путь к Town Hall
@@ -428,170 +303,46 @@ class Unit:
 
                 if dist_to_town_hall <= self.attack_range:
                     # Атакуем Town Hall
-                    self.last_attack += dt
-                    if self.last_attack >= self.attack_cooldown:
+                    if self.attack_ready(dt):
                         self.last_attack = 0
-                        town_hall.health -= self.attack_damage
-                        if town_hall.health <= 0:
-                            game.state = GameState.LOSE
+                        game.commands.damage_building(town_hall, self.attack_damage)
                 else:
-                    angle = math.atan2(town_hall_center_y - self.y, town_hall_center_x - self.x)
-                    self.x += self.speed * math.cos(angle)
-                    self.y += self.speed * math.sin(angle)
+                    self.move_towards(town_hall_center_x, town_hall_center_y, dt)
                 return
 
-            closest_wall = None
-            closest_broken_wall = None
-            min_wall_dist = float('inf')
-            min_broken_wall_dist = float('inf')
-
-            for building in game.buildings:
-                if building.type == BuildingType.WALL:
-                    wall_center_x = building.x + building.width * GRID_SIZE // 2
-                    wall_center_y = building.y + building.height * GRID_SIZE // 2
-                    dist = math.sqrt((self.x - wall_center_x) ** 2 + (self.y - wall_center_y) ** 2)
-
-                    if building.health > 0:
-                        # Целая стена - проверяем, что она на пути к Town Hall
-                        if self.is_wall_on_path(building, town_hall) and dist < min_wall_dist:
-                            min_wall_dist = dist
-                            closest_wall = building
-                    else:
-                        # Сломанная стена - проверяем, что через нее есть путь к Town Hall
-                        if self.is_good_passage(building, town_hall, game) and dist < min_broken_wall_dist:
-                            min_broken_wall_dist = dist
-                            closest_broken_wall = building
-
-            # Выбираем стратегию
-            if closest_broken_wall and (not closest_wall or min_broken_wall_dist < min_wall_dist * 1.5):
-                # Идем к сломанной стене
-                self.broken_wall = closest_broken_wall
-                target_x = closest_broken_wall.x + closest_broken_wall.width * GRID_SIZE // 2
-                target_y = closest_broken_wall.y + closest_broken_wall.height * GRID_SIZE // 2
-            elif closest_wall:
-                # Атакуем ближайшую стену на пути
-                self.target_wall = closest_wall
-                target_x = closest_wall.x + closest_wall.width * GRID_SIZE // 2
-                target_y = closest_wall.y + closest_wall.height * GRID_SIZE // 2
-            else:
-                # Если стен нет - идем к Town Hall
-                target_x = town_hall_center_x
-                target_y = town_hall_center_y
-
-            # Двигаемся к выбранной цели
-            angle = math.atan2(target_y - self.y, target_x - self.x)
-            self.x += self.speed * math.cos(angle)
-            self.y += self.speed * math.sin(angle)
-
-    def is_wall_on_path(self, wall, town_hall):
-        """Проверяет, находится ли стена на прямой линии к Town Hall"""
-        town_hall_center = (town_hall.x + town_hall.width * GRID_SIZE // 2,
-                            town_hall.y + town_hall.height * GRID_SIZE // 2)
-        self_center = (self.x, self.y)
-        wall_rect = pygame.Rect(wall.x, wall.y, wall.width * GRID_SIZE, wall.height * GRID_SIZE)
-        return self.line_intersects_rect(self_center, town_hall_center, wall_rect)
-
-    def is_good_passage(self, broken_wall, town_hall, game):
-        """Проверяет, ведет ли сломанная стена к Town Hall без других препятствий"""
-        # Проверяем путь от себя к сломанной стене
-        if self.is_path_blocked_to_wall(game, broken_wall):
-            return False
-
-        # Проверяем путь от сломанной стены к Town Hall
-        town_hall_center = (town_hall.x + town_hall.width * GRID_SIZE // 2,
-                            town_hall.y + town_hall.height * GRID_SIZE // 2)
-        wall_center = (broken_wall.x + broken_wall.width * GRID_SIZE // 2,
-                       broken_wall.y + broken_wall.height * GRID_SIZE // 2)
-
-        for building in game.buildings:
-            if building.type == BuildingType.WALL and building.health > 0 and building != broken_wall:
-                wall_rect = pygame.Rect(building.x, building.y,
-                                        building.width * GRID_SIZE, building.height * GRID_SIZE)
-                if self.line_intersects_rect(wall_center, town_hall_center, wall_rect):
-                    return False
-        return True
-
-    def is_path_blocked_to_wall(self, game, target_wall):
-        """Проверяет, есть ли стены на пути к целевой стене"""
-        wall_center = (target_wall.x + target_wall.width * GRID_SIZE // 2,
-                       target_wall.y + target_wall.height * GRID_SIZE // 2)
-        self_center = (self.x, self.y)
-
-        for building in game.buildings:
-            if building.type == BuildingType.WALL and building.health > 0 and building != target_wall:
-                wall_rect = pygame.Rect(building.x, building.y,
-                                        building.width * GRID_SIZE, building.height * GRID_SIZE)
-                if self.line_intersects_rect(self_center, wall_center, wall_rect):
-                    return True
-        return False
+            # Прямой путь закрыт - идем по общему полю расстояний на одну клетку к Town Hall
+            next_cell = game.flow_field.next_cell(self.x, self.y)
+            if next_cell is None:
+                self.move_towards(town_hall_center_x, town_hall_center_y, dt)
+                return
+
+            wall = game.wall_grid.cells[next_cell]
+            if wall:
+                # Поле решило, что сломать эту стену быстрее, чем обходить
+                self.target_wall = wall
+            target_x, target_y = game.flow_field.cell_center(next_cell)
+            self.move_towards(target_x, target_y, dt)
 
     def is_path_blocked(self, game, town_hall):
         """Проверяет, есть ли стены на прямой линии к Town Hall"""
-        town_hall_center = (town_hall.x + town_hall.width * GRID_SIZE // 2,
-                            town_hall.y + town_hall.height * GRID_SIZE // 2)
-        self_center = (self.x, self.y)
-
-        for building in game.buildings:
-            if building.type == BuildingType.WALL and building.health > 0:
-                wall_rect = pygame.Rect(building.x, building.y,
-                                        building.width * GRID_SIZE, building.height * GRID_SIZE)
-                if self.line_intersects_rect(self_center, town_hall_center, wall_rect):
-                    return True
-        return False
+        blocked = game.blocked_paths.get(self)
+        if blocked is not None:
+            return blocked
+        town_hall_center = town_hall.center
+        return game.wall_grid.is_blocked((self.x, self.y), town_hall_center)
 
-    def line_intersects_rect(self, p1, p2, rect):
-        """Проверяет, пересекает ли линия p1-p2 прямоугольник rect"""
-
-        def clip(denom, numer, t0, t1):
-            if denom == 0:
-                return numer <= 0
-            t = numer / denom
-            if denom > 0:
-                if t > t1:
-                    return False
-                if t > t0:
-                    t0 = t
-            else:
-                if t < t0:
-                    return False
-                if t < t1:
-                    t1 = t
-            return True, t0, t1
-
-        x1, y1 = p1
-        x2, y2 = p2
-        t0, t1 = 0, 1
-        dx = x2 - x1
-        dy = y2 - y1
-
-        # Проверяем каждую границу прямоугольника
-        if not clip(-dx, x1 - rect.left, t0, t1):
-            return False
-        if not clip(dx, rect.right - x1, t0, t1):
-            return False
-        if not clip(-dy, y1 - rect.top, t0, t1):
-            return False
-        if not clip(dy, rect.bottom - y1, t0, t1):
-            return False
-
-        return True
-
-    def draw(self, screen):
-        if self.type == UnitType.WARRIOR:
-            texture = textures['warrior'] if self.is_defender else textures['warrior_enemy']
-        elif self.type == UnitType.ARCHER:
-            texture = textures['archer'] if self.is_defender else textures['archer_enemy']
-        elif self.type == UnitType.GIANT:
-            texture = textures['giant'] if self.is_defender else textures['giant_enemy']
+    def draw(self, screen, units):
+        texture = textures[self.archetype.texture if self.is_defender else self.archetype.enemy_texture]
 
         screen.blit(texture, (int(self.x - texture.get_width() // 2), int(self.y - texture.get_height() // 2)))
 
         # Если юнит атакует и есть цель, рисуем индикатор атаки
-        if self.last_attack < 100 and hasattr(self, 'target') and self.target is not None:
+        target = units.get(self.target) if self.last_attack < 100 else None
+        if target is not None:
             attack_color = RED if not self.is_defender else YELLOW
             pygame.draw.line(screen, attack_color,
                              (int(self.x), int(self.y)),
-                             (int(self.target.x), int(self.target.y)),
+                             (int(target.x), int(target.y)),
                              2)
 
 
@@ -604,11 +355,30 @@ class Unit:
                           int(2 * self.radius * health_ratio), 5))
 
 
+class StoredUnit(StoredUnitMixin, Unit):
+    """Unit, чьи координаты, здоровье и перезарядка живут в массивах UnitStore"""
+
+
 class Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Clash of Berserk")
+    def __init__(self, headless=False, unit_store=False, seed=None, balance=None):
+        # В headless-режиме окно не создается, а draw() ничего не рисует
+        self.headless = headless
+        if headless:
+            self.screen = None
+        else:
+            self.screen = engine.open_window(SCREEN_WIDTH, SCREEN_HEIGHT, "Clash of Berserk")
         self.clock = pygame.time.Clock()
+        # Число сделанных шагов симуляции - время в записи боя
+        self.tick = 0
+        self.recorder = None
+        # Время фаз кадра; F3 показывает перцентили поверх игры
+        self.profiler = FrameProfiler()
+        self.profile_path = None
+        # Тип постройки -> готовая поверхность предпросмотра
+        self.previews = {}
+        self.seed_rng(random.randrange(2 ** 32) if seed is None else seed)
+        # Параметры волн и стартового золота (их перебирает balance_sweep.py)
+        self.balance = balance or Balance()
         self.running = True
         self.state = GameState.MENU
         self.difficulty = Difficulty.EASY
@@ -619,10 +389,28 @@ class Game:
         self.wave_interval = 3000
         self.gold = 500
         self.selected_building = None
-        self.buildings = []
-        self.units = []
-        self.font = pygame.font.SysFont(None, 36)
-        self.small_font = pygame.font.SysFont(None, 24)
+        self.buildings = BuildingRegistry()
+        # Целые стены в виде растровой карты - для быстрых проверок прямой видимости
+        self.wall_grid = WallGrid()
+        # Общее поле расстояний до Town Hall для маршрутов врагов
+        self.flow_field = FlowField(self.wall_grid)
+        # Защитники и враги хранятся раздельно, со счетчиками живых по сторонам
+        self.units = UnitCollection()
+        # Отдельные сетки для каждой стороны: поиск всегда идет по противнику
+        # При равном расстоянии ближайшим считается юнит с меньшим слотом - так же выбирает UnitStore
+        self.defender_grid = SpatialGrid(tie_key=unit_slot)
+        self.enemy_grid = SpatialGrid(tie_key=unit_slot)
+        # Появление, гибель и урон за шаг - применяются в конце update()
+        self.commands = CommandBuffer()
+        # Доход шахт и найм в казармах - события по игровому времени, а не таймеры в каждом здании
+        self.scheduler = Scheduler()
+        # Необязательное хранилище юнитов в массивах NumPy (пакетное движение и перезарядка)
+        self.unit_store = UnitStore() if unit_store else None
+        # Погибшие юниты ждут здесь следующего спавна (только без UnitStore)
+        self.unit_pool = UnitPool(Unit)
+        # Прямая видимость Town Hall для всей волны, посчитанная пакетом (только с UnitStore)
+        self.wall_rects = None
+        self.blocked_paths = {}
         self.selected_wall = None
         self.selected_barracks = None
         self.selected_mine = None
@@ -636,67 +424,171 @@ class Game:
 
         self.init_village()
 
-    def init_village(self):
-        self.buildings = []
-        self.units = []
-
-        town_hall = Building(SCREEN_WIDTH // 2 - GRID_SIZE, SCREEN_HEIGHT // 2 - GRID_SIZE, BuildingType.TOWN_HALL,
-                             self.difficulty)
-        self.buildings.append(town_hall)
-
-        self.create_perimeter_walls()
+    # Шрифты нужны только для отрисовки, поэтому берутся при первом обращении
+    @property
+    def font(self):
+        return fonts.get(36)
+
+    @property
+    def small_font(self):
+        return fonts.get(24)
+
+    def init_village(self, layout=None):
+        self.buildings = BuildingRegistry()
+        self.buildings.subscribe(self.on_building_event)
+        if self.unit_store is not None:
+            self.wall_rects = WallRects(self.buildings)
+        self.wall_grid.clear()
+        self.flow_field = FlowField(self.wall_grid)
+        self.units.clear()
+        self.commands.clear()
+        self.scheduler.clear()
+        self.defender_grid.clear()
+        self.enemy_grid.clear()
+        if self.unit_store is not None:
+            self.unit_store.clear()
+
+        if layout is None:
+            town_hall = Building(SCREEN_WIDTH // 2 - GRID_SIZE, SCREEN_HEIGHT // 2 - GRID_SIZE, BuildingType.TOWN_HALL,
+                                 self.difficulty)
+            self.buildings.add(town_hall)
+            self.create_perimeter_walls()
+        else:
+            # Расстановка из записи боя или файла расстановок
+            if not any(building_type == BuildingType.TOWN_HALL for building_type, _, _ in layout):
+                raise ValueError("В расстановке нет Town Hall: врагам некуда идти")
+            for building_type, x, y in layout:
+                self.buildings.add(Building(x, y, building_type, self.difficulty))
+        self.flow_field.set_goal(self.buildings.town_hall)
 
     def create_perimeter_walls(self):
         for x in range(BORDER_OFFSET, SCREEN_WIDTH - BORDER_OFFSET, GRID_SIZE):
-            self.buildings.append(Building(x, BORDER_OFFSET, BuildingType.WALL, self.difficulty))
-            self.buildings.append(
+            self.buildings.add(Building(x, BORDER_OFFSET, BuildingType.WALL, self.difficulty))
+            self.buildings.add(
                 Building(x, SCREEN_HEIGHT - BORDER_OFFSET - GRID_SIZE, BuildingType.WALL, self.difficulty))
 
         for y in range(BORDER_OFFSET + GRID_SIZE, SCREEN_HEIGHT - BORDER_OFFSET - GRID_SIZE, GRID_SIZE):
-            self.buildings.append(Building(BORDER_OFFSET, y, BuildingType.WALL, self.difficulty))
-            self.buildings.append(
+            self.buildings.add(Building(BORDER_OFFSET, y, BuildingType.WALL, self.difficulty))
+            self.buildings.add(
                 Building(SCREEN_WIDTH - BORDER_OFFSET - GRID_SIZE, y, BuildingType.WALL, self.difficulty))
 
+    def on_building_event(self, event, building):
+        """Держит сетку стен, поле маршрутов и таймеры производства в соответствии с реестром зданий"""
+        if building.type in (BuildingType.BARRACKS, BuildingType.GOLD_MINE):
+            # Новое или восстановленное здание начинает отсчет заново
+            if event == 'removed':
+                building.stop_timer(self)
+            else:
+                building.start_timer(self)
+            return
+        if building.type != BuildingType.WALL:
+            return
+        # Стены ничего не делают каждый шаг: их состояние меняется только по событиям урона и ремонта
+        building.is_broken = building.health <= 0
+        self.blocked_paths = {}
+        if event == 'removed' or building.health <= 0:
+            self.wall_grid.clear_wall(building)
+            self.flow_field.wall_removed(building)
+        else:
+            self.wall_grid.set_wall(building)
+            self.flow_field.wall_added(building)
+
     def spawn_wave(self):
-        self.units = [unit for unit in self.units if unit.is_defender]
+        for unit in self.units.remove_faction(False):
+            if self.unit_store is not None:
+                self.unit_store.remove(unit)
+            else:
+                self.unit_pool.release(unit)
+        self.enemy_grid.clear()
 
-        wave_multiplier = 1 + self.wave * 0.5
-        difficulty_multiplier = 1 + self.difficulty.value * 0.3
+        balance = self.balance
+        wave_multiplier = 1 + self.wave * balance.wave_step
+        difficulty_multiplier = 1 + self.difficulty.value * balance.difficulty_step
+        count = int(balance.wave_count(self.wave) * wave_multiplier * difficulty_multiplier)
 
         if self.wave == 0:
-            count = int(6 * wave_multiplier * difficulty_multiplier)
             for _ in range(count):
                 self.spawn_enemy(UnitType.WARRIOR)
 
         elif self.wave == 1:
-            count = int(9 * wave_multiplier * difficulty_multiplier)
             for _ in range(count):
-                unit_type = random.choice([UnitType.WARRIOR, UnitType.ARCHER])
+                unit_type = self.wave_rng.choice([UnitType.WARRIOR, UnitType.ARCHER])
                 self.spawn_enemy(unit_type)
 
         elif self.wave == 2:
-            count = int(7 * wave_multiplier * difficulty_multiplier)
             for _ in range(count):
                 self.spawn_enemy(UnitType.WARRIOR)
 
             boss = self.spawn_enemy(UnitType.GIANT)
-            boss.health = int(800 * difficulty_multiplier)
+            boss.health = int(balance.giant_health * difficulty_multiplier)
             boss.max_health = boss.health
-            boss.attack_damage = int(40 * difficulty_multiplier)
+            boss.attack_damage = int(balance.giant_damage * difficulty_multiplier)
+
+        self.wake_barracks()
+
+    def wake_barracks(self):
+        """Казармы, чей отсчет остановился вне боя или без врагов, продолжают его"""
+        for barracks in self.buildings.barracks:
+            barracks.wake(self)
+
+    def pause_barracks(self):
+        """Бой прерван (справка) или враги кончились: казармы ждут, не теряя накопленного отсчета"""
+        for barracks in self.buildings.barracks:
+            barracks.pause(self)
 
     def spawn_enemy(self, unit_type):
+        rng = self.spawn_rng
         spawn_options = [
-            lambda: (random.randint(0, BORDER_OFFSET), random.randint(0, SCREEN_HEIGHT)),
-            lambda: (random.randint(SCREEN_WIDTH - BORDER_OFFSET, SCREEN_WIDTH), random.randint(0, SCREEN_HEIGHT)),
-            lambda: (random.randint(0, SCREEN_WIDTH), random.randint(0, BORDER_OFFSET)),
-            lambda: (random.randint(0, SCREEN_WIDTH), random.randint(SCREEN_HEIGHT - BORDER_OFFSET, SCREEN_HEIGHT))
+            lambda: (rng.randint(0, BORDER_OFFSET), rng.randint(0, SCREEN_HEIGHT)),
+            lambda: (rng.randint(SCREEN_WIDTH - BORDER_OFFSET, SCREEN_WIDTH), rng.randint(0, SCREEN_HEIGHT)),
+            lambda: (rng.randint(0, SCREEN_WIDTH), rng.randint(0, BORDER_OFFSET)),
+            lambda: (rng.randint(0, SCREEN_WIDTH), rng.randint(SCREEN_HEIGHT - BORDER_OFFSET, SCREEN_HEIGHT))
         ]
 
-        spawn_func = random.choice(spawn_options)
+        spawn_func = rng.choice(spawn_options)
         x, y = spawn_func()
-        enemy = Unit(x, y, unit_type, False, self.difficulty)
-        self.units.append(enemy)
-        return enemy
+        return self.spawn_unit(x, y, unit_type, False)
+
+    def spawn_unit(self, x, y, unit_type, is_defender):
+        if self.unit_store is not None:
+            unit = StoredUnit(self.unit_store, x, y, unit_type, is_defender, self.difficulty)
+        else:
+            unit = self.unit_pool.acquire(x, y, unit_type, is_defender, self.difficulty)
+        self.add_unit(unit)
+        return unit
+
+    def grid_for(self, unit):
+        return self.defender_grid if unit.is_defender else self.enemy_grid
+
+    def add_unit(self, unit):
+        self.units.add(unit)
+        # С UnitStore ближайших ищет сам UnitStore, сетки не нужны
+        if self.unit_store is None:
+            self.grid_for(unit).insert(unit)
+        else:
+            self.unit_store.slot[unit._index] = unit.handle.slot
+
+    def remove_unit(self, unit):
+        if self.units.remove(unit):
+            if not unit.is_defender and not self.units.count(False):
+                self.pause_barracks()
+            self.grid_for(unit).remove(unit)
+            if self.unit_store is not None:
+                self.unit_store.remove(unit)
+            else:
+                self.unit_pool.release(unit)
+
+    def seed_rng(self, seed):
+        """Свой генератор у каждой подсистемы: лишний вызов в одной не сдвигает случайность в другой"""
+        self.seed = seed
+        self.wave_rng = random.Random(f"{seed}:waves")
+        self.spawn_rng = random.Random(f"{seed}:spawn")
+
+    def select_difficulty(self, difficulty):
+        """Выбирает уровень сложности и переходит к фазе строительства"""
+        self.difficulty = difficulty
+        self.gold = self.balance.start_gold[difficulty]
+        self.state = GameState.BUILD
 
     def draw_help_screen(self):
         # Полупрозрачный фон
@@ -755,7 +647,9 @@ class Game:
                     right_click = True
 
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_m:  # M - вкл/выкл музыку
+                if event.key == pygame.K_F3:  # F3 - оверлей профилировщика
+                    self.profiler.toggle_overlay()
+                elif event.key == pygame.K_m:  # M - вкл/выкл музыку
                     if pygame.mixer.music.get_busy():
                         pygame.mixer.music.pause()
                     else:
@@ -767,30 +661,18 @@ class Game:
                     vol = max(0.0, pygame.mixer.music.get_volume() - 0.1)
                     pygame.mixer.music.set_volume(vol)
                 elif event.key == pygame.K_f:
-                    if self.selected_barracks:
-                        self.selected_barracks.refill_gold(self, 50)
+                    self.apply_command(Command.REFILL)
                 elif event.key == pygame.K_r:
-                    if self.selected_mine and self.selected_mine.health <= 0:
-                        self.buildings.remove(self.selected_mine)
-                        new_mine = Building(self.selected_mine.x, self.selected_mine.y,
-                                            BuildingType.GOLD_MINE, self.difficulty)
-                        self.buildings.append(new_mine)
-                        self.selected_mine = new_mine
+                    self.apply_command(Command.RESTORE)
                 elif event.key == pygame.K_ESCAPE:
                     if self.state == GameState.HELP:
-                        self.state = GameState.BUILD if self.build_timer < self.build_time else GameState.BATTLE
+                        self.apply_command(Command.CLOSE_HELP)
                 elif event.key == pygame.K_1 and self.state in [GameState.BUILD, GameState.BATTLE]:
-                    self.selected_building = BuildingType.BARRACKS
-                    self.selected_barracks = None
-                    self.selected_mine = None
+                    self.apply_command(Command.SELECT_TYPE, BuildingType.BARRACKS.value)
                 elif event.key == pygame.K_2 and self.state in [GameState.BUILD, GameState.BATTLE]:
-                    self.selected_building = BuildingType.GOLD_MINE
-                    self.selected_barracks = None
-                    self.selected_mine = None
+                    self.apply_command(Command.SELECT_TYPE, BuildingType.GOLD_MINE.value)
                 elif event.key == pygame.K_3 and self.state in [GameState.BUILD, GameState.BATTLE]:
-                    self.selected_building = BuildingType.WALL
-                    self.selected_barracks = None
-                    self.selected_mine = None
+                    self.apply_command(Command.SELECT_TYPE, BuildingType.WALL.value)
 
         # Проверка кнопок
         if self.state == GameState.MENU:
@@ -798,96 +680,135 @@ class Game:
             self.medium_button.check_hover(mouse_pos)
             self.hard_button.check_hover(mouse_pos)
 
-            if mouse_click:
+            # Пока грузятся текстуры, вместо меню виден экран загрузки - клики по невидимым кнопкам не считаются
+            if mouse_click and self.assets_ready():
                 if self.easy_button.is_clicked(mouse_pos, mouse_click):
-                    self.difficulty = Difficulty.EASY
-                    self.gold = 500
-                    self.state = GameState.BUILD
+                    self.apply_command(Command.DIFFICULTY, Difficulty.EASY.value)
                 elif self.medium_button.is_clicked(mouse_pos, mouse_click):
-                    self.difficulty = Difficulty.MEDIUM
-                    self.gold = 400
-                    self.state = GameState.BUILD
+                    self.apply_command(Command.DIFFICULTY, Difficulty.MEDIUM.value)
                 elif self.hard_button.is_clicked(mouse_pos, mouse_click):
-                    self.difficulty = Difficulty.HARD
-                    self.gold = 300
-                    self.state = GameState.BUILD
+                    self.apply_command(Command.DIFFICULTY, Difficulty.HARD.value)
 
         elif self.state == GameState.HELP:
             self.back_button.check_hover(mouse_pos)
             if mouse_click and self.back_button.is_clicked(mouse_pos, mouse_click):
-                self.state = GameState.BUILD if self.build_timer < self.build_time else GameState.BATTLE
+                self.apply_command(Command.CLOSE_HELP)
 
         elif self.state in [GameState.BUILD, GameState.BATTLE]:
             self.help_button.check_hover(mouse_pos)
             if mouse_click and self.help_button.is_clicked(mouse_pos, mouse_click):
-                self.state = GameState.HELP
+                self.apply_command(Command.OPEN_HELP)
 
             if right_click:
-                self.selected_building = None
-                self.selected_barracks = None
-                self.selected_mine = None
+                self.apply_command(Command.CANCEL)
 
             if mouse_click:
-                if self.selected_building:
-                    grid_x = (mouse_pos[0] // GRID_SIZE) * GRID_SIZE
-                    grid_y = (mouse_pos[1] // GRID_SIZE) * GRID_SIZE
-
-                    valid_position = True
-                    new_width = 2 if self.selected_building in [BuildingType.TOWN_HALL, BuildingType.BARRACKS] else 1
-                    new_height = 2 if self.selected_building in [BuildingType.TOWN_HALL, BuildingType.BARRACKS] else 1
-
-                    if (grid_x < BORDER_OFFSET or
-                            grid_x + new_width * GRID_SIZE > SCREEN_WIDTH - BORDER_OFFSET or
-                            grid_y < BORDER_OFFSET or
-                            grid_y + new_height * GRID_SIZE > SCREEN_HEIGHT - BORDER_OFFSET):
-                        valid_position = False
-
-                    for building in self.buildings:
-                        if (grid_x < building.x + building.width * GRID_SIZE and
-                                grid_x + new_width * GRID_SIZE > building.x and
-                                grid_y < building.y + building.height * GRID_SIZE and
-                                grid_y + new_height * GRID_SIZE > building.y):
-                            valid_position = False
-                            break
-
-                    if valid_position:
-                        cost = 0
-                        if self.selected_building == BuildingType.BARRACKS:
-                            cost = 100
-                        elif self.selected_building == BuildingType.GOLD_MINE:
-                            cost = 75
-                        elif self.selected_building == BuildingType.WALL:
-                            cost = 50
-
-                        if self.gold >= cost:
-                            self.gold -= cost
-                            new_building = Building(grid_x, grid_y, self.selected_building, self.difficulty)
-                            self.buildings.append(new_building)
-                            self.selected_building = None
-                else:
-                    # Сброс выбора
-                    self.selected_barracks = None
-                    self.selected_mine = None
-
-                    # Выбор здания для взаимодействия
-                    for building in self.buildings:
-                        if (building.x <= mouse_pos[0] <= building.x + building.width * GRID_SIZE and
-                                building.y <= mouse_pos[1] <= building.y + building.height * GRID_SIZE):
-                            if building.type == BuildingType.WALL and building.health <= 0:
-                                building.repair(self)
-                            elif building.type == BuildingType.BARRACKS:
-                                self.selected_barracks = building
-                            elif building.type == BuildingType.GOLD_MINE:
-                                self.selected_mine = building
-                            break
+                self.apply_command(Command.CLICK, *mouse_pos)
 
         elif self.state in [GameState.WIN, GameState.LOSE]:
             for event in pygame.event.get():
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
-                    self.__init__()
+                    # Запись покрывает одну игру
+                    self.stop_recording()
+                    profiler, profile_path = self.profiler, self.profile_path
+                    self.__init__(self.headless, self.unit_store is not None, balance=self.balance)
+                    self.profiler, self.profile_path = profiler, profile_path
+
+    def apply_command(self, command, *args):
+        """Единая точка для действий игрока, меняющих симуляцию: отсюда они попадают в запись боя"""
+        if self.recorder is not None:
+            self.recorder.write(self.tick, command, args)
+
+        if command == Command.DIFFICULTY:
+            self.select_difficulty(Difficulty(args[0]))
+        elif command == Command.SELECT_TYPE:
+            self.selected_building = BuildingType(args[0])
+            self.selected_barracks = None
+            self.selected_mine = None
+        elif command == Command.CANCEL:
+            self.selected_building = None
+            self.selected_barracks = None
+            self.selected_mine = None
+        elif command == Command.CLICK:
+            self.click(*args)
+        elif command == Command.REFILL:
+            if self.selected_barracks:
+                self.selected_barracks.refill_gold(self, 50)
+        elif command == Command.RESTORE:
+            if self.selected_mine and self.selected_mine.health <= 0:
+                self.selected_mine.restore(self)
+        elif command == Command.OPEN_HELP:
+            self.state = GameState.HELP
+            self.pause_barracks()
+        elif command == Command.CLOSE_HELP:
+            self.state = GameState.BUILD if self.build_timer < self.build_time else GameState.BATTLE
+            self.wake_barracks()
+
+    def click(self, x, y):
+        """Левый клик по полю: ставит выбранное здание или выбирает/чинит здание под курсором"""
+        if self.selected_building:
+            grid_x = (x // GRID_SIZE) * GRID_SIZE
+            grid_y = (y // GRID_SIZE) * GRID_SIZE
+
+            valid_position = True
+            archetype = BUILDING_ARCHETYPES[self.selected_building.name]
+            new_width = archetype.width
+            new_height = archetype.height
+
+            if (grid_x < BORDER_OFFSET or
+                    grid_x + new_width * GRID_SIZE > SCREEN_WIDTH - BORDER_OFFSET or
+                    grid_y < BORDER_OFFSET or
+                    grid_y + new_height * GRID_SIZE > SCREEN_HEIGHT - BORDER_OFFSET):
+                valid_position = False
+
+            new_rect = pygame.Rect(grid_x, grid_y, new_width * GRID_SIZE, new_height * GRID_SIZE)
+            for building in self.buildings:
+                if building.rect.colliderect(new_rect):
+                    valid_position = False
+                    break
+
+            if valid_position:
+                cost = archetype.cost
+                if self.gold >= cost:
+                    self.gold -= cost
+                    new_building = Building(grid_x, grid_y, self.selected_building, self.difficulty)
+                    self.buildings.add(new_building)
+                    self.selected_building = None
+        else:
+            # Сброс выбора
+            self.selected_barracks = None
+            self.selected_mine = None
 
-    def update(self):
-        dt = self.clock.get_time()
+            # Выбор здания для взаимодействия
+            for building in self.buildings:
+                if (building.x <= x <= building.x + building.width * GRID_SIZE and
+                        building.y <= y <= building.y + building.height * GRID_SIZE):
+                    if building.type == BuildingType.WALL and building.health <= 0:
+                        building.repair(self)
+                    elif building.type == BuildingType.BARRACKS:
+                        self.selected_barracks = building
+                    elif building.type == BuildingType.GOLD_MINE:
+                        self.selected_mine = building
+                    break
+
+    def start_recording(self, path):
+        """Начинает писать бой в файл: seed, текущие здания и дальше все команды игрока"""
+        self.stop_recording()
+        self.recorder = ReplayWriter(path, self.seed, self.buildings)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close(self.tick)
+            self.recorder = None
+
+    def start_profiling(self, path):
+        """Копит время фаз каждого кадра, чтобы при выходе выгрузить их в path"""
+        self.profile_path = path
+        self.profiler.keep_samples = True
+
+    def update(self, dt=FIXED_DT):
+        """Один шаг симуляции; при одинаковых seed, шаге и вводе бой повторяется в точности"""
+        self.tick += 1
 
         if self.state == GameState.BUILD:
             self.build_timer += dt
@@ -897,9 +818,7 @@ class Game:
                 self.spawn_wave()
 
         elif self.state == GameState.BATTLE:
-            enemies_remaining = any(not unit.is_defender for unit in self.units)
-
-            if not enemies_remaining:
+            if not self.units.count(False):
                 self.wave_timer += dt
                 if self.wave_timer >= self.wave_interval:
                     self.wave_timer = 0
@@ -909,18 +828,89 @@ class Game:
                     else:
                         self.state = GameState.WIN
 
-        # Обновляем здания (включая казармы и шахты)
-        for building in self.buildings:
-            building.update(dt, self)
+        # Наступившие события зданий: доход шахт и найм в казармах
+        with self.profiler.phase('buildings'):
+            self.scheduler.advance(dt)
 
         # Обновляем юнитов
-        for unit in self.units[:]:
-            unit.update(dt, self)
-            if unit.health <= 0 and unit in self.units:
-                self.units.remove(unit)
+        if self.unit_store is not None:
+            self.update_stored_units(dt)
+        else:
+            ai_time = [0.0, 0.0]  # враги, защитники
+            for unit in self.units:
+                start = time.perf_counter()
+                unit.update(dt, self)
+                ai_time[unit.is_defender] += time.perf_counter() - start
+                self.grid_for(unit).move(unit)
+            self.profiler.add('ai_enemies', ai_time[0])
+            self.profiler.add('ai_defenders', ai_time[1])
+
+        # Урон, гибель и новые юниты за шаг - одной пачкой, когда никто уже не обходит списки
+        with self.profiler.phase('commands'):
+            self.commands.apply(self)
+
+    def update_stored_units(self, dt):
+        """ИИ решает за каждого юнита, а движение и перезарядка идут пакетом по массивам.
+
+        Как и без UnitStore, сначала ходят враги, потом защитники - уже по новым позициям врагов. Внутри
+        стороны юниты друг от друга не зависят, поэтому каждую сторону можно сдвинуть одним step().
+        """
+        store = self.unit_store
+        town_hall = self.buildings.town_hall
+        for is_defender in (False, True):
+            units = self.units.faction(is_defender)
+            with self.profiler.phase('unit_step'):
+                store.find_nearest(is_defender)
+                store.refresh_views()
+            if not is_defender:
+                # Враги, занятые стеной, до проверки видимости не дойдут
+                enemies = [unit for unit in units if not (unit.target_wall and unit.target_wall.health > 0)]
+                if town_hall and len(enemies) >= self.wall_rects.MIN_BATCH:
+                    rows = [unit._index for unit in enemies]
+                    blocked = self.wall_rects.blocked(store.x[rows], store.y[rows], town_hall.center)
+                    self.blocked_paths = dict(zip(enemies, blocked.tolist()))
+
+            start = time.perf_counter()
+            for unit in units:
+                unit.update(dt, self)
+            self.profiler.add('ai_defenders' if is_defender else 'ai_enemies', time.perf_counter() - start)
+            self.blocked_paths = {}
+
+            with self.profiler.phase('unit_step'):
+                store.step(dt)
+
+    def get_preview(self, building_type, width, height):
+        """Полупрозрачный предпросмотр постройки; собирается один раз на тип"""
+        preview = self.previews.get(building_type)
+        if preview is None:
+            size = (width * GRID_SIZE, height * GRID_SIZE)
+            preview = pygame.Surface(size, pygame.SRCALPHA)
+            preview.fill((255, 255, 255, 128))
+            preview.blit(assets.get(BUILDING_ARCHETYPES[building_type.name].texture, size), (0, 0))
+            self.previews[building_type] = preview
+        return preview
+
+    def assets_ready(self):
+        """Загружены ли текстуры, нужные текущему экрану"""
+        return assets.ready(MENU_TEXTURES if self.state == GameState.MENU else None)
+
+    def draw_loading_screen(self):
+        self.screen.fill(BLACK)
+        text = self.font.render(f"Загрузка... {int(assets.progress * 100)}%", True, WHITE)
+        self.screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 - 40))
+        bar = pygame.Rect(SCREEN_WIDTH // 4, SCREEN_HEIGHT // 2, SCREEN_WIDTH // 2, 20)
+        pygame.draw.rect(self.screen, LIGHT_BLUE, (bar.x, bar.y, int(bar.width * assets.progress), bar.height))
+        pygame.draw.rect(self.screen, WHITE, bar, 2)
 
     def draw(self):
-        if self.state == GameState.MENU:
+        if self.headless:
+            return
+
+        if not self.assets_ready():
+            # Пока фоновый поток грузит текстуры, окно остается отзывчивым
+            self.draw_loading_screen()
+
+        elif self.state == GameState.MENU:
             self.screen.blit(textures['menu_background'], (0, 0))
 
             title = self.font.render("Clash of Berserk", True, WHITE)
@@ -937,85 +927,76 @@ class Game:
             self.draw_help_screen()
 
         elif self.state in [GameState.BUILD, GameState.BATTLE]:
-            self.screen.blit(textures['background'], (0, 0))
-
-            if self.state == GameState.BUILD:
-                for x in range(0, SCREEN_WIDTH, GRID_SIZE):
-                    pygame.draw.line(self.screen, GRAY, (x, 0), (x, SCREEN_HEIGHT), 1)
-                for y in range(0, SCREEN_HEIGHT, GRID_SIZE):
-                    pygame.draw.line(self.screen, GRAY, (0, y), (SCREEN_WIDTH, y), 1)
+            with self.profiler.phase('draw_background'):
+                self.screen.blit(textures['background'], (0, 0))
+
+                if self.state == GameState.BUILD:
+                    for x in range(0, SCREEN_WIDTH, GRID_SIZE):
+                        pygame.draw.line(self.screen, GRAY, (x, 0), (x, SCREEN_HEIGHT), 1)
+                    for y in range(0, SCREEN_HEIGHT, GRID_SIZE):
+                        pygame.draw.line(self.screen, GRAY, (0, y), (SCREEN_WIDTH, y), 1)
+
+            with self.profiler.phase('draw_buildings'):
+                for building in self.buildings:
+                    building.draw(self.screen)
+
+            with self.profiler.phase('draw_units'):
+                for unit in self.units:
+                    unit.draw(self.screen, self.units)
+
+            with self.profiler.phase('hud'):
+                time_left = max(0, (self.build_time - self.build_timer) // 1000) if self.state == GameState.BUILD else 0
+                timer_text = self.font.render(
+                    f"Время строится: {time_left}s" if self.state == GameState.BUILD else f"Волна: {self.wave + 1}/3", True,
+                    BLACK)
+                self.screen.blit(timer_text, (20, 20))
+
+                gold_text = self.font.render(f"Золото: {self.gold}", True, YELLOW)
+                self.screen.blit(gold_text, (20, 60))
+
+                if self.state == GameState.BUILD:
+                    instructions = self.small_font.render("",
+                                                          True,
+                                                          BLACK)
+                    self.screen.blit(instructions, (SCREEN_WIDTH // 2 - instructions.get_width() // 2, 20))
+
+                    repair_text = self.small_font.render(
+                        "", True, BLACK)
+                    self.screen.blit(repair_text, (SCREEN_WIDTH // 2 - repair_text.get_width() // 2, 60))
+
+                # Подсветка выбранного здания
+                if self.selected_barracks:
+                    pygame.draw.rect(self.screen, BLUE,
+                                     (self.selected_barracks.x - 2, self.selected_barracks.y - 2,
+                                      self.selected_barracks.width * GRID_SIZE + 4,
+                                      self.selected_barracks.height * GRID_SIZE + 4), 2)
+
+                    status_text = self.small_font.render(f"Нажмите F чтобы востановить (50g)", True, BLUE)
+                    self.screen.blit(status_text, (self.selected_barracks.x, self.selected_barracks.y - 30))
+
+                if self.selected_mine:
+                    pygame.draw.rect(self.screen, YELLOW,
+                                     (self.selected_mine.x - 2, self.selected_mine.y - 2,
+                                      self.selected_mine.width * GRID_SIZE + 4,
+                                      self.selected_mine.height * GRID_SIZE + 4), 2)
+
+                    if self.selected_mine.health <= 0:
+                        status_text = self.small_font.render(f"Нажмите R чтобы востановить (75g)", True, YELLOW)
+                        self.screen.blit(status_text, (self.selected_mine.x, self.selected_mine.y - 30))
 
-            for building in self.buildings:
-                building.draw(self.screen)
-
-            for unit in self.units:
-                unit.draw(self.screen)
-
-            time_left = max(0, (self.build_time - self.build_timer) // 1000) if self.state == GameState.BUILD else 0
-            timer_text = self.font.render(
-                f"Время строится: {time_left}s" if self.state == GameState.BUILD else f"Волна: {self.wave + 1}/3", True,
-                BLACK)
-            self.screen.blit(timer_text, (20, 20))
+                if self.selected_building:
+                    mouse_pos = pygame.mouse.get_pos()
+                    grid_x = (mouse_pos[0] // GRID_SIZE) * GRID_SIZE
+                    grid_y = (mouse_pos[1] // GRID_SIZE) * GRID_SIZE
 
-            gold_text = self.font.render(f"Золото: {self.gold}", True, YELLOW)
-            self.screen.blit(gold_text, (20, 60))
+                    archetype = BUILDING_ARCHETYPES[self.selected_building.name]
+                    width, height = archetype.width, archetype.height
 
-            if self.state == GameState.BUILD:
-                instructions = self.small_font.render("",
-                                                      True,
-                                                      BLACK)
-                self.screen.blit(instructions, (SCREEN_WIDTH // 2 - instructions.get_width() // 2, 20))
+                    preview = self.get_preview(self.selected_building, width, height)
+                    self.screen.blit(preview, (grid_x, grid_y))
 
-                repair_text = self.small_font.render(
-                    "", True, BLACK)
-                self.screen.blit(repair_text, (SCREEN_WIDTH // 2 - repair_text.get_width() // 2, 60))
-
-            # Подсветка выбранного здания
-            if self.selected_barracks:
-                pygame.draw.rect(self.screen, BLUE,
-                                 (self.selected_barracks.x - 2, self.selected_barracks.y - 2,
-                                  self.selected_barracks.width * GRID_SIZE + 4,
-                                  self.selected_barracks.height * GRID_SIZE + 4), 2)
-
-                status_text = self.small_font.render(f"Нажмите F чтобы востановить (50g)", True, BLUE)
-                self.screen.blit(status_text, (self.selected_barracks.x, self.selected_barracks.y - 30))
-
-            if self.selected_mine:
-                pygame.draw.rect(self.screen, YELLOW,
-                                 (self.selected_mine.x - 2, self.selected_mine.y - 2,
-                                  self.selected_mine.width * GRID_SIZE + 4,
-                                  self.selected_mine.height * GRID_SIZE + 4), 2)
-
-                if self.selected_mine.health <= 0:
-                    status_text = self.small_font.render(f"Нажмите R чтобы востановить (75g)", True, YELLOW)
-                    self.screen.blit(status_text, (self.selected_mine.x, self.selected_mine.y - 30))
-
-            if self.selected_building:
-                mouse_pos = pygame.mouse.get_pos()
-                grid_x = (mouse_pos[0] // GRID_SIZE) * GRID_SIZE
-                grid_y = (mouse_pos[1] // GRID_SIZE) * GRID_SIZE
-
-                width = 2 if self.selected_building in [BuildingType.TOWN_HALL, BuildingType.BARRACKS] else 1
-                height = 2 if self.selected_building in [BuildingType.TOWN_HALL, BuildingType.BARRACKS] else 1
-
-                # Прозрачная поверхность для предпросмотра
-                preview = pygame.Surface((width * GRID_SIZE, height * GRID_SIZE), pygame.SRCALPHA)
-                preview.fill((255, 255, 255, 128))
-
-                if self.selected_building == BuildingType.BARRACKS:
-                    preview.blit(pygame.transform.scale(textures['barracks'], (width * GRID_SIZE, height * GRID_SIZE)),
-                                 (0, 0))
-                elif self.selected_building == BuildingType.GOLD_MINE:
-                    preview.blit(pygame.transform.scale(textures['gold_mine'], (width * GRID_SIZE, height * GRID_SIZE)),
-                                 (0, 0))
-                elif self.selected_building == BuildingType.WALL:
-                    preview.blit(pygame.transform.scale(textures['wall'], (width * GRID_SIZE, height * GRID_SIZE)),
-                                 (0, 0))
-
-                self.screen.blit(preview, (grid_x, grid_y))
-
-            # Кнопка помощи
-            self.help_button.draw(self.screen, self.font)
+                # Кнопка помощи
+                self.help_button.draw(self.screen, self.font)
 
         elif self.state == GameState.WIN:
             self.screen.blit(textures['background'], (0, 0))
@@ -1029,19 +1010,41 @@ class Game:
             self.screen.blit(lose_text, (SCREEN_WIDTH // 2 - lose_text.get_width() // 2,
                                          SCREEN_HEIGHT // 2 - lose_text.get_height() // 2))
 
-        pygame.display.flip()
+        with self.profiler.phase('overlay'):
+            self.profiler.draw_overlay(self.screen, labels, 24, WHITE)
 
-    def run(self):
+        with self.profiler.phase('flip'):
+            pygame.display.flip()
+
+    def poll_assets(self):
+        """Забирает загруженное фоновым потоком; музыка включается, когда загрузка закончена"""
+        assets.poll()
         # Воспроизведение музыки
-        if music_loaded:
-            pygame.mixer.music.play(-1)
-            pygame.mixer.music.set_volume(0.5)
+        if assets.finished and assets.music_loaded:
+            pygame.mixer.music.play(-1)  # -1 означает бесконечный цикл
+            pygame.mixer.music.set_volume(0.5)  # Громкость от 0.0 до 1.0
 
+    def run(self):
+        # Симуляция идет фиксированными шагами FIXED_DT, отрисовка - с той частотой, что получается
+        accumulator = 0
         while self.running:
-            self.clock.tick(FPS)
-            self.handle_events()
-            self.update()
+            accumulator += min(self.clock.tick(FPS), MAX_FRAME_TIME)
+            self.profiler.begin_frame()
+            if not assets.finished:
+                self.poll_assets()
+            with self.profiler.phase('events'):
+                self.handle_events()
+            if not self.assets_ready():
+                # Бой не идет, пока не загружены его текстуры
+                accumulator = 0
+            while accumulator >= FIXED_DT:
+                self.update(FIXED_DT)
+                accumulator -= FIXED_DT
             self.draw()
+            self.profiler.end_frame()
 
+        self.stop_recording()
+        if self.profile_path:
+            self.profiler.export(self.profile_path)
         pygame.quit()
         sys.exit()
\ No newline at end of file
@@ -2,89 +2,20 @@ import pygame
 import random
 import math
 import sys
-from enum import Enum
-
-# Initialize pygame
-pygame.init()
-
-pygame.mixer.init()  # Инициализация аудио модуля
-
-# Game constants
-SCREEN_WIDTH = 1024
-SCREEN_HEIGHT = 768
-FPS = 60
-GRID_SIZE = 64
-BORDER_OFFSET = GRID_SIZE * 2
-
-# Colors
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BLUE = (0, 0, 255)
-YELLOW = (255, 255, 0)
-BROWN = (139, 69, 19)
-GRAY = (128, 128, 128)
-DARK_GREEN = (0, 100, 0)
-
-
-def load_texture(path, size=None):
-    texture = pygame.image.load(path)
-    if size:
-        texture = pygame.transform.scale(texture, size)
-    return texture
-
-
-textures = {
-    'background': load_texture('texture/grass.png', (SCREEN_WIDTH, SCREEN_HEIGHT)),
-    'town_hall': load_texture('texture/house1.png', (GRID_SIZE * 2, GRID_SIZE * 2)),
-    'barracks': load_texture('texture/barracks.png', (GRID_SIZE * 2, GRID_SIZE * 2)),
-    'gold_mine': load_texture('texture/Gold_Mine.png', (GRID_SIZE, GRID_SIZE)),
-    'wall': load_texture('texture/Wall.png', (GRID_SIZE, GRID_SIZE)),
-    'wall_broken': load_texture('texture/wall_broken.png', (GRID_SIZE, GRID_SIZE)),
-    'warrior': load_texture('texture/warrior.png', (30, 30)),
-    'archer': load_texture('texture/archer.png', (30, 30)),
-    'giant': load_texture('texture/giant.png', (50, 50)),
-    'warrior_enemy': load_texture('texture/warrior_enemy.png', (30, 30)),
-    'archer_enemy': load_texture('texture/archer_enemy.png', (30, 30)),
-    'giant_enemy': load_texture('texture/giant.png', (50, 50))
-}
-
-# Загрузка музыки (добавьте это в раздел загрузки ресурсов)
-try:
-    pygame.mixer.music.load('music/Linkin_Park_-_Somewhere_I_Belong.mp3')  # Укажите путь к вашему музыкальному файлу
-    music_loaded = True
-except:
-    print("Не удалось загрузить музыку")
-    music_loaded = False
-
-
-# Game states
-class GameState(Enum):
-    MENU = 0
-    BUILD = 1
-    BATTLE = 2
-    WIN = 3
-    LOSE = 4
-
-
-class Difficulty(Enum):
-    EASY = 0
-    MEDIUM = 1
-    HARD = 2
-
-
-class BuildingType(Enum):
-    TOWN_HALL = 0
-    BARRACKS = 1
-    GOLD_MINE = 2
-    WALL = 3
-
-
-class UnitType(Enum):
-    WARRIOR = 0
-    ARCHER = 1
-    GIANT = 2
+
+from constants import (SCREEN_WIDTH, SCREEN_HEIGHT, FPS, GRID_SIZE, BORDER_OFFSET, WHITE, BLACK, RED, GREEN, BLUE,
+                       YELLOW, BROWN, GRAY, DARK_GREEN, LIGHT_BLUE, DARK_BLUE, GameState, Difficulty, BuildingType,
+                       UnitType)
+from spatial_grid import SpatialGrid
+from wall_grid import WallGrid
+from building_registry import BuildingRegistry
+from unit_collection import UnitCollection
+from text_cache import fonts, labels
+from assets_manager import assets
+import engine
+
+# Заполняется в engine.init() при создании окна игры; импорт модуля ничего не загружает
+textures = assets.textures
 
 
 class Building:
@@ -122,6 +53,10 @@ class Building:
             self.height = 1
             self.repair_cost = 50
 
+        # Геометрия здания не меняется, считаем ее один раз
+        self.center = (x + self.width * GRID_SIZE // 2, y + self.height * GRID_SIZE // 2)
+        self.rect = pygame.Rect(x, y, self.width * GRID_SIZE, self.height * GRID_SIZE)
+
     def update(self, dt, game):
         if self.health <= 0:
             self.is_broken = True
@@ -130,22 +65,19 @@ class Building:
 
         if self.type == BuildingType.BARRACKS and game.state == GameState.BATTLE:
             # Проверяем, есть ли враги на поле боя
-            enemies_exist = any(not unit.is_defender for unit in game.units)
-
             # Спавним только во время активной волны (когда есть враги)
-            if enemies_exist:
+            if game.units.count(False):
                 self.spawn_timer += dt
                 if self.spawn_timer >= self.spawn_interval:
                     self.spawn_timer = 0
-                    game.units.append(Unit(self.x + self.width * GRID_SIZE // 2,
-                                           self.y + self.height * GRID_SIZE // 2,
-                                           UnitType.WARRIOR, True, game.difficulty))
+                    game.add_unit(Unit(self.center[0], self.center[1], UnitType.WARRIOR, True, game.difficulty))
 
     def repair(self, game):
         if self.health < self.max_health and game.gold >= self.repair_cost:
             self.health = min(self.max_health, self.health + 100)
             game.gold -= self.repair_cost
             self.is_broken = False
+            game.buildings.changed(self)
             return True
         return False
 
@@ -169,9 +101,7 @@ class Building:
         pygame.draw.rect(screen, GREEN,
                          (self.x, self.y - 10, int(self.width * GRID_SIZE * health_ratio), 5))
 
-        font = pygame.font.SysFont(None, 20)
-        text = font.render(self.type.name, True, BLACK)
-        screen.blit(text, (self.x + 5, self.y + 5))
+        screen.blit(labels.render(self.type.name, 20, BLACK), (self.x + 5, self.y + 5))
 
 
 class Unit:
@@ -226,23 +156,15 @@ class Unit:
 
         # Проверка смерти
         if self.health <= 0:
-            game.units.remove(self)
+            game.remove_unit(self)
 
     def update_defender(self, dt, game):
         # Логика защитников - атака ближайшего врага
-        closest_enemy = None
-        min_dist = float('inf')
-
-        for unit in game.units:
-            if not unit.is_defender:
-                dist = math.sqrt((self.x - unit.x) ** 2 + (self.y - unit.y) ** 2)
-                if dist < min_dist:
-                    min_dist = dist
-                    closest_enemy = unit
+        closest_enemy, min_dist = game.enemy_grid.nearest(self.x, self.y)
 
         if closest_enemy:
             if min_dist <= self.attack_range:
-                self.attack_target(dt, closest_enemy)
+                self.attack_target(dt, closest_enemy, game)
             else:
                 # Двигаемся к врагу
                 angle = math.atan2(closest_enemy.y - self.y, closest_enemy.x - self.x)
@@ -268,7 +190,7 @@ class Unit:
         # 3. Действуем в соответствии с целью
         if self.current_target:
             if self.can_attack(self.current_target):
-                self.attack_target(dt, self.current_target)
+                self.attack_target(dt, self.current_target, game)
                 self.stuck_timer = 0  # Сброс таймера при успешной атаке
             else:
                 self.move_to_target(game)
@@ -322,54 +244,33 @@ class Unit:
         return True
 
     def find_town_hall(self, game):
-        for building in game.buildings:
-            if building.type == BuildingType.TOWN_HALL:
-                return building
-        return None
+        return game.buildings.town_hall
 
     def find_closest_defender(self, game):
-        closest = None
-        min_dist = float('inf')
-
-        for unit in game.units:
-            if unit.is_defender:
-                dist = self.distance_to(unit)
-                if dist < min_dist:
-                    min_dist = dist
-                    closest = unit
+        closest, min_dist = game.defender_grid.nearest(self.x, self.y)
         return closest
 
     def find_closest_wall_on_path(self, game, town_hall):
         closest = None
         min_dist = float('inf')
-        town_hall_center = (town_hall.x + town_hall.width * GRID_SIZE // 2,
-                            town_hall.y + town_hall.height * GRID_SIZE // 2)
-
-        for building in game.buildings:
-            if building.type == BuildingType.WALL and not building.is_broken:
-                building_center = (building.x + building.width * GRID_SIZE // 2,
-                                   building.y + building.height * GRID_SIZE // 2)
-
-                if self.line_intersects_rect((self.x, self.y), town_hall_center,
-                                             pygame.Rect(building.x, building.y,
-                                                         building.width * GRID_SIZE,
-                                                         building.height * GRID_SIZE)):
-                    dist = self.distance_to(building)
-                    if dist < min_dist:
-                        min_dist = dist
-                        closest = building
+        town_hall_center = town_hall.center
+
+        # Сетка стен отдает только те стены, чьи ячейки пересекает отрезок
+        for building in game.wall_grid.walls_on_segment((self.x, self.y), town_hall_center):
+            dist = self.distance_to(building)
+            if dist < min_dist:
+                min_dist = dist
+                closest = building
         return closest
 
     def find_important_building_near_path(self, game, town_hall, max_distance):
         closest = None
         min_dist = float('inf')
-        town_hall_center = (town_hall.x + town_hall.width * GRID_SIZE // 2,
-                            town_hall.y + town_hall.height * GRID_SIZE // 2)
+        town_hall_center = town_hall.center
 
-        for building in game.buildings:
-            if building.type in [BuildingType.BARRACKS, BuildingType.GOLD_MINE] and building.health > 0:
-                building_center = (building.x + building.width * GRID_SIZE // 2,
-                                   building.y + building.height * GRID_SIZE // 2)
+        for building in list(game.buildings.barracks) + list(game.buildings.mines):
+            if building.health > 0:
+                building_center = building.center
 
                 dist_to_path = self._distance_to_line(self.x, self.y,
                                                       town_hall_center[0], town_hall_center[1],
@@ -384,8 +285,7 @@ class Unit:
 
     def distance_to(self, target):
         if isinstance(target, Building):
-            target_x = target.x + target.width * GRID_SIZE // 2
-            target_y = target.y + target.height * GRID_SIZE // 2
+            target_x, target_y = target.center
         else:
             target_x = target.x
             target_y = target.y
@@ -394,7 +294,7 @@ class Unit:
     def can_attack(self, target):
         return self.distance_to(target) <= self.attack_range
 
-    def attack_target(self, dt, target):
+    def attack_target(self, dt, target, game):
         self.last_attack += dt
         if self.last_attack >= self.attack_cooldown:
             self.last_attack = 0
@@ -406,13 +306,14 @@ class Unit:
             if isinstance(target, Building):
                 if target.health <= 0:
                     target.is_broken = True
+                    game.buildings.changed(target)
                     # Если это Town Hall - поражение
                     if target.type == BuildingType.TOWN_HALL:
                         game.state = GameState.LOSE
 
             # Для юнитов проверяем смерть
             elif isinstance(target, Unit) and target.health <= 0:
-                game.units.remove(target)
+                game.remove_unit(target)
 
     def move_to_target(self, game):
         if not self.current_target:
@@ -432,18 +333,12 @@ class Unit:
 
     def get_target_center(self):
         if isinstance(self.current_target, Building):
-            return (self.current_target.x + self.current_target.width * GRID_SIZE // 2,
-                    self.current_target.y + self.current_target.height * GRID_SIZE // 2)
+            return self.current_target.center
         else:
             return (self.current_target.x, self.current_target.y)
 
     def check_wall_collision(self, game, x, y):
-        for building in game.buildings:
-            if building.type == BuildingType.WALL and building.health > 0:
-                if (building.x <= x <= building.x + building.width * GRID_SIZE and
-                        building.y <= y <= building.y + building.height * GRID_SIZE):
-                    return True
-        return False
+        return game.wall_grid.wall_at(x, y) is not None
 
     def _distance_to_line(self, x1, y1, x2, y2, px, py):
         """Расстояние от точки до линии"""
@@ -522,8 +417,8 @@ class Unit:
 
 class Game:
     def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Clash of Pygame")
+        # Текстуры грузятся в фоне; пока их нет, run() показывает экран загрузки
+        self.screen = engine.open_window(SCREEN_WIDTH, SCREEN_HEIGHT, "Clash of Pygame")
         self.clock = pygame.time.Clock()
         self.running = True
         self.state = GameState.MENU
@@ -535,33 +430,52 @@ class Game:
         self.wave_interval = 3000  # 40 секунд между волнами
         self.gold = 500
         self.selected_building = None
-        self.buildings = []
-        self.units = []
-        self.font = pygame.font.SysFont(None, 36)
+        self.buildings = BuildingRegistry()
+        # Целые стены в виде растровой карты - для быстрых проверок прямой видимости
+        self.wall_grid = WallGrid()
+        self.units = UnitCollection()
+        # Отдельные сетки для каждой стороны: поиск всегда идет по противнику
+        self.defender_grid = SpatialGrid()
+        self.enemy_grid = SpatialGrid()
+        self.font = fonts.get(36)
         self.selected_wall = None
 
         self.init_village()
 
     def init_village(self):
-        self.buildings = []
-        self.units = []
+        self.buildings = BuildingRegistry()
+        self.buildings.subscribe(self.on_building_event)
+        self.wall_grid.clear()
+        self.units.clear()
+        self.defender_grid.clear()
+        self.enemy_grid.clear()
 
         town_hall = Building(SCREEN_WIDTH // 2 - GRID_SIZE, SCREEN_HEIGHT // 2 - GRID_SIZE, BuildingType.TOWN_HALL)
-        self.buildings.append(town_hall)
+        self.buildings.add(town_hall)
 
         self.create_perimeter_walls()
 
     def create_perimeter_walls(self):
         for x in range(BORDER_OFFSET, SCREEN_WIDTH - BORDER_OFFSET, GRID_SIZE):
-            self.buildings.append(Building(x, BORDER_OFFSET, BuildingType.WALL))
-            self.buildings.append(Building(x, SCREEN_HEIGHT - BORDER_OFFSET - GRID_SIZE, BuildingType.WALL))
+            self.buildings.add(Building(x, BORDER_OFFSET, BuildingType.WALL))
+            self.buildings.add(Building(x, SCREEN_HEIGHT - BORDER_OFFSET - GRID_SIZE, BuildingType.WALL))
 
         for y in range(BORDER_OFFSET + GRID_SIZE, SCREEN_HEIGHT - BORDER_OFFSET - GRID_SIZE, GRID_SIZE):
-            self.buildings.append(Building(BORDER_OFFSET, y, BuildingType.WALL))
-            self.buildings.append(Building(SCREEN_WIDTH - BORDER_OFFSET - GRID_SIZE, y, BuildingType.WALL))
+            self.buildings.add(Building(BORDER_OFFSET, y, BuildingType.WALL))
+            self.buildings.add(Building(SCREEN_WIDTH - BORDER_OFFSET - GRID_SIZE, y, BuildingType.WALL))
+
+    def on_building_event(self, event, building):
+        """Держит сетку стен в соответствии с реестром зданий"""
+        if building.type != BuildingType.WALL:
+            return
+        if event == 'removed' or building.health <= 0:
+            self.wall_grid.clear_wall(building)
+        else:
+            self.wall_grid.set_wall(building)
 
     def spawn_wave(self):
-        self.units = [unit for unit in self.units if unit.is_defender]
+        self.units.remove_faction(False)
+        self.enemy_grid.clear()
 
         wave_multiplier = 1 + self.wave * 0.5
         difficulty_multiplier = 1 + self.difficulty.value * 0.3
@@ -598,9 +512,20 @@ class Game:
         spawn_func = random.choice(spawn_options)
         x, y = spawn_func()
         enemy = Unit(x, y, unit_type, False, self.difficulty)
-        self.units.append(enemy)
+        self.add_unit(enemy)
         return enemy
 
+    def grid_for(self, unit):
+        return self.defender_grid if unit.is_defender else self.enemy_grid
+
+    def add_unit(self, unit):
+        self.units.add(unit)
+        self.grid_for(unit).insert(unit)
+
+    def remove_unit(self, unit):
+        if self.units.remove(unit):
+            self.grid_for(unit).remove(unit)
+
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -664,11 +589,9 @@ class Game:
                                     grid_y + new_height * GRID_SIZE > SCREEN_HEIGHT - BORDER_OFFSET):
                                 valid_position = False
 
+                            new_rect = pygame.Rect(grid_x, grid_y, new_width * GRID_SIZE, new_height * GRID_SIZE)
                             for building in self.buildings:
-                                if (grid_x < building.x + building.width * GRID_SIZE and
-                                        grid_x + new_width * GRID_SIZE > building.x and
-                                        grid_y < building.y + building.height * GRID_SIZE and
-                                        grid_y + new_height * GRID_SIZE > building.y):
+                                if building.rect.colliderect(new_rect):
                                     valid_position = False
                                     break
 
@@ -684,7 +607,7 @@ class Game:
                                 if self.gold >= cost:
                                     self.gold -= cost
                                     new_building = Building(grid_x, grid_y, self.selected_building)
-                                    self.buildings.append(new_building)
+                                    self.buildings.add(new_building)
                                     if self.selected_building == BuildingType.WALL and new_building.health <= 0:
                                         new_building.repair(self)
                         else:
@@ -714,9 +637,7 @@ class Game:
                 self.spawn_wave()
 
         elif self.state == GameState.BATTLE:
-            enemies_remaining = any(not unit.is_defender for unit in self.units)
-
-            if not enemies_remaining:
+            if not self.units.count(False):
                 self.wave_timer += dt
                 if self.wave_timer >= self.wave_interval:
                     self.wave_timer = 0
@@ -731,10 +652,12 @@ class Game:
             building.update(dt, self)
 
         # Обновляем юнитов
-        for unit in self.units[:]:
+        for unit in self.units:
             unit.update(dt, self)
-            if unit.health <= 0 and unit in self.units:
-                self.units.remove(unit)
+            if unit.health <= 0:
+                self.remove_unit(unit)
+            else:
+                self.grid_for(unit).move(unit)
 
     def draw(self):
         self.screen.blit(textures['background'], (0, 0))
@@ -830,9 +753,29 @@ class Game:
 
         pygame.display.flip()
 
+    def draw_loading_screen(self):
+        self.screen.fill(BLACK)
+        text = self.font.render(f"Загрузка... {int(assets.progress * 100)}%", True, WHITE)
+        self.screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 - 40))
+        bar = pygame.Rect(SCREEN_WIDTH // 4, SCREEN_HEIGHT // 2, SCREEN_WIDTH // 2, 20)
+        pygame.draw.rect(self.screen, LIGHT_BLUE, (bar.x, bar.y, int(bar.width * assets.progress), bar.height))
+        pygame.draw.rect(self.screen, WHITE, bar, 2)
+        pygame.display.flip()
+
+    def wait_for_assets(self):
+        """Окно отвечает, пока фоновый поток грузит текстуры; ввод, кроме закрытия окна, не принимается"""
+        while self.running and not assets.ready():
+            self.clock.tick(FPS)
+            assets.poll()
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.running = False
+            self.draw_loading_screen()
+
     def run(self):
+        self.wait_for_assets()
         # Воспроизведение музыки
-        if music_loaded:
+        if assets.music_loaded:
             pygame.mixer.music.play(-1)  # -1 означает бесконечный цикл
             pygame.mixer.music.set_volume(0.5)  # Громкость от 0.0 до 1.0
 
@@ -1,108 +1,126 @@
 import pygame
 import math
 
-from unit import Unit
 from constants import GRID_SIZE, RED, GREEN, YELLOW, Difficulty, BuildingType, GameState, UnitType
 from enum import Enum
+from text_cache import labels
+from archetypes import ArchetypeField, BUILDING_ARCHETYPES
+from assets_manager import assets
+
+textures = assets.textures
 
 class Building:
+    # Характеристики типа общие для всех зданий этого типа (таблица stats.json)
+    max_health = ArchetypeField()
+    width = ArchetypeField()
+    height = ArchetypeField()
+    spawn_interval = ArchetypeField()
+    hire_cost = ArchetypeField()
+    gold_interval = ArchetypeField()
+    gold_amount = ArchetypeField()
+    depletion_rate = ArchetypeField()
+    repair_cost = ArchetypeField()
+
     def __init__(self, x, y, building_type, difficulty=Difficulty.EASY):
         self.x = x
         self.y = y
         self.type = building_type
+        self.archetype = archetype = BUILDING_ARCHETYPES[building_type.name]
         self.level = 1
         self.is_broken = False
         self.difficulty = difficulty
+        self.health = archetype.max_health
 
-        if building_type == BuildingType.TOWN_HALL:
-            self.health = 500
-            self.max_health = 500
-            self.width = 2
-            self.height = 2
-        elif building_type == BuildingType.BARRACKS:
-            self.health = 200  # Теперь у бараков есть здоровье
-            self.max_health = 200
-            self.width = 2
-            self.height = 2
-            self.spawn_timer = 0
-            self.spawn_interval = 8000
+        # Изменяемое состояние заводим только зданиям с соответствующим поведением
+        # Найм и добыча идут по событиям Game.scheduler; event - ближайшее из них
+        if archetype.spawn_interval:
+            self.event = None
+            self.remaining = archetype.spawn_interval  # сколько оставалось до найма, когда отсчет встал
             self.gold_reserve = 0  # Золотой запас для найма войск
-            self.hire_cost = 20  # Стоимость найма одного война
-        elif building_type == BuildingType.GOLD_MINE:
-            self.health = 150  # Здоровье шахты
-            self.max_health = 150
-            self.width = 1
-            self.height = 1
-            self.gold_timer = 0
-            self.gold_interval = 5000  # Интервал генерации золота (5 секунд)
-            self.gold_amount = 25  # Количество золота за интервал
-            self.depletion_rate = 5  # На сколько уменьшается здоровье при добыче
-        elif building_type == BuildingType.WALL:
-            self.health = 300
-            self.max_health = 300
-            self.width = 1
-            self.height = 1
-            self.repair_cost = 50
-
-    def update(self, dt, game):
-        if self.type == BuildingType.WALL and self.health <= 0:
-            self.is_broken = True
+        if archetype.gold_interval:
+            self.event = None
+
+        # Геометрия здания не меняется, считаем ее один раз
+        width, height = archetype.width * GRID_SIZE, archetype.height * GRID_SIZE
+        self.center = (x + width // 2, y + height // 2)
+        self.rect = pygame.Rect(x, y, width, height)
+
+    def start_timer(self, game):
+        """Заводит отсчет заново: следующий найм для казарм, следующий доход для шахты"""
+        self.stop_timer(game)
+        if self.spawn_interval:
+            self.remaining = self.spawn_interval
+            self.wake(game)
+        elif self.gold_interval and self.health > 0:
+            self.event = game.scheduler.schedule(self.gold_interval, self.produce_gold, game)
+
+    def stop_timer(self, game):
+        if self.event is not None:
+            game.scheduler.cancel(self.event)
+            self.event = None
+
+    def can_hire(self, game):
+        """Отсчет найма идет только во время волны, пока есть враги и хватает золота"""
+        return game.state == GameState.BATTLE and game.units.count(False) and self.gold_reserve >= self.hire_cost
+
+    def wake(self, game):
+        """Казармы продолжают остановленный отсчет с того места, где он встал (началась волна, пополнили золото)"""
+        if self.event is None and self.can_hire(game):
+            self.event = game.scheduler.schedule(self.remaining, self.hire, game)
+
+    def pause(self, game):
+        """Останавливает отсчет найма, запоминая, сколько до него оставалось"""
+        if self.event is not None:
+            self.remaining = max(0.0, self.event[0] - game.scheduler.now)
+            self.stop_timer(game)
+
+    def hire(self, game):
+        self.event = None
+        # Условия найма снимает Game.pause_barracks(); если они все же не выполнены, найм - сразу после wake()
+        self.remaining = 0
+        if not self.can_hire(game):
+            return
+        self.gold_reserve -= self.hire_cost
+        game.commands.spawn(self.center[0], self.center[1], UnitType.WARRIOR, True)
+        self.start_timer(game)
+
+    def produce_gold(self, game):
+        self.event = None
+        game.gold += self.gold_amount
+        self.health -= self.depletion_rate  # Уменьшаем здоровье шахты
+
+        if self.health <= 0:
+            self.health = 0  # Шахта истощена, следующего дохода не будет
         else:
-            self.is_broken = False
-
-        if self.type == BuildingType.BARRACKS and game.state == GameState.BATTLE:
-            # Проверяем, есть ли враги на поле боя и достаточно ли золота
-            enemies_exist = any(not unit.is_defender for unit in game.units)
-
-            if enemies_exist and self.gold_reserve >= self.hire_cost:
-                self.spawn_timer += dt
-                if self.spawn_timer >= self.spawn_interval:
-                    self.spawn_timer = 0
-                    self.gold_reserve -= self.hire_cost
-                    game.units.append(Unit(self.x + self.width * GRID_SIZE // 2,
-                                           self.y + self.height * GRID_SIZE // 2,
-                                           UnitType.WARRIOR, True, game.difficulty))
-
-        # Добавляем генерацию золота для шахты
-        elif self.type == BuildingType.GOLD_MINE and self.health > 0:
-            self.gold_timer += dt
-            if self.gold_timer >= self.gold_interval:
-                self.gold_timer = 0
-                game.gold += self.gold_amount
-                self.health -= self.depletion_rate  # Уменьшаем здоровье шахты
-
-                if self.health <= 0:
-                    self.health = 0  # Шахта истощена
+            self.start_timer(game)
 
     def repair(self, game):
         if self.type == BuildingType.WALL and self.health <= 0 and game.gold >= self.repair_cost:
-            # Для разрушенной стены - создаем новую на том же месте
-            game.buildings.remove(self)
-            new_wall = Building(self.x, self.y, BuildingType.WALL, self.difficulty)
-            game.buildings.append(new_wall)
+            self.restore(game)
             game.gold -= self.repair_cost
             return True
         return False
 
+    def restore(self, game):
+        """Возвращает зданию полное здоровье на том же месте"""
+        self.health = self.max_health
+        self.is_broken = False
+        # Отсчет шахты начнется заново - по уведомлению реестра
+        game.buildings.changed(self)
+
     def refill_gold(self, game, amount):
         if game.gold >= amount:
             game.gold -= amount
             self.gold_reserve += amount
+            self.wake(game)
             return True
         return False
 
     def draw(self, screen):
-        if self.type == BuildingType.TOWN_HALL:
-            screen.blit(textures['town_hall'], (self.x, self.y))
-        elif self.type == BuildingType.BARRACKS:
-            screen.blit(textures['barracks'], (self.x, self.y))
-        elif self.type == BuildingType.GOLD_MINE:
-            screen.blit(textures['gold_mine'], (self.x, self.y))
-        elif self.type == BuildingType.WALL:
-            if self.health <= 0:
-                screen.blit(textures['wall_broken'], (self.x, self.y))
-            else:
-                screen.blit(textures['wall'], (self.x, self.y))
+        texture = self.archetype.texture
+        if self.health <= 0 and self.archetype.broken_texture:
+            texture = self.archetype.broken_texture
+        screen.blit(textures[texture], (self.x, self.y))
 
         # Health bar для всех зданий
         if self.health != float('inf'):
@@ -114,13 +132,9 @@ class Building:
 
         # Отображение золотого запаса для бараков
         if self.type == BuildingType.BARRACKS:
-            font = pygame.font.SysFont(None, 20)
-            text = font.render(f"Gold: {self.gold_reserve}", True, YELLOW)
-            screen.blit(text, (self.x + 5, self.y + 5))
+            screen.blit(labels.render(f"Gold: {self.gold_reserve}", 20, YELLOW), (self.x + 5, self.y + 5))
 
         # Отображение состояния шахты
         if self.type == BuildingType.GOLD_MINE:
-            font = pygame.font.SysFont(None, 20)
             status = "Depleted" if self.health <= 0 else "Active"
-            text = font.render(status, True, YELLOW if self.health > 0 else RED)
-            screen.blit(text, (self.x + 5, self.y + 5))
+            screen.blit(labels.render(status, 20, YELLOW if self.health > 0 else RED), (self.x + 5, self.y + 5))
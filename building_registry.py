@@ -0,0 +1,70 @@
+from constants import BuildingType
+
+
+class BuildingRegistry:
+    """Здания игры с индексами по типу и уведомлениями об изменениях.
+
+    Обход (for building in game.buildings) идет в порядке добавления, а Town Hall,
+    целые и сломанные стены, казармы и шахты доступны без перебора всех зданий.
+    """
+
+    def __init__(self):
+        self.buildings = {}  # dict как упорядоченное множество
+        self.town_hall = None
+        self.walls = {}  # только целые стены
+        self.broken_walls = {}
+        self.barracks = {}
+        self.mines = {}
+        self.listeners = []
+
+    def __iter__(self):
+        return iter(self.buildings)
+
+    def __len__(self):
+        return len(self.buildings)
+
+    def __contains__(self, building):
+        return building in self.buildings
+
+    def subscribe(self, listener):
+        """listener(event, building) вызывается на 'added', 'removed' и 'changed'"""
+        self.listeners.append(listener)
+
+    def add(self, building):
+        self.buildings[building] = None
+        self._index(building)
+        self._notify('added', building)
+
+    def remove(self, building):
+        del self.buildings[building]
+        self._unindex(building)
+        self._notify('removed', building)
+
+    def changed(self, building):
+        """Здание сломано, починено или восстановлено на месте - обновляем индексы"""
+        self._unindex(building)
+        self._index(building)
+        self._notify('changed', building)
+
+    def _index(self, building):
+        if building.type == BuildingType.TOWN_HALL:
+            self.town_hall = building
+        elif building.type == BuildingType.WALL:
+            if building.health > 0:
+                self.walls[building] = None
+            else:
+                self.broken_walls[building] = None
+        elif building.type == BuildingType.BARRACKS:
+            self.barracks[building] = None
+        elif building.type == BuildingType.GOLD_MINE:
+            self.mines[building] = None
+
+    def _unindex(self, building):
+        if building is self.town_hall:
+            self.town_hall = None
+        for collection in (self.walls, self.broken_walls, self.barracks, self.mines):
+            collection.pop(building, None)
+
+    def _notify(self, event, building):
+        for listener in self.listeners:
+            listener(event, building)
@@ -0,0 +1,75 @@
+from constants import BuildingType, GameState
+
+
+class CommandBuffer:
+    """Изменения мира за шаг: во время обхода только записываются, а применяются пачкой в конце Game.update"""
+
+    def __init__(self):
+        self.spawns = []  # (x, y, UnitType, is_defender)
+        self.despawns = []
+        # Урон копится отдельно для юнитов и зданий: для юнитов из UnitStore он записывается в массивы одним присваиванием
+        self.hit_units = []
+        self.unit_damage = []
+        self.hit_buildings = []
+        self.building_damage = []
+
+    def __len__(self):
+        return len(self.spawns) + len(self.despawns) + len(self.hit_units) + len(self.hit_buildings)
+
+    def spawn(self, x, y, unit_type, is_defender):
+        self.spawns.append((x, y, unit_type, is_defender))
+
+    def despawn(self, unit):
+        self.despawns.append(unit)
+
+    def damage_unit(self, unit, amount):
+        self.hit_units.append(unit)
+        self.unit_damage.append(amount)
+
+    def damage_building(self, building, amount):
+        self.hit_buildings.append(building)
+        self.building_damage.append(amount)
+
+    def clear(self):
+        for commands in (self.spawns, self.despawns, self.hit_units, self.unit_damage, self.hit_buildings,
+                         self.building_damage):
+            commands.clear()
+
+    def apply(self, game):
+        """Урон, затем удаление погибших, затем новые юниты - в порядке записи внутри каждой группы"""
+        self._apply_building_damage(game)
+        dead = self._apply_unit_damage(game)
+        for unit in self.despawns + dead:
+            # Повторное удаление (юнита добили несколько атак) UnitCollection пропускает
+            game.remove_unit(unit)
+        for x, y, unit_type, is_defender in self.spawns:
+            game.spawn_unit(x, y, unit_type, is_defender)
+        self.clear()
+
+    def _apply_unit_damage(self, game):
+        """Возвращает юнитов, у которых кончилось здоровье"""
+        if not self.hit_units:
+            return []
+        if game.unit_store is not None:
+            return game.unit_store.damage([unit._index for unit in self.hit_units], self.unit_damage)
+        dead = []
+        for unit, amount in zip(self.hit_units, self.unit_damage):
+            unit.health -= amount
+            if unit.health <= 0:
+                dead.append(unit)
+        return dead
+
+    def _apply_building_damage(self, game):
+        for building, amount in zip(self.hit_buildings, self.building_damage):
+            was_standing = building.health > 0
+            building.health -= amount
+            if building.health > 0:
+                if building.type == BuildingType.WALL:
+                    # Поврежденная стена дешевле для маршрутов врагов
+                    game.flow_field.wall_damaged(building)
+                continue
+            if building is game.buildings.town_hall:
+                game.state = GameState.LOSE
+            elif was_standing:
+                # Стена сломана - сетка стен и поле маршрутов узнают об этом через реестр
+                game.buildings.changed(building)
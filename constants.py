@@ -1,10 +1,16 @@
 import pygame
 from enum import Enum
 
+from archetypes import UNIT_ARCHETYPES, BUILDING_ARCHETYPES
+
 # Размеры экрана
 SCREEN_WIDTH = 1024
 SCREEN_HEIGHT = 768
 FPS = 60
+# Шаг симуляции в мс: игра всегда считается с частотой FPS, сколько бы кадров ни успевала отрисовка
+FIXED_DT = 1000 / FPS
+# Максимум времени кадра, которое догоняется шагами симуляции (защита от лавины шагов после зависания)
+MAX_FRAME_TIME = 250
 GRID_SIZE = 64
 BORDER_OFFSET = GRID_SIZE * 2
 
@@ -36,15 +42,18 @@ class Difficulty(Enum):
     MEDIUM = 1
     HARD = 2
 
-# Типы зданий
-class BuildingType(Enum):
-    TOWN_HALL = 0
-    BARRACKS = 1
-    GOLD_MINE = 2
-    WALL = 3
+# Типы зданий и юнитов берутся из stats.json: новый тип - новая строка в таблице
+BuildingType = Enum('BuildingType', [(name, archetype.id) for name, archetype in BUILDING_ARCHETYPES.items()],
+                    module=__name__)
+UnitType = Enum('UnitType', [(name, archetype.id) for name, archetype in UNIT_ARCHETYPES.items()], module=__name__)
 
-# Типы юнитов
-class UnitType(Enum):
-    WARRIOR = 0
-    ARCHER = 1
-    GIANT = 2
\ No newline at end of file
+# Действия игрока, которые меняют симуляцию (их пишет и воспроизводит replay.py)
+class Command(Enum):
+    DIFFICULTY = 0
+    SELECT_TYPE = 1
+    CANCEL = 2
+    CLICK = 3
+    REFILL = 4
+    RESTORE = 5
+    OPEN_HELP = 6
+    CLOSE_HELP = 7
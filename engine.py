@@ -0,0 +1,30 @@
+import pygame
+
+from assets_manager import assets
+
+# Импорт модулей игры ничего не инициализирует: окно, звук и ресурсы поднимаются здесь,
+# при первом создании окна игры. Симуляция без окна (headless, бенчмарки) сюда не заходит.
+initialized = False
+
+
+def init():
+    """Инициализирует pygame и звук и запускает фоновую загрузку ресурсов; повторные вызовы ничего не делают"""
+    global initialized
+    if initialized:
+        return
+    pygame.init()
+    try:
+        pygame.mixer.init()
+    except pygame.error:
+        print("Не удалось инициализировать звук")
+    assets.start_loading()
+    initialized = True
+
+
+def open_window(width, height, caption):
+    """Окно игры: init() при необходимости, затем set_mode и перевод текстур в формат экрана"""
+    init()
+    screen = pygame.display.set_mode((width, height))
+    pygame.display.set_caption(caption)
+    assets.convert_for_display()
+    return screen
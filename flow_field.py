@@ -0,0 +1,132 @@
+import heapq
+import math
+
+
+class FlowField:
+    """Общее для всех врагов поле расстояний до Town Hall по сетке стен.
+
+    Целая стена - проходимая, но дорогая клетка: ее цена растет с запасом здоровья,
+    то есть со временем, которое уйдет на разрушение. После того как стену сломали,
+    построили или повредили на целую клетку, поле пересчитывается только в затронутой области.
+    """
+
+    # Сколько HP стены по времени равны одному шагу через пустую клетку
+    WALL_HP_PER_CELL = 10
+
+    def __init__(self, wall_grid):
+        self.wall_grid = wall_grid
+        self.cols = wall_grid.cols
+        self.rows = wall_grid.rows
+        size = self.cols * self.rows
+        self.goals = []
+        self.costs = [1] * size  # цена входа в клетку
+        self.dist = [float('inf')] * size  # цена пути от клетки до Town Hall
+        self.next = [-1] * size  # следующая клетка по кратчайшему пути
+        self.neighbors = [self._neighbors(index) for index in range(size)]
+
+    def _neighbors(self, index):
+        cx, cy = index % self.cols, index // self.cols
+        result = []
+        for nx, ny in ((cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1)):
+            if 0 <= nx < self.cols and 0 <= ny < self.rows:
+                result.append(ny * self.cols + nx)
+        return result
+
+    def _cell_cost(self, index):
+        wall = self.wall_grid.cells[index]
+        if wall is None:
+            return 1
+        # Округляем вверх до целых клеток: мелкий урон не меняет цену и не запускает пересчет
+        return 1 + math.ceil(wall.health / self.WALL_HP_PER_CELL)
+
+    def set_goal(self, town_hall):
+        self.goals = list(self.wall_grid.cells_of(town_hall))
+        self.recompute()
+
+    def recompute(self):
+        """Полный пересчет поля (Дейкстра от клеток Town Hall)"""
+        size = self.cols * self.rows
+        self.costs = [self._cell_cost(index) for index in range(size)]
+        self.dist = [float('inf')] * size
+        self.next = [-1] * size
+        heap = []
+        for index in self.goals:
+            self.dist[index] = 0
+            heap.append((0, index))
+        self._propagate(heap)
+
+    def wall_added(self, wall):
+        """Стена построена: путь подорожал у клеток, чей кратчайший путь шел через нее"""
+        if not self.goals:
+            return
+        wall_cells = list(self.wall_grid.cells_of(wall))
+        for index in wall_cells:
+            self.costs[index] = self._cell_cost(index)
+
+        # Собираем поддерево кратчайших путей, проходящих через стену
+        region = set()
+        stack = [n for index in wall_cells for n in self.neighbors[index] if self.next[n] == index]
+        while stack:
+            index = stack.pop()
+            if index in region:
+                continue
+            region.add(index)
+            stack.extend(n for n in self.neighbors[index] if self.next[n] == index)
+
+        for index in region:
+            self.dist[index] = float('inf')
+            self.next[index] = -1
+
+        # Заново заполняем область от ее границы
+        heap = []
+        for index in region:
+            for n in self.neighbors[index]:
+                if n not in region:
+                    candidate = self.dist[n] + self.costs[n]
+                    if candidate < self.dist[index]:
+                        self.dist[index] = candidate
+                        self.next[index] = n
+            if self.dist[index] < float('inf'):
+                heapq.heappush(heap, (self.dist[index], index))
+        self._propagate(heap)
+
+    def wall_removed(self, wall):
+        """Стена сломана или убрана: путь может только подешеветь, распространяем улучшения"""
+        self.wall_damaged(wall)
+
+    def wall_damaged(self, wall):
+        """Стена потеряла здоровье: если ее цена упала хотя бы на клетку, распространяем улучшения"""
+        if not self.goals:
+            return
+        heap = []
+        for index in self.wall_grid.cells_of(wall):
+            cost = self._cell_cost(index)
+            if cost >= self.costs[index]:
+                continue
+            self.costs[index] = cost
+            if self.dist[index] < float('inf'):
+                heapq.heappush(heap, (self.dist[index], index))
+        self._propagate(heap)
+
+    def _propagate(self, heap):
+        heapq.heapify(heap)
+        while heap:
+            dist, index = heapq.heappop(heap)
+            if dist > self.dist[index]:
+                continue
+            step = dist + self.costs[index]
+            for n in self.neighbors[index]:
+                if step < self.dist[n]:
+                    self.dist[n] = step
+                    self.next[n] = index
+                    heapq.heappush(heap, (step, n))
+
+    def next_cell(self, x, y):
+        """Следующая клетка на пути к Town Hall или None, если мы уже в нем"""
+        cx, cy = self.wall_grid.clamped_cell(x, y)
+        index = self.next[cy * self.cols + cx]
+        return index if index >= 0 else None
+
+    def cell_center(self, index):
+        size = self.wall_grid.cell_size
+        return (index % self.cols) * size + size // 2, (index // self.cols) * size + size // 2
@@ -1,13 +1,57 @@
 import pygame
 import math
-from constants import GRID_SIZE, RED, GREEN, YELLOW
+import random
+import sys
+import time
+
+from button import Button
+from building import Building
+from unit import Unit, StoredUnit
+from spatial_grid import SpatialGrid
+from building_registry import BuildingRegistry
+from wall_grid import WallGrid
+from flow_field import FlowField
+from segment_kernel import WallRects
+from replay import ReplayWriter
+from profiler import FrameProfiler
+from text_cache import fonts, labels
+from assets_manager import assets, MENU_TEXTURES
+from balance import Balance
+from archetypes import BUILDING_ARCHETYPES
+import engine
+from unit_store import UnitStore
+from unit_pool import UnitPool
+from unit_collection import UnitCollection, unit_slot
+from command_buffer import CommandBuffer
+from scheduler import Scheduler
+from constants import (SCREEN_WIDTH, SCREEN_HEIGHT, FPS, FIXED_DT, MAX_FRAME_TIME, GRID_SIZE, BORDER_OFFSET, WHITE,
+                       BLACK, RED, GREEN, BLUE, YELLOW, GRAY, DARK_GREEN, LIGHT_BLUE, Difficulty, BuildingType,
+                       GameState, UnitType, Command)
 from enum import Enum
 
+textures = assets.textures
+
+
 class Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Clash of Berserk")
+    def __init__(self, headless=False, unit_store=False, seed=None, balance=None):
+        # В headless-режиме окно не создается, а draw() ничего не рисует
+        self.headless = headless
+        if headless:
+            self.screen = None
+        else:
+            self.screen = engine.open_window(SCREEN_WIDTH, SCREEN_HEIGHT, "Clash of Berserk")
         self.clock = pygame.time.Clock()
+        # Число сделанных шагов симуляции - время в записи боя
+        self.tick = 0
+        self.recorder = None
+        # Время фаз кадра; F3 показывает перцентили поверх игры
+        self.profiler = FrameProfiler()
+        self.profile_path = None
+        # Тип постройки -> готовая поверхность предпросмотра
+        self.previews = {}
+        self.seed_rng(random.randrange(2 ** 32) if seed is None else seed)
+        # Параметры волн и стартового золота (их перебирает balance_sweep.py)
+        self.balance = balance or Balance()
         self.running = True
         self.state = GameState.MENU
         self.difficulty = Difficulty.EASY
@@ -18,10 +62,28 @@ class Game:
         self.wave_interval = 3000  # 40 секунд между волнами
         self.gold = 500
         self.selected_building = None
-        self.buildings = []
-        self.units = []
-        self.font = pygame.font.SysFont(None, 36)
-        self.small_font = pygame.font.SysFont(None, 24)
+        self.buildings = BuildingRegistry()
+        # Целые стены в виде растровой карты - для быстрых проверок прямой видимости
+        self.wall_grid = WallGrid()
+        # Общее поле расстояний до Town Hall для маршрутов врагов
+        self.flow_field = FlowField(self.wall_grid)
+        # Защитники и враги хранятся раздельно, со счетчиками живых по сторонам
+        self.units = UnitCollection()
+        # Отдельные сетки для каждой стороны: поиск всегда идет по противнику
+        # При равном расстоянии ближайшим считается юнит с меньшим слотом - так же выбирает UnitStore
+        self.defender_grid = SpatialGrid(tie_key=unit_slot)
+        self.enemy_grid = SpatialGrid(tie_key=unit_slot)
+        # Появление, гибель и урон за шаг - применяются в конце update()
+        self.commands = CommandBuffer()
+        # Доход шахт и найм в казармах - события по игровому времени, а не таймеры в каждом здании
+        self.scheduler = Scheduler()
+        # Необязательное хранилище юнитов в массивах NumPy (пакетное движение и перезарядка)
+        self.unit_store = UnitStore() if unit_store else None
+        # Погибшие юниты ждут здесь следующего спавна (только без UnitStore)
+        self.unit_pool = UnitPool(Unit)
+        # Прямая видимость Town Hall для всей волны, посчитанная пакетом (только с UnitStore)
+        self.wall_rects = None
+        self.blocked_paths = {}
         self.selected_wall = None
         self.selected_barracks = None
         self.selected_mine = None
@@ -35,67 +97,171 @@ class Game:
 
         self.init_village()
 
-    def init_village(self):
-        self.buildings = []
-        self.units = []
-
-        town_hall = Building(SCREEN_WIDTH // 2 - GRID_SIZE, SCREEN_HEIGHT // 2 - GRID_SIZE, BuildingType.TOWN_HALL,
-                             self.difficulty)
-        self.buildings.append(town_hall)
-
-        self.create_perimeter_walls()
+    # Шрифты нужны только для отрисовки, поэтому берутся при первом обращении
+    @property
+    def font(self):
+        return fonts.get(36)
+
+    @property
+    def small_font(self):
+        return fonts.get(24)
+
+    def init_village(self, layout=None):
+        self.buildings = BuildingRegistry()
+        self.buildings.subscribe(self.on_building_event)
+        if self.unit_store is not None:
+            self.wall_rects = WallRects(self.buildings)
+        self.wall_grid.clear()
+        self.flow_field = FlowField(self.wall_grid)
+        self.units.clear()
+        self.commands.clear()
+        self.scheduler.clear()
+        self.defender_grid.clear()
+        self.enemy_grid.clear()
+        if self.unit_store is not None:
+            self.unit_store.clear()
+
+        if layout is None:
+            town_hall = Building(SCREEN_WIDTH // 2 - GRID_SIZE, SCREEN_HEIGHT // 2 - GRID_SIZE, BuildingType.TOWN_HALL,
+                                 self.difficulty)
+            self.buildings.add(town_hall)
+            self.create_perimeter_walls()
+        else:
+            # Расстановка из записи боя или файла расстановок
+            if not any(building_type == BuildingType.TOWN_HALL for building_type, _, _ in layout):
+                raise ValueError("В расстановке нет Town Hall: врагам некуда идти")
+            for building_type, x, y in layout:
+                self.buildings.add(Building(x, y, building_type, self.difficulty))
+        self.flow_field.set_goal(self.buildings.town_hall)
 
     def create_perimeter_walls(self):
         for x in range(BORDER_OFFSET, SCREEN_WIDTH - BORDER_OFFSET, GRID_SIZE):
-            self.buildings.append(Building(x, BORDER_OFFSET, BuildingType.WALL, self.difficulty))
-            self.buildings.append(
+            self.buildings.add(Building(x, BORDER_OFFSET, BuildingType.WALL, self.difficulty))
+            self.buildings.add(
                 Building(x, SCREEN_HEIGHT - BORDER_OFFSET - GRID_SIZE, BuildingType.WALL, self.difficulty))
 
         for y in range(BORDER_OFFSET + GRID_SIZE, SCREEN_HEIGHT - BORDER_OFFSET - GRID_SIZE, GRID_SIZE):
-            self.buildings.append(Building(BORDER_OFFSET, y, BuildingType.WALL, self.difficulty))
-            self.buildings.append(
+            self.buildings.add(Building(BORDER_OFFSET, y, BuildingType.WALL, self.difficulty))
+            self.buildings.add(
                 Building(SCREEN_WIDTH - BORDER_OFFSET - GRID_SIZE, y, BuildingType.WALL, self.difficulty))
 
-    def spawn_wave(self):
-        self.units = [unit for unit in self.units if unit.is_defender]
+    def on_building_event(self, event, building):
+        """Держит сетку стен, поле маршрутов и таймеры производства в соответствии с реестром зданий"""
+        if building.type in (BuildingType.BARRACKS, BuildingType.GOLD_MINE):
+            # Новое или восстановленное здание начинает отсчет заново
+            if event == 'removed':
+                building.stop_timer(self)
+            else:
+                building.start_timer(self)
+            return
+        if building.type != BuildingType.WALL:
+            return
+        # Стены ничего не делают каждый шаг: их состояние меняется только по событиям урона и ремонта
+        building.is_broken = building.health <= 0
+        self.blocked_paths = {}
+        if event == 'removed' or building.health <= 0:
+            self.wall_grid.clear_wall(building)
+            self.flow_field.wall_removed(building)
+        else:
+            self.wall_grid.set_wall(building)
+            self.flow_field.wall_added(building)
 
-        wave_multiplier = 1 + self.wave * 0.5
-        difficulty_multiplier = 1 + self.difficulty.value * 0.3
+    def spawn_wave(self):
+        for unit in self.units.remove_faction(False):
+            if self.unit_store is not None:
+                self.unit_store.remove(unit)
+            else:
+                self.unit_pool.release(unit)
+        self.enemy_grid.clear()
+
+        balance = self.balance
+        wave_multiplier = 1 + self.wave * balance.wave_step
+        difficulty_multiplier = 1 + self.difficulty.value * balance.difficulty_step
+        count = int(balance.wave_count(self.wave) * wave_multiplier * difficulty_multiplier)
 
         if self.wave == 0:
-            count = int(6 * wave_multiplier * difficulty_multiplier)
             for _ in range(count):
                 self.spawn_enemy(UnitType.WARRIOR)
 
         elif self.wave == 1:
-            count = int(9 * wave_multiplier * difficulty_multiplier)
             for _ in range(count):
-                unit_type = random.choice([UnitType.WARRIOR, UnitType.ARCHER])
+                unit_type = self.wave_rng.choice([UnitType.WARRIOR, UnitType.ARCHER])
                 self.spawn_enemy(unit_type)
 
         elif self.wave == 2:
-            count = int(7 * wave_multiplier * difficulty_multiplier)
             for _ in range(count):
                 self.spawn_enemy(UnitType.WARRIOR)
 
             boss = self.spawn_enemy(UnitType.GIANT)
-            boss.health = int(800 * difficulty_multiplier)
+            boss.health = int(balance.giant_health * difficulty_multiplier)
             boss.max_health = boss.health
-            boss.attack_damage = int(40 * difficulty_multiplier)
+            boss.attack_damage = int(balance.giant_damage * difficulty_multiplier)
+
+        self.wake_barracks()
+
+    def wake_barracks(self):
+        """Казармы, чей отсчет остановился вне боя или без врагов, продолжают его"""
+        for barracks in self.buildings.barracks:
+            barracks.wake(self)
+
+    def pause_barracks(self):
+        """Бой прерван (справка) или враги кончились: казармы ждут, не теряя накопленного отсчета"""
+        for barracks in self.buildings.barracks:
+            barracks.pause(self)
 
     def spawn_enemy(self, unit_type):
+        rng = self.spawn_rng
         spawn_options = [
-            lambda: (random.randint(0, BORDER_OFFSET), random.randint(0, SCREEN_HEIGHT)),
-            lambda: (random.randint(SCREEN_WIDTH - BORDER_OFFSET, SCREEN_WIDTH), random.randint(0, SCREEN_HEIGHT)),
-            lambda: (random.randint(0, SCREEN_WIDTH), random.randint(0, BORDER_OFFSET)),
-            lambda: (random.randint(0, SCREEN_WIDTH), random.randint(SCREEN_HEIGHT - BORDER_OFFSET, SCREEN_HEIGHT))
+            lambda: (rng.randint(0, BORDER_OFFSET), rng.randint(0, SCREEN_HEIGHT)),
+            lambda: (rng.randint(SCREEN_WIDTH - BORDER_OFFSET, SCREEN_WIDTH), rng.randint(0, SCREEN_HEIGHT)),
+            lambda: (rng.randint(0, SCREEN_WIDTH), rng.randint(0, BORDER_OFFSET)),
+            lambda: (rng.randint(0, SCREEN_WIDTH), rng.randint(SCREEN_HEIGHT - BORDER_OFFSET, SCREEN_HEIGHT))
         ]
 
-        spawn_func = random.choice(spawn_options)
+        spawn_func = rng.choice(spawn_options)
         x, y = spawn_func()
-        enemy = Unit(x, y, unit_type, False, self.difficulty)
-        self.units.append(enemy)
-        return enemy
+        return self.spawn_unit(x, y, unit_type, False)
+
+    def spawn_unit(self, x, y, unit_type, is_defender):
+        if self.unit_store is not None:
+            unit = StoredUnit(self.unit_store, x, y, unit_type, is_defender, self.difficulty)
+        else:
+            unit = self.unit_pool.acquire(x, y, unit_type, is_defender, self.difficulty)
+        self.add_unit(unit)
+        return unit
+
+    def grid_for(self, unit):
+        return self.defender_grid if unit.is_defender else self.enemy_grid
+
+    def add_unit(self, unit):
+        self.units.add(unit)
+        # С UnitStore ближайших ищет сам UnitStore, сетки не нужны
+        if self.unit_store is None:
+            self.grid_for(unit).insert(unit)
+        else:
+            self.unit_store.slot[unit._index] = unit.handle.slot
+
+    def remove_unit(self, unit):
+        if self.units.remove(unit):
+            if not unit.is_defender and not self.units.count(False):
+                self.pause_barracks()
+            self.grid_for(unit).remove(unit)
+            if self.unit_store is not None:
+                self.unit_store.remove(unit)
+            else:
+                self.unit_pool.release(unit)
+
+    def seed_rng(self, seed):
+        """Свой генератор у каждой подсистемы: лишний вызов в одной не сдвигает случайность в другой"""
+        self.seed = seed
+        self.wave_rng = random.Random(f"{seed}:waves")
+        self.spawn_rng = random.Random(f"{seed}:spawn")
+
+    def select_difficulty(self, difficulty):
+        """Выбирает уровень сложности и переходит к фазе строительства"""
+        self.difficulty = difficulty
+        self.gold = self.balance.start_gold[difficulty]
+        self.state = GameState.BUILD
 
     def draw_help_screen(self):
         # Полупрозрачный фон
@@ -155,7 +321,9 @@ class Game:
                     right_click = True
 
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_m:  # M - вкл/выкл музыку
+                if event.key == pygame.K_F3:  # F3 - оверлей профилировщика
+                    self.profiler.toggle_overlay()
+                elif event.key == pygame.K_m:  # M - вкл/выкл музыку
                     if pygame.mixer.music.get_busy():
                         pygame.mixer.music.pause()
                     else:
@@ -167,30 +335,18 @@ class Game:
                     vol = max(0.0, pygame.mixer.music.get_volume() - 0.1)
                     pygame.mixer.music.set_volume(vol)
                 elif event.key == pygame.K_f:  # F - пополнить запас выбранного барака
-                    if self.selected_barracks:
-                        self.selected_barracks.refill_gold(self, 50)
+                    self.apply_command(Command.REFILL)
                 elif event.key == pygame.K_r:  # R - восстановить шахту
-                    if self.selected_mine and self.selected_mine.health <= 0:
-                        self.buildings.remove(self.selected_mine)
-                        new_mine = Building(self.selected_mine.x, self.selected_mine.y,
-                                            BuildingType.GOLD_MINE, self.difficulty)
-                        self.buildings.append(new_mine)
-                        self.selected_mine = new_mine
+                    self.apply_command(Command.RESTORE)
                 elif event.key == pygame.K_ESCAPE:  # ESC - вернуться из меню помощи
                     if self.state == GameState.HELP:
-                        self.state = GameState.BUILD if self.build_timer < self.build_time else GameState.BATTLE
+                        self.apply_command(Command.CLOSE_HELP)
                 elif event.key == pygame.K_1 and self.state in [GameState.BUILD, GameState.BATTLE]:
-                    self.selected_building = BuildingType.BARRACKS
-                    self.selected_barracks = None
-                    self.selected_mine = None
+                    self.apply_command(Command.SELECT_TYPE, BuildingType.BARRACKS.value)
                 elif event.key == pygame.K_2 and self.state in [GameState.BUILD, GameState.BATTLE]:
-                    self.selected_building = BuildingType.GOLD_MINE
-                    self.selected_barracks = None
-                    self.selected_mine = None
+                    self.apply_command(Command.SELECT_TYPE, BuildingType.GOLD_MINE.value)
                 elif event.key == pygame.K_3 and self.state in [GameState.BUILD, GameState.BATTLE]:
-                    self.selected_building = BuildingType.WALL
-                    self.selected_barracks = None
-                    self.selected_mine = None
+                    self.apply_command(Command.SELECT_TYPE, BuildingType.WALL.value)
 
         # Проверка кнопок
         if self.state == GameState.MENU:
@@ -198,97 +354,136 @@ class Game:
             self.medium_button.check_hover(mouse_pos)
             self.hard_button.check_hover(mouse_pos)
 
-            if mouse_click:
+            # Пока грузятся текстуры, вместо меню виден экран загрузки - клики по невидимым кнопкам не считаются
+            if mouse_click and self.assets_ready():
                 if self.easy_button.is_clicked(mouse_pos, mouse_click):
-                    self.difficulty = Difficulty.EASY
-                    self.gold = 500
-                    self.state = GameState.BUILD
+                    self.apply_command(Command.DIFFICULTY, Difficulty.EASY.value)
                 elif self.medium_button.is_clicked(mouse_pos, mouse_click):
-                    self.difficulty = Difficulty.MEDIUM
-                    self.gold = 400
-                    self.state = GameState.BUILD
+                    self.apply_command(Command.DIFFICULTY, Difficulty.MEDIUM.value)
                 elif self.hard_button.is_clicked(mouse_pos, mouse_click):
-                    self.difficulty = Difficulty.HARD
-                    self.gold = 300
-                    self.state = GameState.BUILD
+                    self.apply_command(Command.DIFFICULTY, Difficulty.HARD.value)
 
         elif self.state == GameState.HELP:
             self.back_button.check_hover(mouse_pos)
             if mouse_click and self.back_button.is_clicked(mouse_pos, mouse_click):
-                self.state = GameState.BUILD if self.build_timer < self.build_time else GameState.BATTLE
+                self.apply_command(Command.CLOSE_HELP)
 
         elif self.state in [GameState.BUILD, GameState.BATTLE]:
             self.help_button.check_hover(mouse_pos)
             if mouse_click and self.help_button.is_clicked(mouse_pos, mouse_click):
-                self.state = GameState.HELP
+                self.apply_command(Command.OPEN_HELP)
 
             if right_click:  # Обработка ПКМ для отмены выбора
-                self.selected_building = None
-                self.selected_barracks = None
-                self.selected_mine = None
+                self.apply_command(Command.CANCEL)
 
             if mouse_click:
-                if self.selected_building:
-                    grid_x = (mouse_pos[0] // GRID_SIZE) * GRID_SIZE
-                    grid_y = (mouse_pos[1] // GRID_SIZE) * GRID_SIZE
-
-                    valid_position = True
-                    new_width = 2 if self.selected_building in [BuildingType.TOWN_HALL, BuildingType.BARRACKS] else 1
-                    new_height = 2 if self.selected_building in [BuildingType.TOWN_HALL, BuildingType.BARRACKS] else 1
-
-                    if (grid_x < BORDER_OFFSET or
-                            grid_x + new_width * GRID_SIZE > SCREEN_WIDTH - BORDER_OFFSET or
-                            grid_y < BORDER_OFFSET or
-                            grid_y + new_height * GRID_SIZE > SCREEN_HEIGHT - BORDER_OFFSET):
-                        valid_position = False
-
-                    for building in self.buildings:
-                        if (grid_x < building.x + building.width * GRID_SIZE and
-                                grid_x + new_width * GRID_SIZE > building.x and
-                                grid_y < building.y + building.height * GRID_SIZE and
-                                grid_y + new_height * GRID_SIZE > building.y):
-                            valid_position = False
-                            break
-
-                    if valid_position:
-                        cost = 0
-                        if self.selected_building == BuildingType.BARRACKS:
-                            cost = 100
-                        elif self.selected_building == BuildingType.GOLD_MINE:
-                            cost = 75
-                        elif self.selected_building == BuildingType.WALL:
-                            cost = 50
-
-                        if self.gold >= cost:
-                            self.gold -= cost
-                            new_building = Building(grid_x, grid_y, self.selected_building, self.difficulty)
-                            self.buildings.append(new_building)
-                            # После размещения здания сбрасываем выбор
-                            self.selected_building = None
-                else:
-                    # Сброс выбора
-                    self.selected_barracks = None
-                    self.selected_mine = None
-
-                    # Выбор здания для взаимодействия
-                    for building in self.buildings:
-                        if (building.x <= mouse_pos[0] <= building.x + building.width * GRID_SIZE and
-                                building.y <= mouse_pos[1] <= building.y + building.height * GRID_SIZE):
-                            if building.type == BuildingType.WALL and building.health <= 0:
-                                building.repair(self)
-                            elif building.type == BuildingType.BARRACKS:
-                                self.selected_barracks = building
-                            elif building.type == BuildingType.GOLD_MINE:
-                                self.selected_mine = building
-                            break
+                self.apply_command(Command.CLICK, *mouse_pos)
 
         elif self.state in [GameState.WIN, GameState.LOSE]:
             for event in pygame.event.get():
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
-                    self.__init__()
-
-    def update(self):
-        dt = self.clock.get_time()
+                    # Запись покрывает одну игру
+                    self.stop_recording()
+                    profiler, profile_path = self.profiler, self.profile_path
+                    self.__init__(self.headless, self.unit_store is not None, balance=self.balance)
+                    self.profiler, self.profile_path = profiler, profile_path
+
+    def apply_command(self, command, *args):
+        """Единая точка для действий игрока, меняющих симуляцию: отсюда они попадают в запись боя"""
+        if self.recorder is not None:
+            self.recorder.write(self.tick, command, args)
+
+        if command == Command.DIFFICULTY:
+            self.select_difficulty(Difficulty(args[0]))
+        elif command == Command.SELECT_TYPE:
+            self.selected_building = BuildingType(args[0])
+            self.selected_barracks = None
+            self.selected_mine = None
+        elif command == Command.CANCEL:
+            self.selected_building = None
+            self.selected_barracks = None
+            self.selected_mine = None
+        elif command == Command.CLICK:
+            self.click(*args)
+        elif command == Command.REFILL:
+            if self.selected_barracks:
+                self.selected_barracks.refill_gold(self, 50)
+        elif command == Command.RESTORE:
+            if self.selected_mine and self.selected_mine.health <= 0:
+                self.selected_mine.restore(self)
+        elif command == Command.OPEN_HELP:
+            self.state = GameState.HELP
+            self.pause_barracks()
+        elif command == Command.CLOSE_HELP:
+            self.state = GameState.BUILD if self.build_timer < self.build_time else GameState.BATTLE
+            self.wake_barracks()
+
+    def click(self, x, y):
+        """Левый клик по полю: ставит выбранное здание или выбирает/чинит здание под курсором"""
+        if self.selected_building:
+            grid_x = (x // GRID_SIZE) * GRID_SIZE
+            grid_y = (y // GRID_SIZE) * GRID_SIZE
+
+            valid_position = True
+            archetype = BUILDING_ARCHETYPES[self.selected_building.name]
+            new_width = archetype.width
+            new_height = archetype.height
+
+            if (grid_x < BORDER_OFFSET or
+                    grid_x + new_width * GRID_SIZE > SCREEN_WIDTH - BORDER_OFFSET or
+                    grid_y < BORDER_OFFSET or
+                    grid_y + new_height * GRID_SIZE > SCREEN_HEIGHT - BORDER_OFFSET):
+                valid_position = False
+
+            new_rect = pygame.Rect(grid_x, grid_y, new_width * GRID_SIZE, new_height * GRID_SIZE)
+            for building in self.buildings:
+                if building.rect.colliderect(new_rect):
+                    valid_position = False
+                    break
+
+            if valid_position:
+                cost = archetype.cost
+                if self.gold >= cost:
+                    self.gold -= cost
+                    new_building = Building(grid_x, grid_y, self.selected_building, self.difficulty)
+                    self.buildings.add(new_building)
+                    # После размещения здания сбрасываем выбор
+                    self.selected_building = None
+        else:
+            # Сброс выбора
+            self.selected_barracks = None
+            self.selected_mine = None
+
+            # Выбор здания для взаимодействия
+            for building in self.buildings:
+                if (building.x <= x <= building.x + building.width * GRID_SIZE and
+                        building.y <= y <= building.y + building.height * GRID_SIZE):
+                    if building.type == BuildingType.WALL and building.health <= 0:
+                        building.repair(self)
+                    elif building.type == BuildingType.BARRACKS:
+                        self.selected_barracks = building
+                    elif building.type == BuildingType.GOLD_MINE:
+                        self.selected_mine = building
+                    break
+
+    def start_recording(self, path):
+        """Начинает писать бой в файл: seed, текущие здания и дальше все команды игрока"""
+        self.stop_recording()
+        self.recorder = ReplayWriter(path, self.seed, self.buildings)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close(self.tick)
+            self.recorder = None
+
+    def start_profiling(self, path):
+        """Копит время фаз каждого кадра, чтобы при выходе выгрузить их в path"""
+        self.profile_path = path
+        self.profiler.keep_samples = True
+
+    def update(self, dt=FIXED_DT):
+        """Один шаг симуляции; при одинаковых seed, шаге и вводе бой повторяется в точности"""
+        self.tick += 1
 
         if self.state == GameState.BUILD:
             self.build_timer += dt
@@ -298,9 +493,7 @@ class Game:
                 self.spawn_wave()
 
         elif self.state == GameState.BATTLE:
-            enemies_remaining = any(not unit.is_defender for unit in self.units)
-
-            if not enemies_remaining:
+            if not self.units.count(False):
                 self.wave_timer += dt
                 if self.wave_timer >= self.wave_interval:
                     self.wave_timer = 0
@@ -310,18 +503,89 @@ class Game:
                     else:
                         self.state = GameState.WIN
 
-        # Обновляем здания (включая казармы и шахты)
-        for building in self.buildings:
-            building.update(dt, self)
+        # Наступившие события зданий: доход шахт и найм в казармах
+        with self.profiler.phase('buildings'):
+            self.scheduler.advance(dt)
 
         # Обновляем юнитов
-        for unit in self.units[:]:
-            unit.update(dt, self)
-            if unit.health <= 0 and unit in self.units:
-                self.units.remove(unit)
+        if self.unit_store is not None:
+            self.update_stored_units(dt)
+        else:
+            ai_time = [0.0, 0.0]  # враги, защитники
+            for unit in self.units:
+                start = time.perf_counter()
+                unit.update(dt, self)
+                ai_time[unit.is_defender] += time.perf_counter() - start
+                self.grid_for(unit).move(unit)
+            self.profiler.add('ai_enemies', ai_time[0])
+            self.profiler.add('ai_defenders', ai_time[1])
+
+        # Урон, гибель и новые юниты за шаг - одной пачкой, когда никто уже не обходит списки
+        with self.profiler.phase('commands'):
+            self.commands.apply(self)
+
+    def update_stored_units(self, dt):
+        """ИИ решает за каждого юнита, а движение и перезарядка идут пакетом по массивам.
+
+        Как и без UnitStore, сначала ходят враги, потом защитники - уже по новым позициям врагов. Внутри
+        стороны юниты друг от друга не зависят, поэтому каждую сторону можно сдвинуть одним step().
+        """
+        store = self.unit_store
+        town_hall = self.buildings.town_hall
+        for is_defender in (False, True):
+            units = self.units.faction(is_defender)
+            with self.profiler.phase('unit_step'):
+                store.find_nearest(is_defender)
+                store.refresh_views()
+            if not is_defender:
+                # Враги, занятые стеной, до проверки видимости не дойдут
+                enemies = [unit for unit in units if not (unit.target_wall and unit.target_wall.health > 0)]
+                if town_hall and len(enemies) >= self.wall_rects.MIN_BATCH:
+                    rows = [unit._index for unit in enemies]
+                    blocked = self.wall_rects.blocked(store.x[rows], store.y[rows], town_hall.center)
+                    self.blocked_paths = dict(zip(enemies, blocked.tolist()))
+
+            start = time.perf_counter()
+            for unit in units:
+                unit.update(dt, self)
+            self.profiler.add('ai_defenders' if is_defender else 'ai_enemies', time.perf_counter() - start)
+            self.blocked_paths = {}
+
+            with self.profiler.phase('unit_step'):
+                store.step(dt)
+
+    def get_preview(self, building_type, width, height):
+        """Полупрозрачный предпросмотр постройки; собирается один раз на тип"""
+        preview = self.previews.get(building_type)
+        if preview is None:
+            size = (width * GRID_SIZE, height * GRID_SIZE)
+            preview = pygame.Surface(size, pygame.SRCALPHA)
+            preview.fill((255, 255, 255, 128))
+            preview.blit(assets.get(BUILDING_ARCHETYPES[building_type.name].texture, size), (0, 0))
+            self.previews[building_type] = preview
+        return preview
+
+    def assets_ready(self):
+        """Загружены ли текстуры, нужные текущему экрану"""
+        return assets.ready(MENU_TEXTURES if self.state == GameState.MENU else None)
+
+    def draw_loading_screen(self):
+        self.screen.fill(BLACK)
+        text = self.font.render(f"Загрузка... {int(assets.progress * 100)}%", True, WHITE)
+        self.screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 - 40))
+        bar = pygame.Rect(SCREEN_WIDTH // 4, SCREEN_HEIGHT // 2, SCREEN_WIDTH // 2, 20)
+        pygame.draw.rect(self.screen, LIGHT_BLUE, (bar.x, bar.y, int(bar.width * assets.progress), bar.height))
+        pygame.draw.rect(self.screen, WHITE, bar, 2)
 
     def draw(self):
-        if self.state == GameState.MENU:
+        if self.headless:
+            return
+
+        if not self.assets_ready():
+            # Пока фоновый поток грузит текстуры, окно остается отзывчивым
+            self.draw_loading_screen()
+
+        elif self.state == GameState.MENU:
             self.screen.blit(textures['menu_background'], (0, 0))
 
             title = self.font.render("Clash of Berserk", True, WHITE)
@@ -338,85 +602,76 @@ class Game:
             self.draw_help_screen()
 
         elif self.state in [GameState.BUILD, GameState.BATTLE]:
-            self.screen.blit(textures['background'], (0, 0))
-
-            if self.state == GameState.BUILD:
-                for x in range(0, SCREEN_WIDTH, GRID_SIZE):
-                    pygame.draw.line(self.screen, GRAY, (x, 0), (x, SCREEN_HEIGHT), 1)
-                for y in range(0, SCREEN_HEIGHT, GRID_SIZE):
-                    pygame.draw.line(self.screen, GRAY, (0, y), (SCREEN_WIDTH, y), 1)
-
-            for building in self.buildings:
-                building.draw(self.screen)
-
-            for unit in self.units:
-                unit.draw(self.screen)
+            with self.profiler.phase('draw_background'):
+                self.screen.blit(textures['background'], (0, 0))
+
+                if self.state == GameState.BUILD:
+                    for x in range(0, SCREEN_WIDTH, GRID_SIZE):
+                        pygame.draw.line(self.screen, GRAY, (x, 0), (x, SCREEN_HEIGHT), 1)
+                    for y in range(0, SCREEN_HEIGHT, GRID_SIZE):
+                        pygame.draw.line(self.screen, GRAY, (0, y), (SCREEN_WIDTH, y), 1)
+
+            with self.profiler.phase('draw_buildings'):
+                for building in self.buildings:
+                    building.draw(self.screen)
+
+            with self.profiler.phase('draw_units'):
+                for unit in self.units:
+                    unit.draw(self.screen, self.units)
+
+            with self.profiler.phase('hud'):
+                time_left = max(0, (self.build_time - self.build_timer) // 1000) if self.state == GameState.BUILD else 0
+                timer_text = self.font.render(
+                    f"Build Time: {time_left}s" if self.state == GameState.BUILD else f"Wave: {self.wave + 1}/3", True,
+                    BLACK)
+                self.screen.blit(timer_text, (20, 20))
+
+                gold_text = self.font.render(f"Gold: {self.gold}", True, YELLOW)
+                self.screen.blit(gold_text, (20, 60))
+
+                if self.state == GameState.BUILD:
+                    instructions = self.small_font.render("Press 1: Barracks (100g), 2: Gold Mine (75g), 3: Wall (50g)",
+                                                          True,
+                                                          BLACK)
+                    self.screen.blit(instructions, (SCREEN_WIDTH // 2 - instructions.get_width() // 2, 20))
+
+                    repair_text = self.small_font.render(
+                        "Left-click: select/interact, Right-click: cancel, F: fund barrack, R: restore mine", True, BLACK)
+                    self.screen.blit(repair_text, (SCREEN_WIDTH // 2 - repair_text.get_width() // 2, 60))
+
+                # Подсветка выбранного здания
+                if self.selected_barracks:
+                    pygame.draw.rect(self.screen, BLUE,
+                                     (self.selected_barracks.x - 2, self.selected_barracks.y - 2,
+                                      self.selected_barracks.width * GRID_SIZE + 4,
+                                      self.selected_barracks.height * GRID_SIZE + 4), 2)
+
+                    status_text = self.small_font.render(f"Нажмите F чтобы востановить (50g)", True, BLUE)
+                    self.screen.blit(status_text, (self.selected_barracks.x, self.selected_barracks.y - 30))
+
+                if self.selected_mine:
+                    pygame.draw.rect(self.screen, YELLOW,
+                                     (self.selected_mine.x - 2, self.selected_mine.y - 2,
+                                      self.selected_mine.width * GRID_SIZE + 4,
+                                      self.selected_mine.height * GRID_SIZE + 4), 2)
+
+                    if self.selected_mine.health <= 0:
+                        status_text = self.small_font.render(f"Нажмите R чтобы востановить (75g)", True, YELLOW)
+                        self.screen.blit(status_text, (self.selected_mine.x, self.selected_mine.y - 30))
 
-            time_left = max(0, (self.build_time - self.build_timer) // 1000) if self.state == GameState.BUILD else 0
-            timer_text = self.font.render(
-                f"Build Time: {time_left}s" if self.state == GameState.BUILD else f"Wave: {self.wave + 1}/3", True,
-                BLACK)
-            self.screen.blit(timer_text, (20, 20))
+                if self.selected_building:
+                    mouse_pos = pygame.mouse.get_pos()
+                    grid_x = (mouse_pos[0] // GRID_SIZE) * GRID_SIZE
+                    grid_y = (mouse_pos[1] // GRID_SIZE) * GRID_SIZE
 
-            gold_text = self.font.render(f"Gold: {self.gold}", True, YELLOW)
-            self.screen.blit(gold_text, (20, 60))
+                    archetype = BUILDING_ARCHETYPES[self.selected_building.name]
+                    width, height = archetype.width, archetype.height
 
-            if self.state == GameState.BUILD:
-                instructions = self.small_font.render("Press 1: Barracks (100g), 2: Gold Mine (75g), 3: Wall (50g)",
-                                                      True,
-                                                      BLACK)
-                self.screen.blit(instructions, (SCREEN_WIDTH // 2 - instructions.get_width() // 2, 20))
+                    preview = self.get_preview(self.selected_building, width, height)
+                    self.screen.blit(preview, (grid_x, grid_y))
 
-                repair_text = self.small_font.render(
-                    "Left-click: select/interact, Right-click: cancel, F: fund barrack, R: restore mine", True, BLACK)
-                self.screen.blit(repair_text, (SCREEN_WIDTH // 2 - repair_text.get_width() // 2, 60))
-
-            # Подсветка выбранного здания
-            if self.selected_barracks:
-                pygame.draw.rect(self.screen, BLUE,
-                                 (self.selected_barracks.x - 2, self.selected_barracks.y - 2,
-                                  self.selected_barracks.width * GRID_SIZE + 4,
-                                  self.selected_barracks.height * GRID_SIZE + 4), 2)
-
-                status_text = self.small_font.render(f"Нажмите F чтобы востановить (50g)", True, BLUE)
-                self.screen.blit(status_text, (self.selected_barracks.x, self.selected_barracks.y - 30))
-
-            if self.selected_mine:
-                pygame.draw.rect(self.screen, YELLOW,
-                                 (self.selected_mine.x - 2, self.selected_mine.y - 2,
-                                  self.selected_mine.width * GRID_SIZE + 4,
-                                  self.selected_mine.height * GRID_SIZE + 4), 2)
-
-                if self.selected_mine.health <= 0:
-                    status_text = self.small_font.render(f"Нажмите R чтобы востановить (75g)", True, YELLOW)
-                    self.screen.blit(status_text, (self.selected_mine.x, self.selected_mine.y - 30))
-
-            if self.selected_building:
-                mouse_pos = pygame.mouse.get_pos()
-                grid_x = (mouse_pos[0] // GRID_SIZE) * GRID_SIZE
-                grid_y = (mouse_pos[1] // GRID_SIZE) * GRID_SIZE
-
-                width = 2 if self.selected_building in [BuildingType.TOWN_HALL, BuildingType.BARRACKS] else 1
-                height = 2 if self.selected_building in [BuildingType.TOWN_HALL, BuildingType.BARRACKS] else 1
-
-                # Прозрачная поверхность для предпросмотра
-                preview = pygame.Surface((width * GRID_SIZE, height * GRID_SIZE), pygame.SRCALPHA)
-                preview.fill((255, 255, 255, 128))
-
-                if self.selected_building == BuildingType.BARRACKS:
-                    preview.blit(pygame.transform.scale(textures['barracks'], (width * GRID_SIZE, height * GRID_SIZE)),
-                                 (0, 0))
-                elif self.selected_building == BuildingType.GOLD_MINE:
-                    preview.blit(pygame.transform.scale(textures['gold_mine'], (width * GRID_SIZE, height * GRID_SIZE)),
-                                 (0, 0))
-                elif self.selected_building == BuildingType.WALL:
-                    preview.blit(pygame.transform.scale(textures['wall'], (width * GRID_SIZE, height * GRID_SIZE)),
-                                 (0, 0))
-
-                self.screen.blit(preview, (grid_x, grid_y))
-
-            # Кнопка помощи
-            self.help_button.draw(self.screen, self.font)
+                # Кнопка помощи
+                self.help_button.draw(self.screen, self.font)
 
         elif self.state == GameState.WIN:
             self.screen.blit(textures['background'], (0, 0))
@@ -430,19 +685,41 @@ class Game:
             self.screen.blit(lose_text, (SCREEN_WIDTH // 2 - lose_text.get_width() // 2,
                                          SCREEN_HEIGHT // 2 - lose_text.get_height() // 2))
 
-        pygame.display.flip()
+        with self.profiler.phase('overlay'):
+            self.profiler.draw_overlay(self.screen, labels, 24, WHITE)
 
-    def run(self):
+        with self.profiler.phase('flip'):
+            pygame.display.flip()
+
+    def poll_assets(self):
+        """Забирает загруженное фоновым потоком; музыка включается, когда загрузка закончена"""
+        assets.poll()
         # Воспроизведение музыки
-        if music_loaded:
+        if assets.finished and assets.music_loaded:
             pygame.mixer.music.play(-1)  # -1 означает бесконечный цикл
             pygame.mixer.music.set_volume(0.5)  # Громкость от 0.0 до 1.0
 
+    def run(self):
+        # Симуляция идет фиксированными шагами FIXED_DT, отрисовка - с той частотой, что получается
+        accumulator = 0
         while self.running:
-            self.clock.tick(FPS)
-            self.handle_events()
-            self.update()
+            accumulator += min(self.clock.tick(FPS), MAX_FRAME_TIME)
+            self.profiler.begin_frame()
+            if not assets.finished:
+                self.poll_assets()
+            with self.profiler.phase('events'):
+                self.handle_events()
+            if not self.assets_ready():
+                # Бой не идет, пока не загружены его текстуры
+                accumulator = 0
+            while accumulator >= FIXED_DT:
+                self.update(FIXED_DT)
+                accumulator -= FIXED_DT
             self.draw()
+            self.profiler.end_frame()
 
+        self.stop_recording()
+        if self.profile_path:
+            self.profiler.export(self.profile_path)
         pygame.quit()
         sys.exit()
\ No newline at end of file
@@ -0,0 +1,85 @@
+import argparse
+import time
+
+from beta import Game, GameState, Difficulty, FPS, FIXED_DT
+from archetypes import BUILDING_ARCHETYPES
+from constants import GRID_SIZE, BuildingType, UnitType
+
+
+def run_headless(game, dt=FIXED_DT, max_ticks=None, on_tick=None):
+    """Прогоняет game.update() с фиксированным dt так быстро, как позволяет процессор"""
+    ticks = 0
+    while game.running and game.state not in [GameState.WIN, GameState.LOSE]:
+        if max_ticks is not None and ticks >= max_ticks:
+            break
+        game.update(dt)
+        ticks += 1
+        if on_tick is not None:
+            on_tick(game, ticks)
+    return ticks
+
+
+def simulate_battle(difficulty=Difficulty.EASY, dt=FIXED_DT, max_ticks=None, unit_store=False, seed=None,
+                    layout=None, on_tick=None, balance=None):
+    """Создает игру без окна, пропускает меню и проигрывает бой до конца"""
+    game = Game(headless=True, unit_store=unit_store, seed=seed, balance=balance)
+    if layout is not None:
+        # Своя расстановка зданий вместо стартовой (список (BuildingType, x, y), как в записи боя)
+        game.init_village(layout)
+    game.select_difficulty(difficulty)
+    spend_start_gold(game)
+    ticks = run_headless(game, dt, max_ticks, on_tick)
+    return game, ticks
+
+
+def spend_start_gold(game):
+    """Без игрока стартовое золото тратит простое правило, иначе start_gold ни на что не влияет.
+
+    Есть казармы - золото поровну ложится в их запас, и они нанимают по ходу волн;
+    казарм нет - на все золото сразу нанимаются воины у Town Hall по цене найма в казармах.
+    """
+    barracks = list(game.buildings.barracks)
+    if barracks:
+        share = game.gold // len(barracks)
+        for building in barracks:
+            building.gold_reserve += share
+        game.gold -= share * len(barracks)
+        return
+
+    town_hall = game.buildings.town_hall
+    hire_cost = BUILDING_ARCHETYPES[BuildingType.BARRACKS.name].hire_cost
+    count = game.gold // hire_cost
+    for index in range(count):
+        # Отряд рядами по 10 под Town Hall
+        x = town_hall.center[0] + (index % 10 - 5) * 8
+        y = town_hall.center[1] + GRID_SIZE + index // 10 * 8
+        game.spawn_unit(x, y, UnitType.WARRIOR, True)
+    game.gold -= count * hire_cost
+
+
+def town_hall_health(game):
+    town_hall = game.buildings.town_hall
+    return town_hall.health if town_hall else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless-симуляция боя Clash of Berserk")
+    parser.add_argument('--difficulty', choices=[d.name for d in Difficulty], default=Difficulty.EASY.name)
+    parser.add_argument('--dt', type=float, default=FIXED_DT, help="шаг симуляции в мс")
+    parser.add_argument('--max-ticks', type=int, default=FPS * 60 * 30, help="ограничение на число шагов")
+    parser.add_argument('--unit-store', action='store_true', help="хранить юнитов в массивах NumPy")
+    parser.add_argument('--seed', type=int, help="зерно генераторов; один seed - один и тот же бой")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    game, ticks = simulate_battle(Difficulty[args.difficulty], args.dt, args.max_ticks, args.unit_store,
+                                 args.seed)
+    elapsed = time.perf_counter() - start
+
+    print(f"Seed: {game.seed}")
+    print(f"Результат: {game.state.name}, волна {min(game.wave, 2) + 1}/3, Town Hall HP: {town_hall_health(game)}")
+    print(f"Шагов: {ticks}, игрового времени: {ticks * args.dt / 1000:.1f} с, реального времени: {elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,16 @@
+import argparse
+
 from beta import Game
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clash of Berserk")
+    parser.add_argument('--record', metavar='PATH', help="записать игру в файл для replay.py")
+    parser.add_argument('--profile', metavar='PATH', help="при выходе сохранить время фаз каждого кадра (.csv или .json)")
+    args = parser.parse_args()
+
     game = Game()
-    game.run()
\ No newline at end of file
+    if args.record:
+        game.start_recording(args.record)
+    if args.profile:
+        game.start_profiling(args.profile)
+    game.run()
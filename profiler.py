@@ -0,0 +1,107 @@
+import csv
+import json
+import time
+from collections import deque
+
+# Фазы кадра в порядке вывода; все, что не попало в фазы, видно по разнице с 'frame'
+PHASES = ('events', 'buildings', 'ai_enemies', 'ai_defenders', 'unit_step', 'commands',
+          'draw_background', 'draw_buildings', 'draw_units', 'hud', 'overlay', 'flip', 'frame')
+
+
+class _Phase:
+    """Контекст, который добавляет время своего блока к фазе кадра"""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class FrameProfiler:
+    """Время фаз каждого кадра: скользящие перцентили для оверлея и все кадры для выгрузки в CSV/JSON"""
+
+    def __init__(self, window=300, refresh=30, keep_samples=False):
+        self.window = window
+        self.refresh = refresh  # раз во сколько кадров пересчитывать перцентили оверлея
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.recent = {name: deque(maxlen=window) for name in PHASES}
+        # Все кадры сессии копятся, только если их потом выгрузят (--profile); оверлею хватает recent
+        self.keep_samples = keep_samples
+        self.samples = []
+        self.frames = 0
+        self.frame_start = None
+        self.overlay_visible = False
+        self.overlay_lines = []
+        self._phases = {name: _Phase(self, name) for name in PHASES}
+
+    def phase(self, name):
+        return self._phases[name]
+
+    def add(self, name, seconds):
+        self.current[name] += seconds
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        self.current['frame'] = time.perf_counter() - self.frame_start
+        sample = tuple(self.current[name] * 1000 for name in PHASES)
+        if self.keep_samples:
+            self.samples.append(sample)
+        for name, value in zip(PHASES, sample):
+            self.recent[name].append(value)
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.frames += 1
+        if self.overlay_visible and self.frames % self.refresh == 0:
+            self.overlay_lines = self.summary_lines()
+
+    def percentiles(self, name, points=(50, 95, 99)):
+        """Перцентили фазы в мс по последним window кадрам"""
+        values = sorted(self.recent[name])
+        if not values:
+            return tuple(0.0 for _ in points)
+        return tuple(values[min(len(values) - 1, len(values) * p // 100)] for p in points)
+
+    def summary_lines(self):
+        lines = [f"{'фаза':<16}{'p50':>7}{'p95':>7}{'p99':>7}  мс"]
+        for name in PHASES:
+            p50, p95, p99 = self.percentiles(name)
+            lines.append(f"{name:<16}{p50:7.2f}{p95:7.2f}{p99:7.2f}")
+        return lines
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        if self.overlay_visible:
+            self.overlay_lines = self.summary_lines()
+
+    def draw_overlay(self, screen, labels, size, color, position=(10, 110)):
+        """Строки берутся из кэша надписей: между пересчетами перцентилей они не меняются"""
+        if not self.overlay_visible:
+            return
+        x, y = position
+        line_height = labels.fonts.get(size).get_linesize()
+        for line in self.overlay_lines:
+            screen.blit(labels.render(line, size, color), (x, y))
+            y += line_height
+
+    def export(self, path):
+        """Выгружает все кадры сессии: .json - списком объектов, иначе CSV"""
+        if path.endswith('.json'):
+            with open(path, 'w') as file:
+                json.dump([dict(zip(PHASES, sample)) for sample in self.samples], file)
+        else:
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(('frame_index',) + PHASES)
+                for index, sample in enumerate(self.samples):
+                    writer.writerow((index,) + tuple(f"{value:.4f}" for value in sample))
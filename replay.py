@@ -0,0 +1,173 @@
+import struct
+
+from constants import Command, BuildingType
+
+# Формат файла (все числа little-endian):
+#   заголовок:  MAGIC, версия u8, seed u64, число зданий u16, здания (тип u8, x i16, y i16)
+#   записи:     приращение шага (varint), команда u8, аргументы команды
+#   конец:      приращение шага (varint), END - по нему проигрыватель знает, сколько шагов досчитать
+MAGIC = b'CBRP'
+# Версия растет, когда меняется порядок шагов симуляции: старую запись уже не повторить
+VERSION = 5
+END = 0xFF
+
+HEADER = struct.Struct('<4sBQH')
+BUILDING = struct.Struct('<Bhh')
+# Аргументы каждой команды
+ARGS = {
+    Command.DIFFICULTY: struct.Struct('<B'),
+    Command.SELECT_TYPE: struct.Struct('<B'),
+    Command.CLICK: struct.Struct('<hh'),
+}
+NO_ARGS = struct.Struct('')
+
+
+def write_varint(file, value):
+    while value >= 0x80:
+        file.write(bytes(((value & 0x7F) | 0x80,)))
+        value >>= 7
+    file.write(bytes((value,)))
+
+
+def read_varint(file):
+    value = 0
+    shift = 0
+    while True:
+        byte = file.read(1)
+        if not byte:
+            raise EOFError("Запись оборвана")
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+class ReplayWriter:
+    """Пишет запись боя прямо в файл по мере игры, в памяти ничего не копится"""
+
+    def __init__(self, path, seed, buildings):
+        self.file = open(path, 'wb')
+        self.last_tick = 0
+        layout = [(building.type, building.x, building.y) for building in buildings]
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, len(layout)))
+        for building_type, x, y in layout:
+            self.file.write(BUILDING.pack(building_type.value, x, y))
+
+    def write(self, tick, command, args):
+        write_varint(self.file, tick - self.last_tick)
+        self.last_tick = tick
+        self.file.write(bytes((command.value,)))
+        self.file.write(ARGS.get(command, NO_ARGS).pack(*args))
+
+    def close(self, tick):
+        if self.file.closed:
+            return
+        write_varint(self.file, tick - self.last_tick)
+        self.file.write(bytes((END,)))
+        self.file.close()
+
+
+class ReplayReader:
+    """Читает заголовок сразу, а команды - по одной при обходе"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        magic, version, self.seed, count = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: не запись боя или неподдерживаемая версия")
+        self.layout = []
+        for _ in range(count):
+            type_value, x, y = BUILDING.unpack(self.file.read(BUILDING.size))
+            self.layout.append((BuildingType(type_value), x, y))
+        self.end_tick = None
+        self.truncated = False
+
+    def __iter__(self):
+        """Выдает (шаг, команда, аргументы); после обхода end_tick - длина записи в шагах.
+
+        Запись без END (игра упала, файл не дописан) проигрывается до последней целой команды.
+        """
+        tick = 0
+        while True:
+            try:
+                delta, command, args = self._read_record()
+            except EOFError:
+                print(f"{self.path}: запись оборвана, воспроизводим до шага {tick}")
+                self.truncated = True
+                self.end_tick = tick
+                break
+            tick += delta
+            if command is None:
+                self.end_tick = tick
+                break
+            yield tick, command, args
+        self.file.close()
+
+    def _read_record(self):
+        """(приращение шага, команда или None для END, аргументы); EOFError, если запись не дописана"""
+        delta = read_varint(self.file)
+        code = self.file.read(1)
+        if not code:
+            raise EOFError("Запись оборвана")
+        if code[0] == END:
+            return delta, None, ()
+        command = Command(code[0])
+        args_struct = ARGS.get(command, NO_ARGS)
+        data = self.file.read(args_struct.size)
+        if len(data) < args_struct.size:
+            raise EOFError("Запись оборвана")
+        return delta, command, args_struct.unpack(data)
+
+
+def play(path, render=False):
+    """Пересчитывает бой из записи: без окна - с максимальной скоростью, с окном - в реальном времени"""
+    import pygame
+    from beta import Game, FPS
+
+    reader = ReplayReader(path)
+    game = Game(headless=not render, seed=reader.seed)
+    if render:
+        from assets_manager import assets
+        assets.wait()
+    game.init_village(reader.layout)
+
+    def advance(tick):
+        while game.running and game.tick < tick:
+            if render:
+                game.clock.tick(FPS)
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        game.running = False
+            game.update()
+            game.draw()
+
+    for tick, command, args in reader:
+        advance(tick)
+        game.apply_command(command, *args)
+    advance(reader.end_tick)
+    return game
+
+
+def main():
+    import argparse
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description="Воспроизведение записи боя Clash of Berserk")
+    parser.add_argument('path')
+    parser.add_argument('--render', action='store_true', help="показывать бой в окне в реальном времени")
+    args = parser.parse_args()
+    if not args.render:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+    start = time.perf_counter()
+    game = play(args.path, args.render)
+    elapsed = time.perf_counter() - start
+    print(f"Seed: {game.seed}, результат: {game.state.name}, волна {game.wave + 1}/3")
+    print(f"Шагов: {game.tick}, реального времени: {elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
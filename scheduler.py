@@ -0,0 +1,52 @@
+import heapq
+
+# Время копится суммой шагов FIXED_DT с ошибкой округления: событие, до которого осталось меньше, уже наступило
+EPSILON = 1e-6
+
+
+class Scheduler:
+    """События по игровому времени (мс) в одной куче: объект ставит событие вместо того, чтобы копить таймер каждый шаг"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.queue = []  # [срок, номер постановки, callback, args]
+        # При равном сроке события срабатывают в порядке постановки - бой повторяется в точности
+        self.counter = 0
+        # Ожидающие события без отмененных: отмена оставляет событие в куче, поэтому len(queue) не годится
+        self.pending = 0
+
+    def __len__(self):
+        return self.pending
+
+    def schedule(self, delay, callback, *args):
+        """callback(*args) через delay мс игрового времени; возвращает событие для cancel()"""
+        event = [self.now + delay, self.counter, callback, args]
+        self.counter += 1
+        heapq.heappush(self.queue, event)
+        self.pending += 1
+        return event
+
+    def cancel(self, event):
+        # Событие остается в куче, но уже ничего не вызовет; повторная отмена и отмена сработавшего - без эффекта
+        if event[2] is not None:
+            event[2] = None
+            self.pending -= 1
+
+    def advance(self, dt):
+        """Сдвигает время и вызывает все наступившие события"""
+        self.now += dt
+        queue = self.queue
+        while queue and queue[0][0] <= self.now + EPSILON:
+            event = heapq.heappop(queue)
+            callback, args = event[2], event[3]
+            if callback is not None:
+                # Сработавшее событие считается отмененным: cancel() на нем уже ничего не сдвинет
+                event[2] = None
+                self.pending -= 1
+                callback(*args)
+
+    def clear(self):
+        self.now = 0.0
+        self.queue.clear()
+        self.counter = 0
+        self.pending = 0
@@ -0,0 +1,91 @@
+try:
+    import numpy as np
+except ImportError:
+    # Без NumPy пакетные проверки недоступны, юниты используют WallGrid по одному
+    np = None
+
+from constants import BuildingType
+
+# Прямоугольник полуоткрытый, [x, x + w) x [y, y + h), как ячейка WallGrid (x // size): отрезок, идущий
+# ровно по правой или нижней стороне, принадлежит соседней ячейке, а не этой
+EDGE_EPSILON = 1e-6
+
+
+def _clip(x1, y1, x2, y2, rects):
+    """Slab-тест сразу для N отрезков и M прямоугольников: границы t0, t1 формы (N, M)"""
+    x1 = np.asarray(x1, dtype=np.float64)[:, None]
+    y1 = np.asarray(y1, dtype=np.float64)[:, None]
+    dx = np.asarray(x2, dtype=np.float64)[:, None] - x1
+    dy = np.asarray(y2, dtype=np.float64)[:, None] - y1
+    rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    left, top = rects[:, 0], rects[:, 1]
+    right, bottom = left + rects[:, 2] - EDGE_EPSILON, top + rects[:, 3] - EDGE_EPSILON
+
+    t0 = np.zeros((x1.shape[0], rects.shape[0]))
+    t1 = np.ones((x1.shape[0], rects.shape[0]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start, delta, low, high in ((x1, dx, left, right), (y1, dy, top, bottom)):
+            inv = 1.0 / delta
+            t_low = (low - start) * inv
+            t_high = (high - start) * inv
+            if not delta.all():
+                # Отрезок параллелен оси и начинается ровно на стороне: 0 * inf дает nan
+                t_low = np.nan_to_num(t_low, nan=-np.inf, posinf=np.inf, neginf=-np.inf)
+                t_high = np.nan_to_num(t_high, nan=np.inf, posinf=np.inf, neginf=-np.inf)
+            t0 = np.maximum(t0, np.minimum(t_low, t_high))
+            t1 = np.minimum(t1, np.maximum(t_low, t_high))
+    return t0, t1
+
+
+def segments_hit_rects(x1, y1, x2, y2, rects):
+    """Булева матрица (N, M): пересекает ли i-й отрезок j-й прямоугольник (x, y, w, h)"""
+    t0, t1 = _clip(x1, y1, x2, y2, rects)
+    return t0 <= t1
+
+
+def first_hits(x1, y1, x2, y2, rects):
+    """Для каждого отрезка индекс ближайшего к его началу прямоугольника или -1"""
+    t0, t1 = _clip(x1, y1, x2, y2, rects)
+    if t0.shape[1] == 0:
+        return np.full(t0.shape[0], -1)
+    t0 = np.where(t0 <= t1, t0, np.inf)
+    first = np.argmin(t0, axis=1)
+    return np.where(np.isfinite(t0[np.arange(len(first)), first]), first, -1)
+
+
+class WallRects:
+    """Прямоугольники целых стен одним массивом; пересобирается, когда стены меняются"""
+
+    # С меньшим числом отрезков обход WallGrid по одному быстрее вызова NumPy
+    MIN_BATCH = 8
+
+    def __init__(self, registry):
+        if np is None:
+            raise RuntimeError("Для пакетных проверок стен нужен NumPy: pip install numpy")
+        self.registry = registry
+        self.walls = []
+        self.rects = None
+        registry.subscribe(self.on_building_event)
+
+    def on_building_event(self, event, building):
+        if building.type == BuildingType.WALL:
+            self.rects = None
+
+    def _refresh(self):
+        if self.rects is None:
+            self.walls = list(self.registry.walls)
+            self.rects = np.array([tuple(wall.rect) for wall in self.walls], dtype=np.float64).reshape(-1, 4)
+
+    def blocked(self, xs, ys, target):
+        """Для каждой точки: есть ли целая стена на отрезке от нее до target"""
+        self._refresh()
+        n = len(xs)
+        hits = segments_hit_rects(xs, ys, np.full(n, target[0]), np.full(n, target[1]), self.rects)
+        return hits.any(axis=1)
+
+    def first_walls(self, xs, ys, target):
+        """Для каждой точки: первая целая стена на пути к target или None"""
+        self._refresh()
+        n = len(xs)
+        first = first_hits(xs, ys, np.full(n, target[0]), np.full(n, target[1]), self.rects)
+        return [self.walls[index] if index >= 0 else None for index in first]
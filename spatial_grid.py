@@ -0,0 +1,129 @@
+import math
+from constants import GRID_SIZE
+
+
+class SpatialGrid:
+    """Равномерная хеш-сетка: ищет соседей только в ближайших ячейках, без перебора всех юнитов"""
+
+    def __init__(self, cell_size=GRID_SIZE, tie_key=None):
+        self.cell_size = cell_size
+        # При равном расстоянии nearest() выбирает объект с меньшим tie_key(obj); без него - первый найденный
+        self.tie_key = tie_key
+        # (cx, cy) -> {объект: None}; dict вместо set, чтобы порядок обхода был детерминированным
+        self.cells = {}
+        self.positions = {}  # объект -> (cx, cy)
+        self.min_cx = self.max_cx = self.min_cy = self.max_cy = 0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, obj):
+        return obj in self.positions
+
+    def cell_of(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def clear(self):
+        self.cells.clear()
+        self.positions.clear()
+        self.min_cx = self.max_cx = self.min_cy = self.max_cy = 0
+
+    def insert(self, obj):
+        cell = self.cell_of(obj.x, obj.y)
+        self._add_to_cell(obj, cell)
+
+    def remove(self, obj):
+        cell = self.positions.pop(obj, None)
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[obj]
+        if not bucket:
+            del self.cells[cell]
+
+    def move(self, obj):
+        """Переносит объект в новую ячейку, если он из своей вышел"""
+        old_cell = self.positions.get(obj)
+        if old_cell is None:
+            return
+        cell = self.cell_of(obj.x, obj.y)
+        if cell != old_cell:
+            self.remove(obj)
+            self._add_to_cell(obj, cell)
+
+    def _add_to_cell(self, obj, cell):
+        if not self.positions:
+            self.min_cx = self.max_cx = cell[0]
+            self.min_cy = self.max_cy = cell[1]
+        else:
+            # Границы только расширяются - по ним поиск по кольцам понимает, где остановиться
+            self.min_cx = min(self.min_cx, cell[0])
+            self.max_cx = max(self.max_cx, cell[0])
+            self.min_cy = min(self.min_cy, cell[1])
+            self.max_cy = max(self.max_cy, cell[1])
+        self.positions[obj] = cell
+        self.cells.setdefault(cell, {})[obj] = None
+
+    def nearest(self, x, y, max_dist=None):
+        """Возвращает (ближайший объект, расстояние) или (None, inf)"""
+        closest = None
+        min_dist = float('inf')
+        if not self.positions:
+            return closest, min_dist
+
+        cx, cy = self.cell_of(x, y)
+        max_ring = max(cx - self.min_cx, self.max_cx - cx, cy - self.min_cy, self.max_cy - cy)
+
+        # Сравниваем квадраты расстояний, а корень берем один раз в конце: так же считает UnitStore.find_nearest,
+        # и оба пути выбирают одного и того же ближайшего
+        tie_key = self.tie_key
+        for ring in range(max_ring + 1):
+            # Все точки в кольце ring лежат не ближе (ring - 1) * cell_size; на равном расстоянии там может
+            # оказаться объект с меньшим tie_key, поэтому останавливаемся только на строго меньшем
+            ring_dist = (ring - 1) * self.cell_size
+            if ring_dist >= 0 and (min_dist < ring_dist * ring_dist or
+                                   (max_dist is not None and ring_dist > max_dist)):
+                break
+            for cell in self._ring_cells(cx, cy, ring):
+                bucket = self.cells.get(cell)
+                if not bucket:
+                    continue
+                for obj in bucket:
+                    dx = x - obj.x
+                    dy = y - obj.y
+                    dist = dx * dx + dy * dy
+                    if dist < min_dist or (dist == min_dist and tie_key is not None and
+                                           tie_key(obj) < tie_key(closest)):
+                        min_dist = dist
+                        closest = obj
+
+        min_dist = math.sqrt(min_dist)
+        if max_dist is not None and min_dist > max_dist:
+            return None, float('inf')
+        return closest, min_dist
+
+    def within(self, x, y, radius):
+        """Возвращает объекты на расстоянии не больше radius от точки"""
+        result = []
+        min_cx, min_cy = self.cell_of(x - radius, y - radius)
+        max_cx, max_cy = self.cell_of(x + radius, y + radius)
+        for cx in range(max(min_cx, self.min_cx), min(max_cx, self.max_cx) + 1):
+            for cy in range(max(min_cy, self.min_cy), min(max_cy, self.max_cy) + 1):
+                bucket = self.cells.get((cx, cy))
+                if not bucket:
+                    continue
+                for obj in bucket:
+                    if (x - obj.x) ** 2 + (y - obj.y) ** 2 <= radius ** 2:
+                        result.append(obj)
+        return result
+
+    def _ring_cells(self, cx, cy, ring):
+        if ring == 0:
+            yield cx, cy
+            return
+        for x in range(cx - ring, cx + ring + 1):
+            yield x, cy - ring
+            yield x, cy + ring
+        for y in range(cy - ring + 1, cy + ring):
+            yield cx - ring, y
+            yield cx + ring, y
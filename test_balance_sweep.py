@@ -0,0 +1,16 @@
+from balance_sweep import run_sweep, point_key
+from constants import Difficulty
+
+
+def test_start_gold_moves_win_rate():
+    """Без золота защитников нет и бой проигран; золота на отряд хватает, чтобы выиграть"""
+    points = [{'start_gold': 0}, {'start_gold': 600}]
+    stats = run_sweep(points, [Difficulty.EASY], range(1), {'default': None}, workers=1)
+    rates = [stats[(point_key(point), Difficulty.EASY.name)]['win_rate'] for point in points]
+    assert rates[0] == 0
+    assert rates[1] > 0
+
+
+if __name__ == "__main__":
+    test_start_gold_moves_win_rate()
+    print("ok")
@@ -0,0 +1,69 @@
+import pytest
+
+from beta import Game
+from constants import UnitType
+from unit_store import np
+
+MODES = [False, pytest.param(True, marks=pytest.mark.skipif(np is None, reason="нужен NumPy"))]
+
+
+def make_game(unit_store):
+    game = Game(headless=True, unit_store=unit_store, seed=1)
+    removed = []
+    remove = game.units.remove
+
+    def counting_remove(unit):
+        # Считаем только настоящие удаления: повторные UnitCollection пропускает
+        if remove(unit):
+            removed.append(unit)
+            return True
+        return False
+
+    game.units.remove = counting_remove
+    return game, removed
+
+
+def assert_removed_once(game, removed, victims):
+    assert len(removed) == len(victims) and set(removed) == set(victims)
+    for unit in victims:
+        assert unit not in game.units
+        if game.unit_store is not None:
+            assert unit._store is None
+        else:
+            assert sum(pooled is unit for free in game.unit_pool.free.values() for pooled in free) == 1
+    if game.unit_store is not None:
+        assert game.unit_store.count == len(game.units)
+        assert game.unit_store.units == sorted(game.units, key=lambda unit: unit._index)
+
+
+@pytest.mark.parametrize('unit_store', MODES)
+def test_unit_hit_twice_is_removed_once(unit_store):
+    """Две смертельные атаки за шаг: юнит погибает и удаляется один раз, соседи не задеты"""
+    game, removed = make_game(unit_store)
+    victim = game.spawn_unit(100, 100, UnitType.WARRIOR, True)
+    bystander = game.spawn_unit(150, 100, UnitType.WARRIOR, True)
+    game.commands.damage_unit(victim, victim.health)
+    game.commands.damage_unit(victim, victim.health)
+    game.commands.damage_unit(bystander, 1)
+    game.commands.apply(game)
+
+    assert_removed_once(game, removed, [victim])
+    assert bystander.health == bystander.max_health - 1
+    assert len(game.commands) == 0
+
+
+@pytest.mark.parametrize('unit_store', MODES)
+def test_killed_and_despawned_unit_is_removed_once(unit_store):
+    """Юнит и убит, и снят с поля в одном шаге; другой только убит - оба удалены ровно по разу"""
+    game, removed = make_game(unit_store)
+    units = [game.spawn_unit(100 + 40 * index, 200, UnitType.WARRIOR, False) for index in range(4)]
+    despawned_and_killed, killed = units[1], units[2]
+    game.commands.despawn(despawned_and_killed)
+    game.commands.damage_unit(despawned_and_killed, despawned_and_killed.health + 5)
+    game.commands.damage_unit(killed, killed.health / 2)
+    game.commands.damage_unit(killed, killed.health / 2)
+    game.commands.despawn(despawned_and_killed)
+    game.commands.apply(game)
+
+    assert_removed_once(game, removed, [despawned_and_killed, killed])
+    assert set(game.units.enemies) == {units[0], units[3]}
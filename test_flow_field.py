@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from building import Building
+from constants import BuildingType, GRID_SIZE, SCREEN_WIDTH, SCREEN_HEIGHT
+from flow_field import FlowField
+from wall_grid import WallGrid
+
+TOWN_HALL = (448, 320)
+
+
+def full_recompute(grid, town_hall):
+    field = FlowField(grid)
+    field.set_goal(town_hall)
+    return field
+
+
+def assert_matches_recompute(field, grid, town_hall):
+    """Расстояния совпадают с полным пересчетом, а next ведет по кратчайшему пути"""
+    expected = full_recompute(grid, town_hall)
+    assert field.costs == expected.costs
+    assert field.dist == expected.dist
+    for index, step in enumerate(field.next):
+        if step >= 0:
+            assert field.dist[index] == field.dist[step] + field.costs[step], index
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_updates_match_full_recompute(seed):
+    """Постройка, поломка и урон стен по одной дают то же поле, что пересчет с нуля"""
+    rng = random.Random(seed)
+    grid = WallGrid()
+    town_hall = Building(*TOWN_HALL, BuildingType.TOWN_HALL)
+    field = full_recompute(grid, town_hall)
+    hall_cells = set(grid.cells_of(town_hall))
+    free = [(x, y) for x in range(SCREEN_WIDTH // GRID_SIZE) for y in range(SCREEN_HEIGHT // GRID_SIZE)
+            if y * grid.cols + x not in hall_cells]
+    walls = []
+    for _ in range(150):
+        action = rng.random()
+        if action < 0.5 or not walls:
+            x, y = free.pop(rng.randrange(len(free)))
+            wall = Building(x * GRID_SIZE, y * GRID_SIZE, BuildingType.WALL)
+            walls.append(wall)
+            grid.set_wall(wall)
+            field.wall_added(wall)
+        elif action < 0.8:
+            wall = rng.choice(walls)
+            wall.health -= rng.choice((1, 10, 25, 60))
+            if wall.health > 0:
+                field.wall_damaged(wall)
+            else:
+                walls.remove(wall)
+                grid.clear_wall(wall)
+                field.wall_removed(wall)
+        else:
+            wall = walls.pop(rng.randrange(len(walls)))
+            grid.clear_wall(wall)
+            field.wall_removed(wall)
+        assert_matches_recompute(field, grid, town_hall)
+
+
+def test_damage_below_a_cell_keeps_cost():
+    """Цена стены меняется только шагами по WALL_HP_PER_CELL"""
+    grid = WallGrid()
+    town_hall = Building(*TOWN_HALL, BuildingType.TOWN_HALL)
+    wall = Building(TOWN_HALL[0] - 2 * GRID_SIZE, TOWN_HALL[1], BuildingType.WALL)
+    grid.set_wall(wall)
+    field = full_recompute(grid, town_hall)
+    index, = grid.cells_of(wall)
+    cost = field.costs[index]
+
+    wall.health -= FlowField.WALL_HP_PER_CELL - 1
+    field.wall_damaged(wall)
+    assert field.costs[index] == cost
+
+    wall.health -= 1
+    field.wall_damaged(wall)
+    assert field.costs[index] == cost - 1
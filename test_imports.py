@@ -0,0 +1,11 @@
+import pytest
+
+from bench_import import BUDGET_MS, MODULES, measure
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import_has_no_side_effects(module):
+    """Импорт модуля в чистом процессе не поднимает окно, звук и текстуры и укладывается в бюджет"""
+    result = measure(module)
+    assert result['side_effects'] == []
+    assert result['module_ms'] <= BUDGET_MS
@@ -0,0 +1,76 @@
+from beta import Game
+from constants import BuildingType, Command, Difficulty, GRID_SIZE
+from replay import ReplayReader, play
+
+SEED = 11
+# (шаг, команда, аргументы): сложность, стены и казармы с пополнением, справка посреди боя
+SCRIPT = [
+    (1, Command.DIFFICULTY, (Difficulty.MEDIUM.value,)),
+    (5, Command.SELECT_TYPE, (BuildingType.WALL.value,)),
+    (6, Command.CLICK, (6 * GRID_SIZE + 10, 4 * GRID_SIZE + 10)),
+    (7, Command.CLICK, (7 * GRID_SIZE + 10, 4 * GRID_SIZE + 10)),
+    (9, Command.SELECT_TYPE, (BuildingType.BARRACKS.value,)),
+    (12, Command.CLICK, (4 * GRID_SIZE, 4 * GRID_SIZE)),
+    (13, Command.CANCEL, ()),
+    (20, Command.CLICK, (4 * GRID_SIZE + 5, 4 * GRID_SIZE + 5)),
+    (21, Command.REFILL, ()),
+    (400, Command.OPEN_HELP, ()),
+    (700, Command.CLOSE_HELP, ()),
+]
+TICKS = 1500
+
+
+def snapshot(game):
+    """Все, чем может отличаться повтор боя"""
+    units = sorted((unit.handle.slot, unit.is_defender, unit.x, unit.y, unit.health) for unit in game.units)
+    buildings = [(building.type, building.x, building.y, building.health) for building in game.buildings]
+    return game.tick, game.state, game.gold, game.wave, units, buildings
+
+
+def record(path, ticks=TICKS):
+    game = Game(headless=True, seed=SEED)
+    game.start_recording(str(path))
+    script = iter(SCRIPT)
+    command = next(script, None)
+    while True:
+        while command is not None and command[0] == game.tick:
+            game.apply_command(command[1], *command[2])
+            command = next(script, None)
+        if game.tick >= ticks:
+            break
+        game.update()
+    game.stop_recording()
+    return game
+
+
+def test_replay_round_trip(tmp_path):
+    """Проигрыватель без окна повторяет записанный бой до последнего шага"""
+    path = tmp_path / 'battle.cbr'
+    game = record(path)
+    assert len(game.units) and any(building.type == BuildingType.BARRACKS for building in game.buildings)
+
+    reader = ReplayReader(str(path))
+    assert [(tick, command) for tick, command, _ in reader] == [(tick, command) for tick, command, _ in SCRIPT]
+    assert reader.end_tick == TICKS and not reader.truncated
+
+    assert snapshot(play(str(path))) == snapshot(game)
+
+
+def test_truncated_replay_stops_at_last_complete_record(tmp_path, capsys):
+    """Без END и с оборванной последней командой запись проигрывается до последней целой команды"""
+    path = tmp_path / 'battle.cbr'
+    record(path)
+    data = path.read_bytes()
+    # Отрезаем END (3 байта) и последнюю команду CLOSE_HELP, оставив от нее только приращение шага
+    path.write_bytes(data[:-4])
+
+    reader = ReplayReader(str(path))
+    records = list(reader)
+    assert [tick for tick, _, _ in records] == [tick for tick, _, _ in SCRIPT[:-1]]
+    assert reader.truncated
+    assert reader.end_tick == SCRIPT[-2][0]
+    assert "запись оборвана" in capsys.readouterr().out
+
+    game = play(str(path))
+    assert game.tick == SCRIPT[-2][0]
+    assert snapshot(game) == snapshot(record(tmp_path / 'short.cbr', SCRIPT[-2][0]))
@@ -0,0 +1,127 @@
+import importlib
+
+import pytest
+
+from constants import BuildingType, Difficulty, FIXED_DT, GameState, UnitType
+from replay import Command
+from scheduler import Scheduler
+
+
+def test_events_fire_by_due_time_then_schedule_order():
+    """Раньше срок - раньше срабатывает; при равном сроке - в порядке постановки"""
+    scheduler = Scheduler()
+    fired = []
+    for name, delay in (('c', 30), ('a', 10), ('b', 10), ('d', 10 + FIXED_DT)):
+        scheduler.schedule(delay, fired.append, name)
+    scheduler.advance(5)
+    assert fired == []
+    # Сумма мелких шагов из-за округления может не дотянуть до 10 - событие все равно наступает
+    while scheduler.now < 10 - 1e-9:
+        scheduler.advance(FIXED_DT / 4)
+    assert fired == ['a', 'b']
+    scheduler.advance(25)
+    assert fired == ['a', 'b', 'd', 'c']
+    assert len(scheduler) == 0
+
+
+def test_event_scheduled_from_callback():
+    """Событие без задержки, поставленное из callback, срабатывает в том же advance()"""
+    scheduler = Scheduler()
+    fired = []
+    scheduler.schedule(10, lambda: scheduler.schedule(0, fired.append, 'chained'))
+    scheduler.advance(10)
+    assert fired == ['chained']
+
+
+def test_cancel_is_lazy_and_counted():
+    """Отмена не трогает кучу, но сразу уменьшает len(); отмененное событие не вызывается"""
+    scheduler = Scheduler()
+    fired = []
+    keep = scheduler.schedule(10, fired.append, 'keep')
+    drop = scheduler.schedule(5, fired.append, 'drop')
+    assert len(scheduler) == 2
+    scheduler.cancel(drop)
+    scheduler.cancel(drop)
+    # Отмененное событие лежит в куче до своего срока, но в len() уже не входит
+    assert len(scheduler.queue) == 2
+    assert len(scheduler) == 1
+    scheduler.advance(20)
+    assert fired == ['keep']
+    assert scheduler.queue == []
+    # Отмена уже сработавшего события ничего не ломает
+    scheduler.cancel(keep)
+    assert len(scheduler) == 0
+
+    scheduler.schedule(5, fired.append, 'late')
+    scheduler.clear()
+    assert len(scheduler) == 0 and scheduler.now == 0
+
+
+def start_battle(module_name):
+    """Бой с одной казармой с большим запасом золота и пятью врагами"""
+    module = importlib.import_module(module_name)
+    building_module = module if hasattr(module, 'Building') else importlib.import_module('building')
+    game = module.Game(headless=True, seed=7)
+    game.select_difficulty(Difficulty.HARD)
+    barracks = building_module.Building(200, 400, BuildingType.BARRACKS, game.difficulty)
+    game.buildings.add(barracks)
+    barracks.gold_reserve = 10000
+    game.state = GameState.BATTLE
+    # Фаза строительства уже прошла, CLOSE_HELP вернет в бой
+    game.build_timer = game.build_time
+    # Новые волны сами будят казармы - здесь отсчет должны двигать только справка и враги
+    game.wave_interval = float('inf')
+    for _ in range(5):
+        game.spawn_enemy(UnitType.WARRIOR)
+    game.wake_barracks()
+    return game, barracks
+
+
+def ticks_until_hire(game):
+    ticks = 0
+    while game.units.count(True) == 0:
+        game.update(FIXED_DT)
+        ticks += 1
+        assert ticks < 10000
+    return ticks
+
+
+@pytest.mark.parametrize('module_name', ['beta', 'game'])
+def test_barracks_keep_progress_across_help(module_name):
+    """Справка останавливает отсчет найма, а после закрытия он продолжается с того же места"""
+    game, barracks = start_battle(module_name)
+    interval_ticks = round(barracks.spawn_interval / FIXED_DT)
+    half = interval_ticks // 2
+    for _ in range(half):
+        game.update(FIXED_DT)
+    game.apply_command(Command.OPEN_HELP)
+    assert barracks.event is None
+    for _ in range(interval_ticks):
+        game.update(FIXED_DT)
+    assert game.units.count(True) == 0
+
+    game.apply_command(Command.CLOSE_HELP)
+    assert barracks.event is not None
+    assert ticks_until_hire(game) == interval_ticks - half
+
+
+@pytest.mark.parametrize('module_name', ['beta', 'game'])
+def test_barracks_wait_without_enemies(module_name):
+    """Без врагов казармы ждут, не теряя отсчета, и продолжают, когда враги появились"""
+    game, barracks = start_battle(module_name)
+    interval_ticks = round(barracks.spawn_interval / FIXED_DT)
+    third = interval_ticks // 3
+    for _ in range(third):
+        game.update(FIXED_DT)
+    for unit in game.units.enemies:
+        game.remove_unit(unit)
+    assert barracks.event is None
+    assert len(game.scheduler) == sum(1 for mine in game.buildings if mine.type == BuildingType.GOLD_MINE
+                                      and mine.event is not None)
+    for _ in range(interval_ticks):
+        game.update(FIXED_DT)
+    assert game.units.count(True) == 0
+
+    game.spawn_enemy(UnitType.WARRIOR)
+    game.wake_barracks()
+    assert ticks_until_hire(game) == interval_ticks - third
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from building import Building
+from building_registry import BuildingRegistry
+from constants import BuildingType, GRID_SIZE, SCREEN_WIDTH, SCREEN_HEIGHT
+from segment_kernel import WallRects, np
+from wall_grid import WallGrid
+
+pytestmark = pytest.mark.skipif(np is None, reason="нужен NumPy")
+
+# Центр Town Hall стандартной деревни лежит ровно на границах ячеек
+TARGET = (512, 384)
+
+
+def make_walls(seed, count=150):
+    """Случайные стены на карте игры; ячейки вплотную к TARGET заняты всегда"""
+    rng = random.Random(seed)
+    registry = BuildingRegistry()
+    grid = WallGrid()
+    cols, rows = SCREEN_WIDTH // GRID_SIZE, SCREEN_HEIGHT // GRID_SIZE
+    cx, cy = TARGET[0] // GRID_SIZE, TARGET[1] // GRID_SIZE
+    cells = {(cx - 1, cy - 3), (cx, cy + 2), (cx - 3, cy), (cx + 2, cy - 1)}
+    cells.update(rng.sample([(x, y) for x in range(cols) for y in range(rows)
+                             if abs(x - cx) > 1 or abs(y - cy) > 1], count))
+    for x, y in cells:
+        wall = Building(x * GRID_SIZE, y * GRID_SIZE, BuildingType.WALL)
+        registry.add(wall)
+        grid.set_wall(wall)
+    return registry, grid
+
+
+def boundary_points(rng, count):
+    """Начала отрезков, идущих к TARGET ровно по линии сетки: вертикальные, горизонтальные и под 45 градусов"""
+    points = []
+    for _ in range(count):
+        offset = rng.randint(-12, 12) * GRID_SIZE
+        points.append((TARGET[0], TARGET[1] + offset))
+        points.append((TARGET[0] + offset, TARGET[1]))
+        points.append((TARGET[0] + offset, TARGET[1] + offset))
+        points.append((TARGET[0] + offset, TARGET[1] - offset))
+        # Отрезок вдоль линии сетки, проходящей мимо TARGET
+        line = rng.randint(1, SCREEN_WIDTH // GRID_SIZE - 1) * GRID_SIZE
+        points.append((line, rng.uniform(0, SCREEN_HEIGHT)))
+    return points
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_wall_rects_match_wall_grid(seed):
+    """Пакетный slab-тест и DDA по сетке согласны и на отрезках по границам ячеек"""
+    rng = random.Random(seed)
+    registry, grid = make_walls(seed)
+    rects = WallRects(registry)
+    points = boundary_points(rng, 40)
+    points += [(rng.uniform(0, SCREEN_WIDTH), rng.uniform(0, SCREEN_HEIGHT)) for _ in range(200)]
+    xs, ys = [x for x, _ in points], [y for _, y in points]
+
+    blocked = rects.blocked(xs, ys, TARGET)
+    first = rects.first_walls(xs, ys, TARGET)
+    for point, batch_blocked, batch_first in zip(points, blocked, first):
+        assert batch_blocked == grid.is_blocked(point, TARGET), point
+        assert batch_first is grid.first_wall(point, TARGET), point
+
+
+def test_segment_along_wall_side():
+    """Отрезок по левой (верхней) стороне стены задевает ее, по правой (нижней) - нет, как в WallGrid"""
+    registry = BuildingRegistry()
+    grid = WallGrid()
+    wall = Building(TARGET[0], TARGET[1] + 2 * GRID_SIZE, BuildingType.WALL)
+    registry.add(wall)
+    grid.set_wall(wall)
+    rects = WallRects(registry)
+    left, right = wall.rect.left, wall.rect.right
+    xs, ys = [left, right], [wall.rect.bottom + GRID_SIZE] * 2
+    targets = [(left, TARGET[1]), (right, TARGET[1])]
+    for x, y, target, expected in zip(xs, ys, targets, (True, False)):
+        assert bool(rects.blocked([x], [y], target)[0]) is expected
+        assert grid.is_blocked((x, y), target) is expected
@@ -0,0 +1,109 @@
+import math
+import random
+
+import pytest
+
+from spatial_grid import SpatialGrid
+
+CELL = 64
+
+
+class Point:
+    def __init__(self, x, y, key):
+        self.x = x
+        self.y = y
+        self.key = key
+
+
+def brute_nearest(points, x, y, max_dist=None):
+    """Перебор всех точек с той же арифметикой и тем же правилом ничьих, что у SpatialGrid"""
+    best = min(points, key=lambda point: ((x - point.x) * (x - point.x) + (y - point.y) * (y - point.y), point.key),
+               default=None)
+    if best is None:
+        return None, float('inf')
+    dist = math.sqrt((x - best.x) * (x - best.x) + (y - best.y) * (y - best.y))
+    if max_dist is not None and dist > max_dist:
+        return None, float('inf')
+    return best, dist
+
+
+def make_grid(points):
+    grid = SpatialGrid(CELL, tie_key=lambda point: point.key)
+    for point in points:
+        grid.insert(point)
+    return grid
+
+
+def boundary_values(rng, count):
+    """Координаты ровно на линиях сетки и рядом с ними"""
+    values = []
+    for _ in range(count):
+        line = rng.randint(-3, 16) * CELL
+        values.append(rng.choice((line, line - 1e-9, line + 1e-9, line + CELL / 2)))
+    return values
+
+
+def queries(rng):
+    result = [(rng.uniform(-300, 1300), rng.uniform(-300, 1000)) for _ in range(200)]
+    xs, ys = boundary_values(rng, 100), boundary_values(rng, 100)
+    result += list(zip(xs, ys))
+    # Далеко за пределами занятых ячеек - поиск должен пройти кольцами до самых краев
+    result += [(-5000, -5000), (5000, 40), (300, 9000)]
+    return result
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_nearest_matches_brute_force(seed):
+    """Случайные точки и точки на границах ячеек; запросы внутри, на границах и далеко за пределами сетки"""
+    rng = random.Random(seed)
+    points = [Point(rng.uniform(0, 1024), rng.uniform(0, 768), key) for key in range(60)]
+    # Точки на границах ячеек
+    points += [Point(x, y, 60 + key) for key, (x, y) in enumerate(zip(boundary_values(rng, 40),
+                                                                          boundary_values(rng, 40)))]
+    grid = make_grid(points)
+    for x, y in queries(rng):
+        for max_dist in (None, 50, CELL, 300):
+            assert grid.nearest(x, y, max_dist) == brute_nearest(points, x, y, max_dist), (x, y, max_dist)
+
+
+def test_ties_go_to_smaller_key():
+    """Равноудаленные точки в разных ячейках и кольцах: выигрывает меньший ключ, где бы он ни лежал"""
+    center = (5 * CELL, 5 * CELL)
+    # Пифагоровы тройки: все расстояния ровно 80 без ошибок округления
+    offsets = [(80, 0), (-80, 0), (0, 80), (0, -80), (48, 64), (-64, -48), (48, -64)]
+    for order in range(len(offsets)):
+        points = [Point(center[0] + dx, center[1] + dy, (index - order) % len(offsets))
+                  for index, (dx, dy) in enumerate(offsets)]
+        grid = make_grid(points)
+        closest, dist = grid.nearest(*center)
+        assert closest.key == 0
+        assert dist == 80
+
+
+def test_after_moves_and_removals():
+    """Перенесенные и удаленные объекты сетка находит (и не находит) так же, как перебор"""
+    rng = random.Random(42)
+    points = [Point(rng.uniform(0, 1024), rng.uniform(0, 768), key) for key in range(80)]
+    grid = make_grid(points)
+    for point in points[::3]:
+        point.x, point.y = rng.uniform(-200, 1200), rng.uniform(-200, 900)
+        grid.move(point)
+    for point in points[1::4]:
+        grid.remove(point)
+    alive = [point for point in points if point in grid]
+    for x, y in queries(rng):
+        assert grid.nearest(x, y) == brute_nearest(alive, x, y)
+
+
+def test_empty_grid():
+    """Пустая сетка, в том числе опустевшая после удаления, ничего не находит"""
+    grid = SpatialGrid(CELL)
+    assert grid.nearest(10, 10) == (None, float('inf'))
+    assert grid.nearest(10, 10, max_dist=100) == (None, float('inf'))
+
+    point = Point(100, 100, 0)
+    grid.insert(point)
+    assert grid.nearest(100, 100) == (point, 0.0)
+    grid.remove(point)
+    assert len(grid) == 0
+    assert grid.nearest(100, 100) == (None, float('inf'))
@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+from constants import UnitType
+from unit import Unit
+from unit_collection import UnitCollection
+
+
+def make_units(collection, count, is_defender, unit_type=UnitType.WARRIOR):
+    units = [Unit(index, 0, unit_type, is_defender) for index in range(count)]
+    for unit in units:
+        collection.add(unit)
+    return units
+
+
+def assert_consistent(collection):
+    """Плотные списки без дыр, позиции слотов указывают на своих юнитов, счетчики сходятся"""
+    for is_defender, faction in enumerate(collection.factions):
+        assert None not in faction
+        assert collection.count(is_defender) == len(faction)
+        counts = {}
+        for index, unit in enumerate(faction):
+            assert collection.positions[unit.handle.slot] == index
+            assert collection.get(unit.handle) is unit
+            counts[unit.type] = counts.get(unit.type, 0) + 1
+        for unit_type in UnitType:
+            assert collection.type_count(bool(is_defender), unit_type) == counts.get(unit_type, 0)
+
+
+def test_stale_handle_after_swap_remove():
+    """Удаление переносит последнего юнита на место удаленного; старая ссылка не разрешается и после
+    повторной выдачи слота"""
+    collection = UnitCollection()
+    first, middle, last = make_units(collection, 3, False)
+    stale = middle.handle
+    assert collection.remove(middle)
+    assert collection.get(stale) is None
+    assert middle not in collection
+    assert not collection.remove(middle)
+    # Последний встал на место удаленного, и его ссылка по-прежнему ведет к нему
+    assert collection.enemies == [first, last]
+    assert collection.get(last.handle) is last
+
+    newcomer = Unit(0, 0, UnitType.WARRIOR)
+    handle = collection.add(newcomer)
+    assert handle.slot == stale.slot
+    assert handle.generation == stale.generation + 1
+    assert collection.get(stale) is None
+    assert collection.get(handle) is newcomer
+    assert_consistent(collection)
+
+
+def test_removal_during_iteration_is_deferred():
+    """Погибшие во время обхода пропускаются, добавленные не попадают в обход, списки сжимаются в конце"""
+    collection = UnitCollection()
+    enemies = make_units(collection, 6, False)
+    defenders = make_units(collection, 4, True)
+    seen = []
+    for unit in collection:
+        seen.append(unit)
+        if unit is enemies[0]:
+            # Удаляем и уже пройденного, и еще не пройденных юнитов обеих сторон
+            for victim in (enemies[0], enemies[3], enemies[5], defenders[2]):
+                assert collection.remove(victim)
+            collection.add(Unit(0, 0, UnitType.WARRIOR, True))
+            # Пока идет обход, в списках только метки, а счетчики уже уменьшены
+            assert None in collection.factions[False]
+            assert collection.count(False) == 3
+    assert seen == [enemies[0], enemies[1], enemies[2], enemies[4], defenders[0], defenders[1], defenders[3]]
+    assert sorted(collection.enemies, key=enemies.index) == [enemies[1], enemies[2], enemies[4]]
+    assert collection.count(True) == 4
+    assert_consistent(collection)
+
+
+def test_nested_iteration_compacts_once():
+    """Сжатие ждет конца внешнего обхода"""
+    collection = UnitCollection()
+    enemies = make_units(collection, 3, False)
+    for unit in collection:
+        for _ in collection:
+            pass
+        if unit is enemies[0]:
+            collection.remove(enemies[1])
+            for _ in collection:
+                pass
+            assert None in collection.factions[False]
+    assert collection.enemies == [enemies[0], enemies[2]]
+    assert_consistent(collection)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_counters_follow_random_changes(seed):
+    """Счетчики по сторонам и типам совпадают с пересчетом после любых добавлений и удалений"""
+    rng = random.Random(seed)
+    collection = UnitCollection()
+    alive = []
+    for _ in range(300):
+        if alive and rng.random() < 0.4:
+            collection.remove(alive.pop(rng.randrange(len(alive))))
+        elif alive and rng.random() < 0.1:
+            # Удаление прямо во время обхода
+            victims = rng.sample(alive, min(len(alive), 3))
+            for unit in collection:
+                if unit in victims:
+                    collection.remove(unit)
+            alive = [unit for unit in alive if unit not in victims]
+        else:
+            unit = Unit(0, 0, rng.choice(list(UnitType)), rng.random() < 0.5)
+            collection.add(unit)
+            alive.append(unit)
+        assert_consistent(collection)
+    assert len(collection) == len(alive)
+
+    is_defender = rng.random() < 0.5
+    removed = collection.remove_faction(is_defender)
+    assert all(unit.handle is None for unit in removed)
+    assert collection.count(is_defender) == 0
+    assert all(collection.type_count(is_defender, unit_type) == 0 for unit_type in UnitType)
+    assert_consistent(collection)
@@ -0,0 +1,36 @@
+import pytest
+
+from constants import Difficulty
+from headless import simulate_battle
+from unit_store import np
+
+pytestmark = pytest.mark.skipif(np is None, reason="нужен NumPy")
+
+
+def trace_battle(difficulty, seed, unit_store):
+    """Состояние боя после каждого шага: Town Hall и все юниты по слотам"""
+    states = []
+
+    def on_tick(game, ticks):
+        town_hall = game.buildings.town_hall
+        units = sorted((unit.handle.slot, unit.is_defender, unit.x, unit.y, unit.health, unit.last_attack)
+                       for unit in game.units)
+        states.append((game.state, town_hall.health if town_hall else 0, units))
+
+    game, ticks = simulate_battle(difficulty, unit_store=unit_store, seed=seed, on_tick=on_tick)
+    return game.state, ticks, states
+
+
+@pytest.mark.parametrize('difficulty, seed', [(Difficulty.HARD, 1), (Difficulty.MEDIUM, 5)])
+def test_unit_store_replays_object_battle(difficulty, seed):
+    """С UnitStore бой идет шаг в шаг так же, как с обычными юнитами"""
+    expected = trace_battle(difficulty, seed, False)
+    actual = trace_battle(difficulty, seed, True)
+    assert actual[:2] == expected[:2]
+    for tick, (expected_state, actual_state) in enumerate(zip(expected[2], actual[2])):
+        assert actual_state == expected_state, tick
+
+
+if __name__ == "__main__":
+    test_unit_store_replays_object_battle(Difficulty.HARD, 1)
+    print("ok")
@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class FontManager:
+    """Загружает каждый шрифт (имя, размер) один раз"""
+
+    def __init__(self):
+        self.fonts = {}
+
+    def get(self, size, name=None):
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = pygame.font.SysFont(name, size)
+        return font
+
+
+class LabelCache:
+    """LRU-кэш отрисованных надписей: текст перерисовывается, только когда меняется сама строка"""
+
+    def __init__(self, fonts, capacity=256):
+        self.fonts = fonts
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+
+    def render(self, text, size, color, name=None):
+        key = (text, size, color, name)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = self.fonts.get(size, name).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+# Общие для всей игры; шрифты грузятся при первом обращении, после engine.init()
+fonts = FontManager()
+labels = LabelCache(fonts)
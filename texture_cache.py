@@ -0,0 +1,162 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import pygame
+
+# Запеченные текстуры: уже декодированные и отмасштабированные пиксели, которые при старте
+# отдаются pygame прямо из отображенного в память файла, без декодирования PNG/JPG
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.texture_cache')
+# TEXTURE_CACHE=0 отключает кэш (для сравнения времени старта)
+ENABLED = os.environ.get('TEXTURE_CACHE', '1') != '0'
+# Исходник -> [mtime_ns, размер, хэш] на момент запекания: неизмененный файл при старте не читается
+INDEX_PATH = os.path.join(CACHE_DIR, 'index.json')
+_index = None
+
+
+def source_hash(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()[:16]
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def read_index():
+    global _index
+    if _index is None:
+        try:
+            with open(INDEX_PATH) as file:
+                _index = json.load(file)
+        except (OSError, ValueError):
+            _index = {}
+    return _index
+
+
+def source_digest(path):
+    """Хэш исходника: из индекса, если mtime и размер файла те же, что при запекании, иначе по содержимому"""
+    entry = read_index().get(os.path.abspath(path))
+    if entry is not None and entry[:2] == source_stamp(path):
+        return entry[2]
+    return source_hash(path)
+
+
+def entry_path(digest, size, pixel_format):
+    """Файл кэша: хэш исходника, целевой размер и формат пикселей"""
+    return os.path.join(CACHE_DIR, f"{digest}_{size[0]}x{size[1]}_{pixel_format}.raw")
+
+
+def decode(path, size):
+    texture = pygame.image.load(path)
+    return pygame.transform.scale(texture, size) if size else texture
+
+
+def pixel_format(surface):
+    return 'RGBA' if surface.get_flags() & pygame.SRCALPHA else 'RGB'
+
+
+def load(path, size):
+    """Текстура из кэша или None, если она еще не запечена"""
+    if not ENABLED or not size:
+        return None
+    try:
+        digest = source_digest(path)
+    except OSError:
+        return None
+    for fmt in ('RGBA', 'RGB'):
+        try:
+            with open(entry_path(digest, size, fmt), 'rb') as file:
+                # Поверхность держит ссылку на буфер, поэтому mmap живет вместе с ней
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            continue
+        if len(buffer) == size[0] * size[1] * len(fmt):
+            return pygame.image.frombuffer(buffer, size, fmt)
+    return None
+
+
+def bake(path, size, digest):
+    """Декодирует и масштабирует текстуру и сохраняет ее пиксели; возвращает путь файла кэша"""
+    texture = decode(path, size)
+    fmt = pixel_format(texture)
+    target = entry_path(digest, texture.get_size(), fmt)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Пишем во временный файл и переименовываем, чтобы игра не прочитала недописанный кэш
+    with open(target + '.tmp', 'wb') as file:
+        file.write(pygame.image.tobytes(texture, fmt))
+    os.replace(target + '.tmp', target)
+    return target
+
+
+def bake_all(textures):
+    """Запекает все текстуры {имя: (файл, размер)}, пишет индекс исходников и удаляет устаревшие файлы кэша"""
+    global _index
+    baked = set()
+    index = {}
+    for path, size in textures.values():
+        if not size:
+            continue
+        digest = source_hash(path)
+        baked.add(os.path.basename(bake(path, size, digest)))
+        index[os.path.abspath(path)] = source_stamp(path) + [digest]
+    with open(INDEX_PATH + '.tmp', 'w') as file:
+        json.dump(index, file, indent=1, sort_keys=True)
+    os.replace(INDEX_PATH + '.tmp', INDEX_PATH)
+    _index = index
+
+    removed = 0
+    for name in os.listdir(CACHE_DIR):
+        if name not in baked and name != os.path.basename(INDEX_PATH):
+            os.remove(os.path.join(CACHE_DIR, name))
+            removed += 1
+    return len(baked), removed
+
+
+# Дочерний процесс: от запуска интерпретатора до первого кадра меню
+FIRST_FRAME = ("from beta import Game; from assets_manager import assets, MENU_TEXTURES; "
+               "game = Game(); assets.wait(MENU_TEXTURES); game.draw(); print('ready', flush=True)")
+
+
+def cold_start(cache, runs):
+    env = dict(os.environ, TEXTURE_CACHE='1' if cache else '0')
+    env.setdefault('SDL_VIDEODRIVER', 'dummy')
+    env.setdefault('SDL_AUDIODRIVER', 'dummy')
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', FIRST_FRAME], env=env, check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main():
+    from assets_manager import TEXTURES
+
+    parser = argparse.ArgumentParser(description="Запекание текстур для быстрого старта")
+    parser.add_argument('--measure', type=int, metavar='N', nargs='?', const=5,
+                        help="после запекания N раз замерить холодный старт до первого кадра меню")
+    args = parser.parse_args()
+
+    baked, removed = bake_all(TEXTURES)
+    print(f"Запечено текстур: {baked}, удалено устаревших файлов: {removed} ({CACHE_DIR})")
+
+    if args.measure:
+        for cache in (False, True):
+            times = cold_start(cache, args.measure)
+            label = "с кэшем" if cache else "без кэша"
+            print(f"Старт до первого кадра {label}: медиана {statistics.median(times):.0f} мс, "
+                  f"мин {min(times):.0f} мс ({args.measure} запусков)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+from collections import namedtuple
+
+# Ссылка на юнита, которую можно хранить сколько угодно: после гибели юнита поколение слота
+# увеличивается, и старая ссылка просто перестает разрешаться (в том числе если объект взят из UnitPool)
+Handle = namedtuple('Handle', 'slot generation')
+
+
+def unit_slot(unit):
+    """Слот юнита - устойчивый порядок для разрешения ничьих (см. SpatialGrid.tie_key)"""
+    return unit.handle.slot
+
+
+class UnitCollection:
+    """Юниты на поле: плотные списки по сторонам, слоты с поколениями и счетчики живых по сторонам и типам"""
+
+    def __init__(self):
+        # [is_defender] -> плотный список юнитов стороны; удаление переносит последний на место удаленного
+        self.factions = ([], [])
+        # слот -> поколение, сторона и индекс юнита в плотном списке этой стороны (-1 - слот свободен)
+        self.generations = []
+        self.sides = []
+        self.positions = []
+        self.free_slots = []
+        # [is_defender] -> {UnitType: число}
+        self.type_counts = ({}, {})
+        # Пока идет обход, погибшие только помечаются (None в плотном списке), а списки сжимаются после
+        self.iterating = 0
+        self.pending = ([], [])  # [is_defender] -> индексы помеченных
+
+    def __len__(self):
+        return self.count(False) + self.count(True)
+
+    def __iter__(self):
+        """Враги, затем защитники. Юниты, погибшие во время обхода, пропускаются; добавленные - не попадают"""
+        self.iterating += 1
+        # Длины запоминаются сразу для обеих сторон: защитник, добавленный во время обхода врагов, тоже не попадет
+        sizes = [len(faction) for faction in self.factions]
+        try:
+            for faction, size in zip(self.factions, sizes):
+                for index in range(size):
+                    unit = faction[index]
+                    if unit is not None:
+                        yield unit
+        finally:
+            self.iterating -= 1
+            if not self.iterating:
+                self._compact()
+
+    def __contains__(self, unit):
+        handle = getattr(unit, 'handle', None)
+        return handle is not None and self.generations[handle.slot] == handle.generation
+
+    @property
+    def enemies(self):
+        return self.faction(False)
+
+    @property
+    def defenders(self):
+        return self.faction(True)
+
+    def faction(self, is_defender):
+        return [unit for unit in self.factions[is_defender] if unit is not None]
+
+    def count(self, is_defender):
+        return len(self.factions[is_defender]) - len(self.pending[is_defender])
+
+    def type_count(self, is_defender, unit_type):
+        return self.type_counts[is_defender].get(unit_type, 0)
+
+    def get(self, handle):
+        """Юнит по ссылке или None, если он уже погиб"""
+        if handle is None or self.generations[handle.slot] != handle.generation:
+            return None
+        return self.factions[self.sides[handle.slot]][self.positions[handle.slot]]
+
+    def add(self, unit):
+        faction = self.factions[unit.is_defender]
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = len(self.generations)
+            self.generations.append(0)
+            self.sides.append(False)
+            self.positions.append(-1)
+        self.sides[slot] = unit.is_defender
+        self.positions[slot] = len(faction)
+        unit.handle = Handle(slot, self.generations[slot])
+        faction.append(unit)
+        counts = self.type_counts[unit.is_defender]
+        counts[unit.type] = counts.get(unit.type, 0) + 1
+        return unit.handle
+
+    def remove(self, unit):
+        """False, если юнита уже нет (например, его убили раньше в этом же шаге)"""
+        if unit not in self:
+            return False
+        slot = unit.handle.slot
+        index = self.positions[slot]
+        # Новое поколение: все сохраненные ссылки на этого юнита сразу становятся недействительными
+        self.generations[slot] += 1
+        self.positions[slot] = -1
+        self.free_slots.append(slot)
+        unit.handle = None
+        self.type_counts[unit.is_defender][unit.type] -= 1
+        if self.iterating:
+            self.factions[unit.is_defender][index] = None
+            self.pending[unit.is_defender].append(index)
+        else:
+            self._swap_remove(self.factions[unit.is_defender], index)
+        return True
+
+    def _swap_remove(self, faction, index):
+        last = faction.pop()
+        if index < len(faction):
+            faction[index] = last
+            self.positions[last.handle.slot] = index
+
+    def _compact(self):
+        for faction, pending in zip(self.factions, self.pending):
+            # С конца: перенесенный на место удаленного последний юнит всегда живой
+            for index in sorted(pending, reverse=True):
+                self._swap_remove(faction, index)
+            pending.clear()
+
+    def remove_faction(self, is_defender):
+        """Убирает всю сторону и возвращает ее юнитов"""
+        removed = self.faction(is_defender)
+        for unit in removed:
+            slot = unit.handle.slot
+            self.generations[slot] += 1
+            self.positions[slot] = -1
+            self.free_slots.append(slot)
+            unit.handle = None
+        self.factions[is_defender].clear()
+        self.pending[is_defender].clear()
+        self.type_counts[is_defender].clear()
+        return removed
+
+    def clear(self):
+        # Поколения не сбрасываются: ссылки на юнитов прошлого боя так и остаются недействительными
+        self.remove_faction(False)
+        self.remove_faction(True)
@@ -0,0 +1,24 @@
+class UnitPool:
+    """Свободные списки погибших юнитов по типам: новые юниты берутся из них, а не создаются заново"""
+
+    def __init__(self, unit_class):
+        self.unit_class = unit_class
+        self.free = {}  # UnitType -> [юниты]
+
+    def __len__(self):
+        return sum(len(units) for units in self.free.values())
+
+    def acquire(self, x, y, unit_type, is_defender, difficulty):
+        free = self.free.get(unit_type)
+        if free:
+            unit = free.pop()
+            unit.reset(x, y, unit_type, is_defender, difficulty)
+            return unit
+        return self.unit_class(x, y, unit_type, is_defender, difficulty)
+
+    def release(self, unit):
+        """Юнит уже убран из игры; его объект достанется следующему юниту того же типа"""
+        self.free.setdefault(unit.type, []).append(unit)
+
+    def clear(self):
+        self.free.clear()
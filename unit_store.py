@@ -0,0 +1,245 @@
+try:
+    import numpy as np
+except ImportError:
+    # NumPy нужен только для UnitStore; обычные юниты работают и без него
+    np = None
+
+from constants import FIXED_DT
+
+
+class StoreField:
+    """Дескриптор: атрибут юнита читается и пишется прямо в массив UnitStore"""
+
+    def __init__(self, array_name):
+        self.array_name = array_name
+
+    def __get__(self, unit, owner=None):
+        if unit is None:
+            return self
+        store = unit._store
+        if store is None:
+            # Юнит уже удален из хранилища - отдаем последние значения
+            return unit._detached[self.array_name]
+        if store.views is not None:
+            return store.views[self.array_name][unit._index]
+        return getattr(store, self.array_name)[unit._index].item()
+
+    def __set__(self, unit, value):
+        store = unit._store
+        if store is None:
+            unit._detached[self.array_name] = value
+            return
+        getattr(store, self.array_name)[unit._index] = value
+        if store.views is not None:
+            store.views[self.array_name][unit._index] = value
+
+
+class StoredUnitMixin:
+    """Примесь к Unit: изменяемые поля хранятся в UnitStore, а движение и перезарядка копятся до пакетного шага"""
+
+    x = StoreField('x')
+    y = StoreField('y')
+    health = StoreField('health')
+    speed = StoreField('speed')
+    last_attack = StoreField('cooldown')
+
+    def __init__(self, store, *args, **kwargs):
+        self._store = store
+        self._index = store.allocate(self)
+        self._detached = None
+        super().__init__(*args, **kwargs)
+        # Скорость общая для типа, но UnitStore двигает юнитов по своему массиву
+        store.speed[self._index] = self.archetype.speed
+        store.faction[self._index] = self.is_defender
+        store.type[self._index] = self.type.value
+
+    def move_towards(self, target_x, target_y, dt):
+        if self._store is None:
+            super().move_towards(target_x, target_y, dt)
+            return
+        self._store.target_x[self._index] = target_x
+        self._store.target_y[self._index] = target_y
+        self._store.moving[self._index] = True
+
+    def attack_ready(self, dt):
+        if self._store is None:
+            return super().attack_ready(dt)
+        # Как у Unit: сначала перезарядка растет на dt, потом сравнивается. Готовый юнит бьет и обнуляет ее,
+        # а неготовому прирост добавит UnitStore.step() в конце кадра
+        if self.last_attack + dt >= self.attack_cooldown:
+            return True
+        self._store.charging[self._index] = True
+        return False
+
+    def nearest_opponent(self, game, max_dist=None):
+        if self._store is None:
+            return super().nearest_opponent(game, max_dist)
+        # Посчитано для всех сразу в UnitStore.find_nearest(): до step() юниты стоят на месте
+        store = self._store
+        index = store.nearest_index[self._index]
+        dist = store.nearest_dist[self._index]
+        if index < 0 or (max_dist is not None and dist > max_dist):
+            return None, float('inf')
+        return store.units[index], dist
+
+
+class UnitStore:
+    """Struct-of-arrays хранилище юнитов: движение, перезарядка и отсев мертвых считаются сразу для всей армии"""
+
+    FLOAT_FIELDS = ('x', 'y', 'health', 'speed', 'cooldown', 'target_x', 'target_y')
+    BOOL_FIELDS = ('faction', 'moving', 'charging')
+    # Поля, которые видны через атрибуты юнита (см. StoredUnitMixin)
+    VIEW_FIELDS = ('x', 'y', 'health', 'speed', 'cooldown')
+
+    def __init__(self, capacity=64):
+        if np is None:
+            raise RuntimeError("Для UnitStore нужен NumPy: pip install numpy")
+        self.capacity = capacity
+        self.count = 0
+        self.units = []  # индекс в массивах -> юнит-представление
+        for name in self.FLOAT_FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=np.float64))
+        for name in self.BOOL_FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=bool))
+        self.type = np.zeros(capacity, dtype=np.int8)
+        # Слот юнита в UnitCollection: при равных расстояниях ближайшим считается меньший, как в SpatialGrid
+        self.slot = np.zeros(capacity, dtype=np.intp)
+        # Ближайший противник каждой строки (см. find_nearest); -1 - противников нет
+        self.nearest_index = []
+        self.nearest_dist = []
+        # Копии VIEW_FIELDS списками Python на время ИИ: чтение атрибута юнита - индекс в списке,
+        # а не скаляр NumPy. Сбрасываются, как только массивы меняются пакетно
+        self.views = None
+
+    def __len__(self):
+        return self.count
+
+    def _arrays(self):
+        return [getattr(self, name) for name in self.FLOAT_FIELDS + self.BOOL_FIELDS + ('type', 'slot')]
+
+    def _grow(self):
+        self.views = None
+        self.capacity *= 2
+        for name in self.FLOAT_FIELDS + self.BOOL_FIELDS + ('type', 'slot'):
+            old = getattr(self, name)
+            new = np.zeros(self.capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def allocate(self, unit):
+        """Выделяет юниту строку в массивах и возвращает ее индекс"""
+        self.views = None
+        if self.count == self.capacity:
+            self._grow()
+        index = self.count
+        for array in self._arrays():
+            array[index] = 0
+        self.units.append(unit)
+        self.count += 1
+        return index
+
+    def remove(self, unit):
+        """Удаляет юнита, переставляя последнюю строку на его место"""
+        if unit._store is not self:
+            return
+        self.views = None
+        index = unit._index
+        unit._detached = {name: getattr(self, name)[index].item() for name in self.VIEW_FIELDS}
+
+        last = self.count - 1
+        if index != last:
+            for array in self._arrays():
+                array[index] = array[last]
+            moved = self.units[last]
+            moved._index = index
+            self.units[index] = moved
+        self.units.pop()
+        self.count -= 1
+
+        unit._store = None
+        unit._index = None
+
+    def clear(self):
+        for unit in self.units[:]:
+            self.remove(unit)
+
+    def find_nearest(self, is_defender, block_size=1 << 20):
+        """Ближайший юнит другой стороны для каждой строки стороны is_defender - матрицей расстояний.
+
+        Матрица считается полосами (не больше block_size элементов). Арифметика та же, что в
+        SpatialGrid.nearest: квадраты через dx * dx, корень после выбора, при равенстве - меньший слот.
+        """
+        n = self.count
+        nearest_index = np.full(n, -1, dtype=np.intp)
+        nearest_dist = np.full(n, np.inf)
+        self.nearest_index = nearest_index.tolist()
+        self.nearest_dist = nearest_dist.tolist()
+        side = self.faction[:n] if is_defender else ~self.faction[:n]
+        queries = np.flatnonzero(side)
+        candidates = np.flatnonzero(~side)
+        if not len(queries) or not len(candidates):
+            return
+        # argmin берет первый из равных минимумов, поэтому кандидаты идут по возрастанию слота
+        candidates = candidates[np.argsort(self.slot[candidates], kind='stable')]
+        candidate_x = self.x[candidates]
+        candidate_y = self.y[candidates]
+        rows_per_block = max(1, block_size // len(candidates))
+        # Полосы считаются в двух заранее выделенных буферах, без временных массивов на каждую операцию
+        dist_buffer = np.empty((min(rows_per_block, len(queries)), len(candidates)))
+        dy_buffer = np.empty_like(dist_buffer)
+        for start in range(0, len(queries), rows_per_block):
+            rows = queries[start:start + rows_per_block]
+            dist = dist_buffer[:len(rows)]
+            dy = dy_buffer[:len(rows)]
+            np.subtract(self.x[rows, None], candidate_x, out=dist)
+            np.multiply(dist, dist, out=dist)
+            np.subtract(self.y[rows, None], candidate_y, out=dy)
+            np.multiply(dy, dy, out=dy)
+            dist += dy
+            best = dist.argmin(axis=1)
+            nearest_index[rows] = candidates[best]
+            nearest_dist[rows] = dist[np.arange(len(rows)), best]
+        self.nearest_index = nearest_index.tolist()
+        self.nearest_dist = np.sqrt(nearest_dist).tolist()
+
+    def refresh_views(self):
+        """Снимок VIEW_FIELDS для чтения атрибутов юнитов; действует до следующего пакетного изменения"""
+        n = self.count
+        self.views = {name: getattr(self, name)[:n].tolist() for name in self.VIEW_FIELDS}
+
+    def step(self, dt):
+        """Пакетный шаг: двигает всех, кто запросил движение, и копит перезарядку"""
+        self.views = None
+        n = self.count
+        moving = np.flatnonzero(self.moving[:n])
+        if len(moving):
+            # Те же операции в том же порядке, что в Unit.move_towards: результат совпадает до бита
+            dx = self.target_x[moving] - self.x[moving]
+            dy = self.target_y[moving] - self.y[moving]
+            dist = np.sqrt(dx * dx + dy * dy)
+            away = dist > 0
+            moving, dx, dy, dist = moving[away], dx[away], dy[away], dist[away]
+            step = self.speed[moving] * (dt / FIXED_DT)
+            self.x[moving] += step * dx / dist
+            self.y[moving] += step * dy / dist
+            self.moving[:n] = False
+
+        charging = self.charging[:n]
+        self.cooldown[:n][charging] += dt
+        charging[:] = False
+
+    def damage(self, indices, amounts):
+        """Урон по строкам в порядке атак; возвращает погибших в порядке смертельных ударов, как Unit-путь"""
+        self.views = None
+        health = {}
+        dead = []
+        for index, amount in zip(indices, amounts):
+            before = health.get(index)
+            if before is None:
+                before = self.health[index].item()
+            health[index] = after = before - amount
+            if after <= 0 < before:
+                dead.append(index)
+        if health:
+            self.health[list(health)] = list(health.values())
+        return [self.units[index] for index in dead]
@@ -0,0 +1,144 @@
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, GRID_SIZE
+
+
+class WallGrid:
+    """Растровая карта целых стен в разрешении GRID_SIZE.
+
+    Отрезок проверяется обходом только тех ячеек, которые он пересекает (DDA),
+    вместо проверки пересечения с прямоугольником каждой стены.
+    """
+
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, cell_size=GRID_SIZE):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cols = -(-width // cell_size)
+        self.rows = -(-height // cell_size)
+        self.cells = [None] * (self.cols * self.rows)  # индекс cy * cols + cx -> стена или None
+
+    def clear(self):
+        self.cells = [None] * (self.cols * self.rows)
+
+    def cells_of(self, building):
+        """Индексы ячеек, которые занимает здание"""
+        cx = building.x // self.cell_size
+        cy = building.y // self.cell_size
+        for x in range(cx, cx + building.width):
+            for y in range(cy, cy + building.height):
+                if 0 <= x < self.cols and 0 <= y < self.rows:
+                    yield y * self.cols + x
+
+    def set_wall(self, wall):
+        """Отмечает ячейки стены как занятые (стена построена или починена)"""
+        for index in self.cells_of(wall):
+            self.cells[index] = wall
+
+    def clear_wall(self, wall):
+        """Освобождает ячейки стены (стена сломана или убрана)"""
+        for index in self.cells_of(wall):
+            if self.cells[index] is wall:
+                self.cells[index] = None
+
+    def wall_at(self, x, y):
+        cx = int(x // self.cell_size)
+        cy = int(y // self.cell_size)
+        if 0 <= cx < self.cols and 0 <= cy < self.rows:
+            return self.cells[cy * self.cols + cx]
+        return None
+
+    def first_wall(self, p1, p2, exclude=None):
+        """Первая целая стена на отрезке p1-p2 (считая от p1) или None"""
+        for index in self._traverse(p1, p2):
+            wall = self.cells[index]
+            if wall is not None and wall is not exclude:
+                return wall
+        return None
+
+    def is_blocked(self, p1, p2, exclude=None):
+        return self.first_wall(p1, p2, exclude) is not None
+
+    def walls_on_segment(self, p1, p2, exclude=None):
+        """Все целые стены на отрезке p1-p2 в порядке удаления от p1"""
+        walls = []
+        for index in self._traverse(p1, p2):
+            wall = self.cells[index]
+            if wall is not None and wall is not exclude and wall not in walls:
+                walls.append(wall)
+        return walls
+
+    def clamped_cell(self, x, y):
+        """Ячейка точки; точки за краем карты прижимаются к ближайшей ячейке"""
+        cx = min(max(int(x // self.cell_size), 0), self.cols - 1)
+        cy = min(max(int(y // self.cell_size), 0), self.rows - 1)
+        return cx, cy
+
+    def _traverse(self, p1, p2):
+        """Индексы ячеек, через которые проходит отрезок (алгоритм Amanatides-Woo)"""
+        x1, y1 = p1
+        x2, y2 = p2
+        dx = x2 - x1
+        dy = y2 - y1
+
+        # Обрезаем отрезок по границам карты (Liang-Barsky), юниты бывают и за экраном
+        t0, t1 = 0.0, 1.0
+        for p, q in ((-dx, x1), (dx, self.width - x1), (-dy, y1), (dy, self.height - y1)):
+            if p == 0:
+                if q < 0:
+                    return
+            else:
+                t = q / p
+                if p < 0:
+                    t0 = max(t0, t)
+                else:
+                    t1 = min(t1, t)
+        if t0 > t1:
+            return
+
+        # Ячейки полуоткрытые (x // size): точка ровно на правом или нижнем краю карты лежит уже за ней.
+        # Обход начинается с этой внешней ячейки и первым же шагом входит на карту
+        size = self.cell_size
+        cx = min(max(int((x1 + t0 * dx) // size), 0), self.cols)
+        cy = min(max(int((y1 + t0 * dy) // size), 0), self.rows)
+        end_cx = min(max(int((x1 + t1 * dx) // size), 0), self.cols)
+        end_cy = min(max(int((y1 + t1 * dy) // size), 0), self.rows)
+
+        # t, при котором отрезок пересечет следующую вертикальную/горизонтальную границу ячеек
+        if dx > 0:
+            step_x, t_max_x, t_delta_x = 1, ((cx + 1) * size - x1) / dx, size / dx
+        elif dx < 0:
+            step_x, t_max_x, t_delta_x = -1, (cx * size - x1) / dx, -size / dx
+        else:
+            step_x, t_max_x, t_delta_x = 0, float('inf'), float('inf')
+        if dy > 0:
+            step_y, t_max_y, t_delta_y = 1, ((cy + 1) * size - y1) / dy, size / dy
+        elif dy < 0:
+            step_y, t_max_y, t_delta_y = -1, (cy * size - y1) / dy, -size / dy
+        else:
+            step_y, t_max_y, t_delta_y = 0, float('inf'), float('inf')
+
+        while True:
+            if cx < self.cols and cy < self.rows:
+                yield cy * self.cols + cx
+            if cx == end_cx and cy == end_cy:
+                return
+            if t_max_x == t_max_y and step_x == step_y:
+                # Отрезок идет ровно через угол ячеек: угол принадлежит текущей или диагональной ячейке
+                # (x // size), а боковых ячеек отрезок не касается
+                if t_max_x > t1:
+                    return
+                cx += step_x
+                cy += step_y
+                t_max_x += t_delta_x
+                t_max_y += t_delta_y
+            elif t_max_x < t_max_y or (t_max_x == t_max_y and step_x > 0):
+                if t_max_x > t1:
+                    return
+                cx += step_x
+                t_max_x += t_delta_x
+            else:
+                if t_max_y > t1:
+                    return
+                cy += step_y
+                t_max_y += t_delta_y
+            if not (0 <= cx < self.cols and 0 <= cy < self.rows):
+                return